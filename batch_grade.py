@@ -0,0 +1,56 @@
+"""
+Batch entry point: grade a directory of submissions across a process pool.
+Every sub-directory of SUBMISSIONS_DIR is one student's submission (named by student id)
+and gets OUTPUT_DIR/<student id>/results.json in the usual JSONTestRunner format.
+
+    python batch_grade.py submissions/ --workers 8 --output batch_results/
+
+With --capture-snapshots a render snapshot is saved next to each results.json; a later
+re-grade (e.g. after a rubric fix) can then run without a browser:
+
+    python batch_grade.py batch_results/ --from-snapshots --output regrade_results/
+"""
+
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from utils.batch_worker import init_worker, grade_submission
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Grade a directory of submissions in parallel.")
+    parser.add_argument('submissions_dir', help="directory with one sub-directory per student")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="number of worker processes, each with its own browser and server port")
+    parser.add_argument('--output', default='batch_results', help="where <student id>/results.json are written")
+    parser.add_argument('--assignment', default='scatterplot', help="assignment test folder / config name")
+    snapshots = parser.add_mutually_exclusive_group()
+    snapshots.add_argument('--capture-snapshots', dest='snapshots', action='store_const', const='capture',
+                           help="save <output>/<student id>/snapshot.json.gz of each render")
+    snapshots.add_argument('--from-snapshots', dest='snapshots', action='store_const', const='replay',
+                           help="grade <submissions_dir>/<student id>/snapshot.json.gz instead of live pages")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    student_ids = sorted(d for d in os.listdir(args.submissions_dir)
+                         if os.path.isdir(os.path.join(args.submissions_dir, d)))
+    workers = max(1, min(args.workers, len(student_ids)))
+    print(f"grading {len(student_ids)} submissions with {workers} workers")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(args.assignment, False, None, None, args.snapshots)) as pool:
+        futures = {pool.submit(grade_submission,
+                               os.path.join(args.submissions_dir, student_id),
+                               os.path.join(args.output, student_id, 'results.json'),
+                               args.assignment,
+                               "Batch regrade"): student_id
+                   for student_id in student_ids}
+        for future in as_completed(futures):
+            results = future.result()
+            print(f"{futures[future]}: {results.get('score', 0.0)}")
+
+
+if __name__ == '__main__':
+    main()
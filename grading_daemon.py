@@ -0,0 +1,108 @@
+"""
+Long-running grading daemon for interactive re-grades (e.g. during office hours).
+Keeps a pool of worker processes, each holding a warm headless Chrome and the imported
+test suites, and grades jobs posted to a local HTTP endpoint:
+
+    python grading_daemon.py --workers 4 --port 8700
+    curl -X POST localhost:8700/grade -d '{"submission_dir": "/path/to/student"}'
+
+The response body is the results.json produced by JSONTestRunner. It is written to a job folder
+the daemon creates under its own results directory, never to a path the client chooses.
+"""
+
+import os
+import json
+import shutil
+import argparse
+import tempfile
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ProcessPoolExecutor, wait
+from utils.batch_worker import init_worker, grade_submission
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve grading jobs from a warm browser pool.")
+    parser.add_argument('--workers', type=int, default=2, help="number of warm browsers / worker processes")
+    parser.add_argument('--port', type=int, default=8700, help="port of the local job endpoint")
+    parser.add_argument('--assignment', default='scatterplot', help="assignment test folder / config name")
+    parser.add_argument('--recycle-jobs', type=int, default=50,
+                        help="relaunch a worker's browser after this many jobs")
+    parser.add_argument('--recycle-memory-mb', type=int, default=1024,
+                        help="relaunch a worker's browser once it uses more memory than this")
+    return parser.parse_args()
+
+
+class GradingDaemon:
+    def __init__(self, args):
+        self.assignment_id = args.assignment
+        self.results_dir = tempfile.mkdtemp(prefix='visgrader-daemon-')
+        self.pool = ProcessPoolExecutor(
+            max_workers=args.workers, initializer=init_worker,
+            initargs=(args.assignment, True, args.recycle_jobs, args.recycle_memory_mb))
+        # submitting one call per worker spawns (and warms) every process up front
+        wait([self.pool.submit(os.getpid) for _ in range(args.workers)])
+
+    def grade(self, job):
+        job_dir = tempfile.mkdtemp(dir=self.results_dir)
+        results_path = os.path.join(job_dir, 'results.json')
+        try:
+            return self.pool.submit(grade_submission, job['submission_dir'], results_path,
+                                    self.assignment_id, job.get('comment', '')).result()
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    def close(self):
+        self.pool.shutdown()
+        shutil.rmtree(self.results_dir, ignore_errors=True)
+
+
+def make_handler(daemon):
+    class JobHandler(BaseHTTPRequestHandler):
+        def _reply(self, code, body):
+            payload = json.dumps(body, indent=4).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            if self.path != '/grade':
+                self._reply(404, {"error": "unknown endpoint"})
+                return
+            try:
+                job = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if not isinstance(job, dict):
+                    raise ValueError("the job must be a JSON object")
+                submission_dir = job.get('submission_dir')
+                if not isinstance(submission_dir, str) or not os.path.isdir(submission_dir):
+                    raise ValueError("submission_dir must be an existing directory")
+                if not isinstance(job.get('comment', ''), str):
+                    raise ValueError("comment must be a string")
+            except ValueError as e:
+                self._reply(400, {"error": str(e)})
+                return
+            self._reply(200, daemon.grade(job))
+
+        def log_message(self, format, *args):
+            pass
+
+    return JobHandler
+
+
+def main():
+    args = parse_args()
+    daemon = GradingDaemon(args)
+    server = ThreadingHTTPServer(('localhost', args.port), make_handler(daemon))
+    print(f"grading daemon ready on http://localhost:{args.port} with {args.workers} warm browsers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark entry point: record the WebDriver traffic of one grading of submission/, then run
+the test modules against that recording without a browser, e.g. to time or profile the
+Python side of the tests (pandas work, mark matching, tick parsing) after a change.
+
+    python replay_bench.py record bench/scatterplot.jsonl
+    python replay_bench.py replay bench/scatterplot.jsonl --repeat 20 --profile bench/tests.prof
+
+A replay only answers the commands that were recorded: tests that send different commands
+(e.g. after a change to what they query) fail with "was not recorded" until re-recorded.
+"""
+
+import os
+import time
+import argparse
+import cProfile
+import statistics
+import unittest
+from utils.gs_helper import JSONTestRunner
+from utils.browser_session import get_session
+from utils.static_server import StaticServer
+from utils.webdriver_replay import CommandRecorder
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Record or replay the WebDriver traffic of the test modules.")
+    parser.add_argument('mode', choices=['record', 'replay'])
+    parser.add_argument('recording', help="JSON lines file of the recorded commands")
+    parser.add_argument('--assignment', default='scatterplot', help="assignment test folder")
+    parser.add_argument('--repeat', type=int, default=10, help="number of replayed runs")
+    parser.add_argument('--profile', help="write cProfile stats of the replayed runs to this file")
+    return parser.parse_args()
+
+
+def run_suite(assignment_id):
+    suite = unittest.defaultTestLoader.discover(assignment_id + '/tests')
+    with open(os.devnull, 'w') as f:
+        return JSONTestRunner(stream=f).run(suite)
+
+
+def record(args):
+    os.makedirs(os.path.dirname(args.recording) or '.', exist_ok=True)
+    server = StaticServer('submission').start()
+    session = get_session()
+    session.submission_url = server.url('submission.html')
+    session.features.append(CommandRecorder(args.recording, submission_url=session.submission_url))
+    run_suite(args.assignment)
+    session.quit()
+    server.shutdown()
+    print(f"recorded to {args.recording}")
+
+
+def replay(args):
+    session = get_session()
+    session.replay_path = args.recording
+    profiler = cProfile.Profile() if args.profile else None
+    seconds = []
+    for _ in range(args.repeat):
+        # a fresh replay driver serves repeated commands from the first recorded response again
+        session.quit()
+        session.start()
+        start_time = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        result = run_suite(args.assignment)
+        if profiler:
+            profiler.disable()
+        seconds.append(time.perf_counter() - start_time)
+        misses = session.driver.command_executor.misses
+        if misses:
+            print(f"{misses} command(s) were not in the recording, re-record to benchmark this code")
+    print(f"{args.repeat} replayed runs of {result.testsRun} tests: min {min(seconds):0.3f}s, "
+          f"median {statistics.median(seconds):0.3f}s, mean {statistics.mean(seconds):0.3f}s")
+    if profiler:
+        profiler.dump_stats(args.profile)
+        print(f"profile written to {args.profile}")
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.mode == 'record':
+        record(args)
+    else:
+        replay(args)
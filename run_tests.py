@@ -7,21 +7,39 @@ See instructions for running the auto-grader in the README
 import os
 import sys
 import json
+import time
+import tempfile
 import unittest
 from datetime import datetime, timedelta
 import yaml
-from selenium import webdriver
-import matplotlib.pyplot as plt
-from matplotlib.gridspec import GridSpec
-from skimage import data, transform, exposure, io
-from skimage.util import compare_images
-from utils.gs_helper import JSONTestRunner, load_meta_json
-from utils.dropbox_helper import DropboxConnector
+from utils.gs_helper import JSONTestRunner, load_meta_json, write_json_atomic
+from utils.dropbox_helper import DropboxConnector, LocalStorageConnector
+from utils.upload_queue import UploadQueue
+from utils.archive_encoder import encode_attempt, term_of
+from utils.browser_session import get_session
+from utils.virtual_time import VirtualClock
+from utils.dom_audit import CollisionCollector
+from utils.static_server import StaticServer
+from utils.solution_cache import render_solution
+from utils.result_cache import ResultCache
+from utils.image_compare import open_rows, save_png, comparison_image, similarity_metrics
+from utils.timing_helper import PhaseTimer, CommandMeter, MeterCommands
+from utils.test_scheduler import schedule, load_durations
+from utils.pipeline import Pipeline
 
 # To get an access token create a Dropbox App (https://dropbox.com/developers/apps)
 ACCESS_TOKEN = ''
-
-#db = DropboxConnector(ACCESS_TOKEN)
+# seconds the run waits for archival uploads after results.json is written
+UPLOAD_WAIT = 30
+
+def get_storage(local_run):
+	"""connector submissions are archived to: a local folder when ARCHIVE_DIR is set,
+	Dropbox on Gradescope runs with an access token, None otherwise"""
+	if os.environ.get('ARCHIVE_DIR'):
+		return LocalStorageConnector(os.environ['ARCHIVE_DIR'])
+	if ACCESS_TOKEN and not local_run:
+		return DropboxConnector(ACCESS_TOKEN)
+	return None
 
 def get_assignment_config(config_filepath):
 	with open(config_filepath, 'r') as stream:
@@ -80,22 +98,27 @@ def check_interval(student_id, config, past_submissions):
 
 def upload_submission(submission_path, assignment_id, student_id, created_at):
 	storage_full_path = '/submissions/'+assignment_id+'/'+student_id+'/'+created_at+'_'+"submission.html"
-	db.upload_file(submission_path, storage_full_path)
+	return uploads.put(submission_path, storage_full_path)
 
 
-def upload_submission_plot_render(submission_path, assignment_id, student_id, created_at):
-	storage_full_path = '/submissions/'+assignment_id+'/'+student_id+'/'+created_at+'_'+"plot.png"
-	db.upload_file(submission_path, storage_full_path)
+def upload_render_archive(solution_plot, submission_png, assignment_id, student_id, created_at, term):
+	"""queue the compact archive of the renders (see utils/archive_encoder.py), the solution once
+	per term; returns the storage path of the comparison view and the Future of its upload"""
+	solution_dir = '/solutions/'+assignment_id+'/'+term+'/'
+	attempt_prefix = '/submissions/'+assignment_id+'/'+student_id+'/'+created_at+'_'
+	manifest, files = encode_attempt(solution_plot, submission_png, "submission/comparison.png",
+									 tempfile.mkdtemp(prefix='archive'), solution_dir, attempt_prefix)
+	uploaded = {storage_path: uploads.put(local_path, storage_path) for local_path, storage_path in files}
+	return manifest["view"], uploaded[manifest["view"]]
 
 
-def get_shared_render_link(submission_path, assignment_id, student_id, created_at):
-	storage_full_path = '/submissions/' + assignment_id + '/' + student_id + '/' + created_at + '_' + "plot.png"
+def get_shared_render_link(storage_full_path):
 	return db.get_shared_link(storage_full_path)
 
 
 def upload_metafile(metafile_path, assignment_id, student_id, created_at):
 	storage_full_path = '/meta_files/'+assignment_id+'/'+student_id+'/'+created_at+'_'+"submission_metadata.json"
-	db.upload_file(metafile_path, storage_full_path)
+	return uploads.put(metafile_path, storage_full_path)
 
 
 def get_shared_link(submission_path, assignment_id, student_id, created_at):
@@ -103,56 +126,28 @@ def get_shared_link(submission_path, assignment_id, student_id, created_at):
 	return db.get_shared_link(storage_full_path)
 
 
-def compare_plots(plot_1_path:str, plot_2_path:str, save_path:str):
-	"""adapted from:
-	https://scikit-image.org/docs/dev/auto_examples/applications/plot_image_comparison.html#sphx-glr-auto-examples-applications-plot-image-comparison-py
+def compare_plots(plot_1, plot_2, save_path:str):
+	"""Save the solution / submission / blend comparison image and return similarity metrics.
+	plot_1 and plot_2 are PNG paths, PNG bytes or decoded RGBA arrays; PNGs are read strip by strip.
 	"""
-	img1 = io.imread(plot_1_path)
-	img1_equalized = exposure.equalize_hist(img1)
-	img2 = io.imread(plot_2_path)
-
-	blend_rotated = compare_images(img1, img2, method='blend')
-
-	# blend compare
-	fig = plt.figure(figsize=(8, 9))
-
-	gs = GridSpec(3, 2)
-	ax0 = fig.add_subplot(gs[0, 0])
-	ax1 = fig.add_subplot(gs[0, 1])
-	ax2 = fig.add_subplot(gs[1:, :])
-
-	ax0.imshow(img1, cmap='gray')
-	ax0.set_title('Solution')
-	ax1.imshow(img2, cmap='gray')
-	ax1.set_title('Submission')
-	ax2.imshow(blend_rotated, cmap='gray')
-	ax2.set_title('Blend comparison')
-	for a in (ax0, ax1, ax2):
-		a.axis('off')
-	plt.tight_layout()
-	plt.plot()
-	plt.savefig(save_path)
+	img1 = plot_1 if hasattr(plot_1, 'shape') else open_rows(plot_1)
+	img2 = plot_2 if hasattr(plot_2, 'shape') else open_rows(plot_2)
+	save_png(comparison_image(img1, img2), save_path)
+	return similarity_metrics(img1, img2)
 
 if __name__ == '__main__':
-
-	chrome_options = webdriver.ChromeOptions()
-	chrome_options.add_argument('--no-sandbox')
-	chrome_options.add_argument('--window-size=1000,550')
-	chrome_options.add_argument('--headless')
-	chrome_options.add_argument('--disable-gpu')
+	run_started = time.time()
 
 	if os.path.exists('/autograder'): # gradescope run
 		local_run = False
-		driver = webdriver.Chrome(options=chrome_options)
 		metadata_json = "/autograder/submission_metadata.json"
 		results_json = '/autograder/results/results.json'
+		metrics_jsonl = '/autograder/results/metrics.jsonl'
 	else:
 		local_run = True
-		driver = webdriver.Chrome(
-			executable_path="utils/chromedriver",
-			options=chrome_options)
 		metadata_json = "sample/submission_metadata.json"
 		results_json = 'sample/results.json'
+		metrics_jsonl = 'sample/metrics.jsonl'
 	meta = load_meta_json(metadata_json)
 	assignment_id = meta['assignment']['title'] 	# "scatterplot"
 	created_at = meta['created_at'] 				 	# "2018-07-01T14:22:32.365935-07:00"
@@ -177,36 +172,155 @@ if __name__ == '__main__':
 		json.dump(json_data, open(results_json, 'w'), indent=4)
 	elif can_submit_again:
 		comment = f"Submission {submissions_made} out of {total_subs} during {config['submissions_interval']} minute interval"
-		# Grade submission
-		sys.path.append(assignment_id) # Make the subfolder .py files importable (e.g. isolation.py)
-		sys.path.append('submission/') # Make the subfolder with submission file importable
-
-		# take screenshot of submission
-		url = 'http://localhost:8080/submission.html'
-		driver.get(url)
-		driver.save_screenshot('submission/plot.png')
-		driver.quit()
-
-		if not local_run:
-			compare_plots("solution/solution_plot.png", "submission/plot.png", "submission/comparison.png")
-			upload_submission("submission/submission.html", assignment_id, student_id, created_at)
-			upload_submission_plot_render("submission/comparison.png", assignment_id, student_id, created_at)
-			upload_metafile(metadata_json, assignment_id, student_id, created_at)
-		try:
-			shared_plot_link = get_shared_render_link("submission/comparison.png", assignment_id, student_id, created_at)
-			print('shared plot link: ', shared_plot_link.url)
-			comment = comment + f"""\n Use this link to view a screenshot of your visualization	: <a href='{shared_plot_link.url}'>Dropbox</a> <br />This link will only be displayed once."""
-		except:
-			comment = comment + "\n Could not get shared link for plot screenshot. This submission already has a screenshot shared from a previous gradescope run."
-
-		suite = unittest.defaultTestLoader.discover('scatterplot/tests')  # just using 'tests' could include unwanted tests
-		with open(results_json, 'w') as f:
-			tests = JSONTestRunner(
-				stream=f,
-				stdout_visibility='hidden',
-				visibility='visible',
-				comment=comment,
-				).run(suite)
+		# byte-identical resubmissions replay the results of the earlier grading
+		result_cache = ResultCache()
+		result_key = result_cache.key('submission', assignment_id)
+		cached_results = result_cache.get(result_key)
+		if cached_results is not None:
+			cached_results["output"] = comment + "\n Results replayed from an earlier, identical submission."
+			json.dump(cached_results, open(results_json, 'w'), indent=4)
+		else:
+			# Grade submission
+			sys.path.append(assignment_id) # Make the subfolder .py files importable (e.g. isolation.py)
+			sys.path.append('submission/') # Make the subfolder with submission file importable
+
+			# one browser session serves the screenshots and every test module
+			session = get_session()
+			# page clock virtualization is opt-in per assignment, see utils/virtual_time.py
+			clock = session.feature(VirtualClock)
+			clock.enabled = config.get('virtual_time', clock.enabled)
+			# time of each phase, written to extra_data["metrics"] and metrics.jsonl after the pipeline
+			metrics = PhaseTimer()
+			# filled in by the test modules (main thread) while the pipeline runs
+			extra_data = {"dom_audit": session.feature(CollisionCollector).report}
+
+			def start_browser():
+				session.start()
+				metrics.add('browser_launch', session.launch_seconds)
+
+			def start_submission_server():
+				server = StaticServer('submission').start()
+				session.submission_url = server.url('submission.html')
+				return server
+
+			# the renders run alongside the tests, so their commands are counted apart from the tests'
+			render_meters = {}
+			# session stats (page readiness) of each render, for the metrics
+			render_stats = {}
+
+			def render_session(stage):
+				shard = session.shard()
+				shard.feature(MeterCommands).meter = render_meters[stage] = CommandMeter()
+				return shard
+
+			def solution_render(_):
+				# take screenshot of solution (or restore it from the solution cache) in a context of its own
+				solution_session = render_session('solution_render')
+				render_solution(solution_session, 'solution')
+				solution_session.quit()
+				render_stats['solution_render'] = solution_session.stats()
+
+			def submission_render(_, server):
+				submission_session = render_session('submission_render')
+				driver = submission_session.borrow(session.submission_url, window_size=(1000, 550), fit_window=False)
+				submission_png = driver.get_screenshot_as_png()
+				submission_session.quit()
+				render_stats['submission_render'] = submission_session.stats()
+				with open('submission/plot.png', 'wb') as f:
+					f.write(submission_png)
+				return submission_png
+
+			def plot_comparison(_, submission_png):
+				# metrics are cheap, so they are reported on local runs too; they are added to the results
+				# after the pipeline, as the tests write extra_data from the main thread meanwhile
+				return compare_plots("solution/solution_plot.png", submission_png, "submission/comparison.png")
+
+			db = get_storage(local_run)
+			# archival uploads run in the background, the shared link waits for the plot only
+			uploads = UploadQueue(db) if db is not None else None
+
+			def archive_submission():
+				upload_submission("submission/submission.html", assignment_id, student_id, created_at)
+				upload_metafile(metadata_json, assignment_id, student_id, created_at)
+
+			def archive_renders(_, submission_png):
+				# the student's link shows the comparison view, the thumbnail is for reviewers
+				return upload_render_archive("solution/solution_plot.png", submission_png, assignment_id, student_id,
+											 created_at, config.get('term') or term_of(created_at))
+
+			def shared_render_link(archived):
+				view_path, uploaded = archived
+				uploaded.result()
+				shared_plot_link = get_shared_render_link(view_path)
+				print('shared plot link: ', shared_plot_link.url)
+				return f"""\n Use this link to view a screenshot of your visualization	: <a href='{shared_plot_link.url}'>Dropbox</a> <br />This link will only be displayed once."""
+
+			def run_test_suite(_, server, __):
+				suite = unittest.defaultTestLoader.discover('scatterplot/tests')  # just using 'tests' could include unwanted tests
+				# highest weight per expected second first, within the time budget of the run
+				time_budget = config.get('time_budget')
+				durations = load_durations('config/' + assignment_id + '/test_durations.json')
+				suite = schedule(suite,
+								 durations=durations,
+								 deadline=run_started + time_budget if time_budget else None,
+								 test_limit=config.get('test_time_limit'))
+				# results.json is rewritten after every test, so a run killed midway keeps its partial scores
+				runner = JSONTestRunner(
+					stream=None,
+					results_path=results_json,
+					stdout_visibility='hidden',
+					visibility='visible',
+					comment=comment,
+					extra_data=extra_data,
+					metrics=metrics,
+					shards=config.get('test_shards', 1),
+					durations=durations,
+					)
+				runner.run(suite)
+				return runner
+
+			# renders, uploads and tests overlap; the tests need the solution reference and run on the
+			# main thread (time limits use SIGALRM, shards fork)
+			pipeline = Pipeline()
+			pipeline.add('browser', start_browser)
+			pipeline.add('submission_server', start_submission_server)
+			pipeline.add('solution_render', solution_render, after=['browser'])
+			pipeline.add('submission_render', submission_render, after=['browser', 'submission_server'])
+			pipeline.add('compare_plots', plot_comparison, after=['solution_render', 'submission_render'])
+			if uploads is not None:
+				# archival uploads are best effort, grading does not wait on storage errors
+				pipeline.add('archive_submission', archive_submission, optional=True)
+				pipeline.add('archive_renders', archive_renders, after=['compare_plots', 'submission_render'], optional=True)
+				pipeline.add('shared_link', shared_render_link, after=['archive_renders'], optional=True)
+			pipeline.add('tests', run_test_suite, after=['solution_render', 'submission_server', 'browser'],
+						 main_thread=True)
+			results = pipeline.run()
+
+			# the link and the comparison may have arrived after the tests wrote results.json
+			runner = results['tests']
+			runner.json_data["output"] = comment + (results.get('shared_link') or "\n Could not get shared link for plot screenshot. This submission already has a screenshot shared from a previous gradescope run.")
+			runner.json_data.setdefault("extra_data", {})["comparison"] = results['compare_plots']
+			write_json_atomic(runner.json_data, results_json)
+			pipeline_report = pipeline.report()
+			print(f"critical path: {' -> '.join(pipeline_report['critical_path'])} "
+				  f"({pipeline_report['critical_path_seconds']}s of {pipeline_report['wall_seconds']}s)")
+			session.quit()
+			results['submission_server'].shutdown()
+			upload_report = None
+			if uploads is not None:
+				upload_report = uploads.close(timeout=UPLOAD_WAIT)
+				for upload in upload_report["uploads"]:
+					print(f"{upload['status']} {upload['path']} ({upload['attempts']} attempt(s), {upload['seconds']}s)")
+				if upload_report["pending"]:
+					print(f"{upload_report['pending']} upload(s) still running")
+			# the metrics line is written once the stages and uploads are done; the runner timed the tests
+			for name, stage in pipeline_report["stages"].items():
+				if name != 'tests' and stage["seconds"] is not None:
+					metrics.add(name, stage["seconds"], render_meters.get(name))
+			runner.write_metrics(metrics_jsonl, pipeline=pipeline_report, uploads=upload_report, browser_session=dict(session.stats(), renders=render_stats))
+			write_json_atomic(runner.json_data, results_json)
+			if not result_cache.put(result_key, results_json):
+				print("results not cached: some tests did not finish normally")
 	else:
 		comment = f"""
 		[WARNING] You have reached the submission limit ({total_subs}/{total_subs}). 
@@ -6,99 +6,96 @@ on visualization layout detected by the autograder (VisGrader Sec. 5.3.2)
 import os
 import unittest
 import re
-from collections import Counter
 from gradescope_utils.autograder_utils.decorators import weight, tags, number
 from gradescope_utils.autograder_utils.decorators import partial_credit
 from gradescope_utils.autograder_utils.files import check_submitted_files
 import selenium
 import selenium.common.exceptions
 from utils.rubric_helper import get_rubric_config
-from selenium import webdriver
+from utils.browser_session import get_session
+from utils.query_planner import query_plan, needs, axis, element, page_facts, reset_page_facts
+from utils.dom_audit import prepare_audit, run_audit, CollisionCollector
 import numpy as np
 from autograde_viz.css_transforms import *
 
-class TestFiles(unittest.TestCase):
+# presence, tags, nesting and duplicate ids are checked by one audit; prepared at import so
+# render snapshots include it
+prepare_audit(get_rubric_config('config/' + "scatterplot" + '/rubric.yaml'))
 
-    @classmethod
-    def setUpClass(cls):
 
-        
-        chrome_options = webdriver.ChromeOptions()
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--disable-gpu')
+def dom_audit(test_case):
+    """DomAudit of the page under test, run once per class on first use"""
+    cls = type(test_case)
+    if cls._dom_audit is None:
+        cls._dom_audit = run_audit(cls.driver, cls.rubric_config)
+    return cls._dom_audit
 
-        if os.path.exists('/autograder'):  # gradescope run
-            local_run = False
-            url = 'http://localhost:8080/submission.html'
-            driver = webdriver.Chrome(options=chrome_options)
-            metadata_json = "/autograder/submission_metadata.json"
 
-        else:
-            local_run = True
-            url = 'http://localhost:8080/submission.html'
-            driver = webdriver.Chrome(
-                executable_path="utils/chromedriver",
-                options=chrome_options)
-            metadata_json = "sample/submission_metadata.json"    
+@query_plan('config/' + "scatterplot" + '/rubric.yaml')
+class TestFiles(unittest.TestCase):
 
-        driver.get(url)
-        
-        # set chromedrive window dimensions to student submission dimensions
-        rendered_width = driver.execute_script("return document.documentElement.scrollWidth")
-        rendered_height = driver.execute_script("return document.documentElement.scrollHeight")
-        driver.set_window_size(rendered_width,rendered_height)
+    @classmethod
+    def setUpClass(cls):
+
+        # borrow the grading run's browser; the submission is reloaded and the window fitted to it
+        driver = get_session().borrow()
         
         cls.rubric_config = get_rubric_config('config/' + "scatterplot" + '/rubric.yaml')        
         
         cls.driver = driver
+        reset_page_facts(cls)
+        cls._dom_audit = None
 
     @classmethod
     def tearDownClass(cls) -> None:
-        cls.driver.quit()
+        session = get_session()
+        if cls._dom_audit is not None:
+            session.feature(CollisionCollector).report.update(cls._dom_audit.report())
+        # release() reads the id collisions recorded while the page was graded
+        session.release()
     
     @weight(0.0)
     def test_0_required_elements(self):
         """Functional Advisory Test - presence of required elements."""
-        # this test looks for required elements from a .yaml file
-        # try lookup on element by id
-        # match element with required tag name, e.g., <g>, <sv>, etc.
-        # raise no such element exception if lookup fails.
         # fail test under either of 2 conditions:
         # 1. the element does not match the tag name for a given id
         # 2. an element is missing (no such element)
         required_elements = self.rubric_config["elements"]
+        audit = dom_audit(self)
         results = "Found: "
         for elem in required_elements:
             ids = required_elements[elem]
-            matched_elems = 0
-            required_elems = len(ids)
+            missing = audit.missing(elem)
+            for i in missing:
+                print(f"could not find an element with id='{i}'")
+            mismatched = audit.mismatched(elem)
+            self.assertEqual([], mismatched, f"tag name for id(s) {mismatched} is incorrect.")
             for i in ids:
-                try:
-                    search_element = self.driver.find_element_by_id(i)
-                    tag_name = search_element.tag_name
-                    self.assertEqual(elem, tag_name, f"tag name for id {i} is incorrect.")
-                    new_result = f"<{tag_name} id='{i}'>\n"
+                if i not in missing:
+                    new_result = f"<{elem} id='{i}'>\n"
                     results = f"{results}, {new_result}"
-                    matched_elems +=1                    
-                except selenium.common.exceptions.NoSuchElementException as nse:
-                    print(f"could not find an element with id='{i}' \n {nse}")            
-            self.assertEqual(matched_elems, required_elems, \
-                f"Missing {np.abs(required_elems-matched_elems)} {elem} element(s). \n\
+            self.assertEqual(0, len(missing), \
+                f"Missing {len(missing)} {elem} element(s). \n\
                     Expected: {required_elements}")
+        misplaced = audit.misplaced()
+        if misplaced:
+            print("element(s) not inside their expected parent: " +
+                  ", ".join(f"#{i} (expected inside #{audit.nesting[i]['within']})" for i in misplaced))
         print(f"expected: {required_elements}. \n {results}")
 
     @weight(0.0)
+    @needs(element("plot", within="#container"), axis("x_axis"), axis("y_axis"))
     def test_1_plot_info(self):
         """Functional Advisory Test - Plot Information"""
         try:
-            svg_height = self.driver.find_element_by_id("container").rect['height']
-            svg_width = self.driver.find_element_by_id("container").rect['width']    
+            facts = page_facts(self)
+            svg_height = facts.require("container").rect['height']
+            svg_width = facts.require("container").rect['width']    
             # print(f"svg dims: {svg_width} X {svg_height}")
 
             # container group transform / translation
-            g = self.driver.find_element_by_id("container").find_element_by_id("plot")
-            g_transform = g.value_of_css_property("transform")
+            g = facts.require("plot", within="#container")
+            g_transform = g.transform
             g_matrix = parse_css_transform_matrix(g_transform)
             g_transform_xy = css_matrix_translation(g_matrix)
             # print(f"g element translated x: {g_transform_xy[0]}, y: {g_transform_xy[1]}")
@@ -110,11 +107,11 @@ class TestFiles(unittest.TestCase):
             assumed_top_margin = g_transform_xy[1]    
             
             # assumed margin.right = svg width - margin.left - x domain width
-            assumed_width = self.driver.find_element_by_id("x_axis").find_element_by_class_name("domain").size['width']
+            assumed_width = facts.require("x_axis").require_domain()['width']
             assumed_right_margin = svg_width - assumed_left_margin - assumed_width
 
             # assume margin.bottom = svg height - margin.top - y domain height
-            assumed_height = self.driver.find_element_by_id("y_axis").find_element_by_class_name("domain").size['height']    
+            assumed_height = facts.require("y_axis").require_domain()['height']    
             assumed_bottom_margin = svg_height - assumed_top_margin - assumed_height
         
         except selenium.common.exceptions.NoSuchElementException as e:
@@ -141,18 +138,11 @@ class TestFiles(unittest.TestCase):
         print(plot_info)
 
     def test_2_duplicate_ids(self):
-        # duplicate ids
-        ids = self.driver.find_elements_by_xpath('//*[@id]')
-        elem_ids = []
-        for ii in ids:
-            ii_a = ii.get_attribute('id')
-            # print (ii_a)
-            elem_ids.append(ii_a)
-        
-        dupes =  list((Counter(elem_ids) - Counter(set(elem_ids))).keys())
+        # duplicate ids, now and at any point since the page started loading
+        audit = dom_audit(self)
+        dupes = audit.all_duplicates()
+        late = [i for i in dupes if audit.collisions.get(i, {}).get('after_load')]
         self.assertEqual(0, len(dupes), f"Found {len(dupes)} duplicate(s): {dupes}.\n \
             Duplicate ids will likely cause other tests to fail. \n \
-            Note that this test only searches for elements with dupicate ids after initial load of 'submission.html'. \n \
-            Any subsequent element insertion could still result in un-detected duplicate ids and failed tests.")
-        print(f"Found {len(dupes)} duplicate(s): {dupes}")        
-
+            Duplicates created after the initial load of 'submission.html': {late}.")
+        print(f"Found {len(dupes)} duplicate(s): {dupes}")
@@ -9,58 +9,65 @@ from gradescope_utils.autograder_utils.decorators import weight, tags, number
 from gradescope_utils.autograder_utils.decorators import partial_credit
 from gradescope_utils.autograder_utils.files import check_submitted_files
 from utils.output_blocker import NoStd
-from selenium import webdriver
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver.support.color import Color
-from utils.rubric_helper import get_rubric_config
+from utils.rubric_helper import get_rubric_config, derive_rubric_data
+from utils.solution_cache import load_reference
 import numpy as np
 import pandas as pd
 from utils.gs_helper import load_meta_json
+from utils.browser_session import get_session
+from utils.dom_extract import extract_marks
+from utils.vector_scales import LinearScale
+from utils.mark_matching import match_marks
+from utils.interaction_probe import prepare_probe, probe_interactions
+from utils.test_sharding import isolated_context
+from utils.query_planner import query_plan, needs, axis, page_facts, reset_page_facts, requires_elements
 from autograde_viz.d3_scales import *
 from autograde_viz.css_transforms import *
 from bs4 import BeautifulSoup
 
+# one probe hovers the sampled marks for both interaction tests; prepared at import so
+# render snapshots include it
+INTERACTION = get_rubric_config('config/' + "scatterplot" + '/rubric.yaml')['interaction']
+prepare_probe(INTERACTION['selector'], INTERACTION.get('sample'), INTERACTION['attributes'], INTERACTION['mode'])
 
+
+def interaction_probe(test_case):
+    """ProbeResult of the hover probe, run once per class on first use"""
+    cls = type(test_case)
+    if cls._interaction_probe is None:
+        cls._interaction_probe = probe_interactions(cls.driver, INTERACTION['selector'], INTERACTION.get('sample'),
+                                                    INTERACTION['attributes'], INTERACTION['mode'])
+    return cls._interaction_probe
+
+
+@query_plan('config/' + "scatterplot" + '/rubric.yaml')
 class TestFiles(unittest.TestCase):
 
     @classmethod
     def setUpClass(cls):
 
-        chrome_options = webdriver.ChromeOptions()
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--disable-gpu')
-
         if os.path.exists('/autograder'):  # gradescope run
             local_run = False
-            url = 'http://localhost:8080/submission.html'
-            driver = webdriver.Chrome(options=chrome_options)
             metadata_json = "/autograder/submission_metadata.json"
 
         else:
             local_run = True
-            url = 'http://localhost:8080/submission.html'
-            driver = webdriver.Chrome(
-                executable_path="utils/chromedriver",
-                options=chrome_options)
             metadata_json = "sample/submission_metadata.json"
 
         meta = load_meta_json(metadata_json)
         # cls.submitted_gtid = meta['users'][0]['sid']
         # cls.expected_gtid = '999999999'
 
-        driver.get(url)
-
-        # set chromedrive window dimensions to student submission dimensions
-        rendered_width = driver.execute_script("return document.documentElement.scrollWidth")
-        rendered_height = driver.execute_script("return document.documentElement.scrollHeight")
-        driver.set_window_size(rendered_width,rendered_height)        
+        # borrow the grading run's browser; the submission is reloaded and the window fitted to it
+        driver = get_session().borrow()
 
-        cls.rubric_config = get_rubric_config('config/' + "scatterplot" + '/rubric.yaml')     
+        cls.rubric_config = derive_rubric_data(get_rubric_config('config/' + "scatterplot" + '/rubric.yaml'), load_reference())     
         cls.solution_title = cls.rubric_config["labels"]["title"]
         cls.solution_x_axis_label = cls.rubric_config["labels"]["x_axis_label"]
         cls.solution_y_axis_label = cls.rubric_config["labels"]["y_axis_label"]
@@ -76,13 +83,16 @@ class TestFiles(unittest.TestCase):
 
 
         cls.driver = driver
+        # DOM facts of the plan and the presence probe of required elements run once, on first use
+        reset_page_facts(cls)
+        cls._interaction_probe = None
 
         soup = BeautifulSoup(driver.page_source, 'html.parser')
         cls.soup = soup
 
     @classmethod
     def tearDownClass(cls) -> None: 
-        cls.driver.quit()
+        get_session().release()
 
     @weight(0.0)
     def test_002_d3_imports(self):
@@ -102,6 +112,7 @@ class TestFiles(unittest.TestCase):
 
 
     @weight(0.0)
+    @requires_elements("symbols")
     def test_01_data_representation(self):
         """Test that there is one mark present for each required data point in the dataset."""
         df = pd.read_csv("data/cars.csv")
@@ -109,9 +120,9 @@ class TestFiles(unittest.TestCase):
         df = df.reset_index(drop=True)
 
         try:
-            circles = WebDriverWait(self.driver, 10) \
-                .until(EC.presence_of_element_located((By.ID, "symbols"))) \
-                .find_elements_by_tag_name("circle")
+            WebDriverWait(self.driver, 10) \
+                .until(EC.presence_of_element_located((By.ID, "symbols")))
+            circles = extract_marks(self.driver, "#symbols circle")
             desired_data_len = len(df)
             submitted_data_len = len(circles)
             self.assertEqual(desired_data_len, submitted_data_len, \
@@ -123,6 +134,7 @@ class TestFiles(unittest.TestCase):
 
 
     @weight(2.0)
+    @requires_elements("symbols", "x_axis", "y_axis")
     def test_02_circle_mark_positions(self):
         """Test that the circle marks are positioned correctly"""
         # Filter data where Miles_per_Gallon & Horsepower are not missing. 
@@ -142,10 +154,9 @@ class TestFiles(unittest.TestCase):
         # get all circles
 
         # Scatterplot Circle Marks
-        circle_marks = WebDriverWait(self.driver, 10) \
-            .until(EC.presence_of_element_located((By.ID, "symbols"))) \
-            .find_elements_by_tag_name("circle")
-        circle_colors = list(set([s.value_of_css_property("fill") for s in circle_marks]))
+        WebDriverWait(self.driver, 10) \
+            .until(EC.presence_of_element_located((By.ID, "symbols")))
+        circle_marks = extract_marks(self.driver, "#symbols circle")
 
         # get x/y axes width & height
         y_axis_height = WebDriverWait(self.driver, 10) \
@@ -157,103 +168,59 @@ class TestFiles(unittest.TestCase):
             .find_element_by_class_name("domain") \
             .rect['width']    
 
-        # store x,y positions
-        grouped_symbol_positions = {c: {'x': [], 'y': []} for c in circle_colors}
-        for s in circle_marks:
-            k = s.value_of_css_property("fill")
-            x = np.round(np.float(s.get_attribute('cx')), 2)
-            y = np.round(np.float(s.get_attribute('cy')), 2)
-            grouped_symbol_positions[k]['x'].append(x)
-            grouped_symbol_positions[k]['y'].append(y)
-
-        actual_symbol_positions = {c: None for c in grouped_symbol_positions.keys()}
-        for k in actual_symbol_positions.keys():
-            x_coords = grouped_symbol_positions[k]['x']
-            y_coords = grouped_symbol_positions[k]['y']
-            actual_symbol_positions[k] = pd.DataFrame({'x': x_coords, 'y': y_coords})
-
-        # each key will hold a dataframe of xy coords
-        expected_symbol_positions = {'symbols': None}
-
-        # iterate through each column (key of expected symbol) by the axes
-        x_coords = []
-        y_coords = []
-        for a in df.axes[0].values:
-            xd = df.iloc[a][1]
-            yd = df.iloc[a][0]
-            y = np.round(d3_scale_linear(webdriver=self.driver, datum=yd, domain_min=0, domain_max=max_mpg, range_min=0, range_max=y_axis_height, invert=True), 2)
-            x = np.round(d3_scale_linear(webdriver=self.driver, datum=xd,  domain_min=0, domain_max=max_hp, range_min=0, range_max=x_axis_width), 2)
-            x_coords.append(x)
-            y_coords.append(y)
-        expected_symbol_positions['symbols'] = pd.DataFrame({'x': x_coords, 'y': y_coords})
-
-        # take each group and of symbols (circles) get x,y coords
+        # compute all expected positions at once from the axes' range (no driver calls)
+        x_scale = LinearScale(domain=(0, max_hp), range=(0, x_axis_width))
+        y_scale = LinearScale(domain=(0, max_mpg), range=(y_axis_height, 0))
+        expected_symbol_positions = np.column_stack((
+            np.round(x_scale(df['Horsepower'].to_numpy()), 2),
+            np.round(y_scale(df['Miles_per_Gallon'].to_numpy()), 2)))
+        actual_symbol_positions = np.round(circle_marks.positions(), 2)
+
+        # pair each submitted circle with an expected position regardless of drawing order
         # ensure w/in tolerance
-        matches = {}
-        sorted_matches = {}
-        for ak in actual_symbol_positions.keys():
-            for j in expected_symbol_positions.keys():
-
-                # try to match on circle symbol positions
-                diff = actual_symbol_positions[ak].sub(expected_symbol_positions[j])
-                # these filtered dfs will contain any symbol position > than the tolerance.
-                x_tolerant = diff[np.abs(diff['x']) > symbol_position_tolerance].empty
-                y_tolerant = diff[np.abs(diff['y']) > symbol_position_tolerance].empty
-                match = x_tolerant and y_tolerant
-                if match:
-                    matches[j] = ak
-                    break        
-        self.assertTrue(x_tolerant, "circle marks are not positioned correctly within the x-axis")
-        self.assertTrue(y_tolerant, "circle marks are not positioned correctly within the y-axis")
+        report = match_marks(actual_symbol_positions, expected_symbol_positions, tolerance=symbol_position_tolerance)
+        self.assertTrue(report.all_matched, f"circle marks are not positioned correctly: {report.summary()}")
         print("Circle marks are positioned correctly ")
     
     
     @weight(2.5)
+    @requires_elements("symbols")
+    @isolated_context
     def test_03_mouseover_interaction(self):
         """Test that the circle mark radius becomes larger on mouseover interaction"""
-        # Scatterplot Circle Marks
-        circle_marks = WebDriverWait(self.driver, 10) \
-            .until(EC.presence_of_element_located((By.ID, "symbols"))) \
-            .find_elements_by_tag_name("circle")        
-        
-        action = ActionChains(self.driver)
-        # check that the radius changes on mouseover/hover
-        targeted_circle_element = circle_marks[0]
-        targeted_circle_radius_0 = targeted_circle_element.get_attribute('r')
-        action.move_to_element(to_element=targeted_circle_element).perform()
-        targeted_circle_radius_1 = targeted_circle_element.get_attribute('r')
-        self.assertGreater(targeted_circle_radius_1, targeted_circle_radius_0, "Mark radius is not larger on mouseover")
-        print('Correct implementation - circle mark radius is larger on mouseover.')
+        probe = interaction_probe(self)
+        self.assertGreater(len(probe), 0, "No circle marks found to hover")
+        # radii are compared as numbers ('10' < '9' as strings)
+        failing = int(np.sum(~probe.grows_on_over('r')))
+        self.assertEqual(failing, 0, f"Mark radius is not larger on mouseover ({failing} of {len(probe)} probed marks)")
+        print(f'Correct implementation - circle mark radius is larger on mouseover '
+              f'({len(probe)} of {probe.count} marks probed).')
 
     @weight(2.5)
+    @requires_elements("symbols")
+    @isolated_context
     def test_04_mouseout_interaction(self):
         """Test that the circle mark radius becomes smaller on mouseout event"""
-        # Scatterplot Circle Marks
-        circle_marks = WebDriverWait(self.driver, 10) \
-            .until(EC.presence_of_element_located((By.ID, "symbols"))) \
-            .find_elements_by_tag_name("circle")        
-        
-        action = ActionChains(self.driver)
-        # check that the radius changes on mouseover/hover
-        targeted_circle_element = circle_marks[0]
-        action.move_to_element(to_element=targeted_circle_element).perform()
-        targeted_circle_radius_0 = targeted_circle_element.get_attribute('r')
-        action.move_by_offset(100,100).perform()
-        targeted_circle_radius_1 = targeted_circle_element.get_attribute('r')
-        self.assertLess(targeted_circle_radius_1, targeted_circle_radius_0, "Mark radius is not smaller on mouseout")
-        print('Correct implementation - circle mark radius becomes smaller on mouseout.')
+        probe = interaction_probe(self)
+        self.assertGreater(len(probe), 0, "No circle marks found to hover")
+        failing = int(np.sum(~probe.shrinks_on_out('r')))
+        self.assertEqual(failing, 0, f"Mark radius is not smaller on mouseout ({failing} of {len(probe)} probed marks)")
+        print(f'Correct implementation - circle mark radius becomes smaller on mouseout '
+              f'({len(probe)} of {probe.count} marks probed).')
 
 
     @weight(1.5)
+    @needs(axis("x_axis", within="g"))
     def test_07_x_axis_tick_values_length(self):
         """Test for presence of the x-axis and tick values-"""
         with NoStd():
+            # the x-axis has to be inside the first <g>
             try:
-                self.submitted_x_axis = self.driver.find_element_by_tag_name("g").find_element_by_id("x_axis")
+                self.submitted_x_axis = page_facts(self).axis("x_axis", within="g")
             except:
                 self.submitted_x_axis = None
             try:
-                x_ticks = self.submitted_x_axis.find_elements_by_class_name("tick")
+                x_ticks = self.submitted_x_axis.ticks
                 self.submitted_x_ticks = [t for t in x_ticks]
             except:
                 self.submitted_x_ticks = None
@@ -269,12 +236,13 @@ class TestFiles(unittest.TestCase):
 
 
     @weight(1.5)
+    @needs(axis("y_axis", within="g"))
     def test_08_y_axis_tick_values_length(self):
         """Test for presence of the y-axis and tick values-"""
         with NoStd():
             try:
-                self.submitted_y_axis = self.driver.find_element_by_tag_name("g").find_element_by_id("y_axis")
-                y_ticks = self.submitted_y_axis.find_elements_by_class_name("tick")
+                self.submitted_y_axis = page_facts(self).axis("y_axis", within="g")
+                y_ticks = self.submitted_y_axis.ticks
                 self.submitted_y_ticks = [t for t in y_ticks]
             except:
                 self.submitted_y_axis = None
@@ -295,7 +263,7 @@ class TestFiles(unittest.TestCase):
         """Test for the correct x-axis label"""
         with NoStd():
             try:
-                self.submitted_x_axis_label = self.driver.find_element_by_id("x_axis_label").text
+                self.submitted_x_axis_label = page_facts(self).require("x_axis_label").text
             except:
                 self.submitted_x_axis_label = None
 
@@ -313,7 +281,7 @@ class TestFiles(unittest.TestCase):
         """Test for the correct y-axis label"""
         with NoStd():
             try:
-                self.submitted_y_axis_label = self.driver.find_element_by_id("y_axis_label").text
+                self.submitted_y_axis_label = page_facts(self).require("y_axis_label").text
             except:
                 self.submitted_y_axis_label = None
 
@@ -331,7 +299,7 @@ class TestFiles(unittest.TestCase):
         """Test the y-axis label orientation"""
         with NoStd():
             try:
-                self.submitted_y_axis_label = self.driver.find_element_by_id("y_axis_label").text
+                self.submitted_y_axis_label = page_facts(self).require("y_axis_label").text
             except:
                 self.submitted_y_axis_label = None            
             
@@ -340,7 +308,7 @@ class TestFiles(unittest.TestCase):
                                     "Test fails becuase the y-axis label was not found.")
             else:
                 try:
-                    transform = self.driver.find_element_by_id("y_axis_label").value_of_css_property("transform")
+                    transform = page_facts(self).require("y_axis_label").transform
                     y_axis_transform = parse_css_transform_matrix(transform)
                     y_axis_transform_angle = css_matrix_rotation(y_axis_transform)
                 except:
@@ -353,12 +321,13 @@ class TestFiles(unittest.TestCase):
 
 
     @weight(0.75)
+    @needs(axis("y_axis", within="g"))
     def test_12_y_axis_tick_value_domain(self):
         """Testing the y-scale tick values"""
         with NoStd():
             try:
-                self.submitted_y_axis = self.driver.find_element_by_tag_name("g").find_element_by_id("y_axis")
-                y_ticks = self.submitted_y_axis.find_elements_by_class_name("tick")
+                self.submitted_y_axis = page_facts(self).axis("y_axis", within="g")
+                y_ticks = self.submitted_y_axis.ticks
                 self.submitted_y_ticks = [t for t in y_ticks]
             except:
                 self.submitted_y_axis = None
@@ -369,7 +338,7 @@ class TestFiles(unittest.TestCase):
 
             solution_min = min([t for t in self.solution_y_ticks])
             solution_max = max([t for t in self.solution_y_ticks])
-            y_tick_values = np.sort([np.int(t.text.replace(',','')) for t in self.submitted_y_ticks])
+            y_tick_values = np.sort([int(t.text.replace(',','')) for t in self.submitted_y_ticks])
             submitted_min = min(y_tick_values)
             submitted_max = max(y_tick_values)
 
@@ -392,21 +361,21 @@ class TestFiles(unittest.TestCase):
 
 
     @weight(0.25)
+    @needs(axis("y_axis"))
     def test_13_y_axis_orientation(self):
         """Testing for a left-oriented axis"""
         with NoStd():
             try:
-                self.submitted_y_axis = self.driver.find_element_by_id("y_axis")
+                self.submitted_y_axis = page_facts(self).axis("y_axis")
             except:
-                self.submitted_y_axis = None            
+                self.submitted_y_axis = None
                         
             if self.submitted_y_axis is None:
                 self.assertIsNotNone(self.submitted_y_axis, "This test fails becuase the y-axis was not found.")
             else:
                 try:
-                    y_tick_groups = self.driver.find_element_by_id("y_axis").find_elements_by_class_name("tick")
-                    y_tick_marks = [g.find_elements_by_tag_name("line") for g in y_tick_groups]
-                    y_axis_tick_orientation = [np.int(mark[0].get_attribute('x2')) for mark in y_tick_marks]
+                    # x2 of the first <line> of each tick (None when a tick has no line)
+                    y_axis_tick_orientation = [int(tick.x2) for tick in self.submitted_y_axis.ticks]
                     y_axis_tick_orientation = list(set(y_axis_tick_orientation))[0] #orientation of tick maark                    
                 except:
                     y_axis_tick_orientation = None
@@ -419,15 +388,16 @@ class TestFiles(unittest.TestCase):
 
 
     @weight(2.75)
+    @needs(axis("x_axis", within="g"))
     def test_14_x_axis_tick_value_domain(self):
         """Testing the x-scale tick values"""
         with NoStd():
             try:
-                self.submitted_x_axis = self.driver.find_element_by_tag_name("g").find_element_by_id("x_axis")
+                self.submitted_x_axis = page_facts(self).axis("x_axis", within="g")
             except:
                 self.submitted_x_axis = None
             try:
-                x_ticks = self.submitted_x_axis.find_elements_by_class_name("tick")
+                x_ticks = self.submitted_x_axis.ticks
                 self.submitted_x_ticks = [t for t in x_ticks]
             except:
                 self.submitted_x_ticks = None
@@ -437,7 +407,7 @@ class TestFiles(unittest.TestCase):
 
             solution_min = min([t for t in self.solution_x_ticks])
             solution_max = max([t for t in self.solution_x_ticks])
-            x_tick_values = np.sort([np.int(t.text.replace(',','')) for t in self.submitted_x_ticks])
+            x_tick_values = np.sort([int(t.text.replace(',','')) for t in self.submitted_x_ticks])
             submitted_min = min(x_tick_values)
             submitted_max = max(x_tick_values)
 
@@ -459,11 +429,12 @@ class TestFiles(unittest.TestCase):
         print(f"Found y-axis values \n{x_tick_values}.")            
 
     @weight(0.25)
+    @needs(axis("x_axis", within="g"), axis("x_axis"))
     def test_15_x_axis_orientation(self):
         """Testing for a bottom-oriented x-axis"""
         with NoStd():
             try:
-                self.submitted_x_axis = self.driver.find_element_by_tag_name("g").find_element_by_id("x_axis")
+                self.submitted_x_axis = page_facts(self).axis("x_axis", within="g")
             except:
                 self.submitted_x_axis = None
 
@@ -471,9 +442,7 @@ class TestFiles(unittest.TestCase):
                 self.assertIsNotNone(self.submitted_x_axis, "This test fails becuase the x-axis was not found in test Q3.d part 1.")
             else:
                 try:
-                    x_tick_groups = self.driver.find_element_by_id("x_axis").find_elements_by_class_name("tick")
-                    x_tick_marks = [g.find_elements_by_tag_name("line") for g in x_tick_groups]
-                    x_tick_marks_y2 = [np.int(mark[0].get_attribute('y2')) for mark in x_tick_marks] #orientation of tick mark
+                    x_tick_marks_y2 = [int(tick.y2) for tick in page_facts(self).axis("x_axis").ticks] #orientation of tick mark
                     x_axis_tick_orientation = list(set(x_tick_marks_y2))[0]
                 except:
                     x_axis_tick_orientation = None
@@ -489,7 +458,7 @@ class TestFiles(unittest.TestCase):
         """Test for the title displayed above barplot"""
         with NoStd():
             try:
-                self.submitted_title = self.driver.find_element_by_id("title").text
+                self.submitted_title = page_facts(self).require("title").text
             except:
                 self.submitted_title = None
 
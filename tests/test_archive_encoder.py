@@ -0,0 +1,117 @@
+"""
+Unit tests of utils/archive_encoder.py: archived attempts decode to the original renders.
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from utils.archive_encoder import (encode_attempt, decode_attempt, write_views, encode_lossless,
+                                   delta_against, undo_delta, term_of)
+from utils.dropbox_helper import LocalStorageConnector
+from utils.image_compare import load_rgba, save_png, comparison_image
+
+
+def render(height=120, width=90, seed=0):
+    rgba = np.full((height, width, 4), 255, dtype=np.uint8)
+    rgba[20:100, 10:80, :3] = np.random.RandomState(seed).randint(0, 256, size=(80, 70, 3))
+    return rgba
+
+
+class TestArchiveRoundTrip(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.connector = LocalStorageConnector(os.path.join(self.tmp.name, 'archive'))
+
+    def archive(self, solution, screenshot):
+        paths = []
+        for name, rgba in (('solution', solution), ('plot', screenshot),
+                           ('comparison', comparison_image(solution, screenshot))):
+            paths.append(os.path.join(self.tmp.name, name + '.png'))
+            save_png(rgba, paths[-1])
+        out_dir = os.path.join(self.tmp.name, 'out')
+        os.makedirs(out_dir, exist_ok=True)
+        manifest, uploads = encode_attempt(*paths, out_dir, '/solutions/2020-fall/', '/submissions/a/s/1_')
+        for local_path, storage_path in uploads:
+            self.connector.upload_file(local_path, storage_path)
+        return manifest, uploads
+
+    def test_close_submission_is_stored_as_a_delta(self):
+        solution = render()
+        screenshot = solution.copy()
+        screenshot[50:60, 30:40, :3] = 0
+        manifest, uploads = self.archive(solution, screenshot)
+        self.assertTrue(manifest["delta"])
+        self.assertEqual(uploads[-1][1], '/submissions/a/s/1_archive.json')
+        decoded_solution, decoded = decode_attempt(self.connector, '/submissions/a/s/1_archive.json')
+        np.testing.assert_array_equal(decoded_solution, solution)
+        np.testing.assert_array_equal(decoded, screenshot)
+
+    def test_archive_of_a_close_submission_is_small(self):
+        solution = render(600, 800)
+        screenshot = solution.copy()
+        screenshot[50:60, 30:40, :3] = 0
+        manifest, uploads = self.archive(solution, screenshot)
+        archived = sum(size for name, size in manifest["bytes"].items() if name not in ("solution", "view"))
+        comparison = os.path.getsize(os.path.join(self.tmp.name, 'comparison.png'))
+        self.assertLess(archived * 10, comparison)
+        self.assertEqual(manifest["bytes"]["view"], os.path.getsize(
+            [local_path for local_path, storage_path in uploads if storage_path == manifest["view"]][0]))
+
+    def test_different_size_submission_is_stored_whole(self):
+        solution, screenshot = render(), render(150, 90, seed=1)
+        manifest, _ = self.archive(solution, screenshot)
+        self.assertFalse(manifest["delta"])
+        self.assertEqual(manifest["size"], [90, 150])
+        np.testing.assert_array_equal(decode_attempt(self.connector, '/submissions/a/s/1_archive.json')[1],
+                                      screenshot)
+
+    def test_solution_is_stored_once_by_content(self):
+        solution = render()
+        first, _ = self.archive(solution, solution)
+        second, _ = self.archive(solution, render(seed=2))
+        self.assertEqual(first["solution"], second["solution"])
+        self.assertTrue(first["solution"].startswith('/solutions/2020-fall/'))
+
+    def test_view_is_the_full_comparison(self):
+        solution, screenshot = render(), render(seed=3)
+        manifest, _ = self.archive(solution, screenshot)
+        view = os.path.join(self.tmp.name, 'view')
+        self.connector.download_file(manifest["view"], view)
+        np.testing.assert_array_equal(load_rgba(view)[..., :3], comparison_image(solution, screenshot))
+
+    def test_write_views(self):
+        solution = render()
+        names = write_views(solution, solution, os.path.join(self.tmp.name, 'views'))
+        self.assertEqual(names, ['comparison', 'difference', 'screenshot'])
+        np.testing.assert_array_equal(load_rgba(os.path.join(self.tmp.name, 'views', 'screenshot.png')), solution)
+
+
+class TestEncoding(unittest.TestCase):
+    def test_png_fallback_is_lossless(self):
+        for rgba in (render(), np.random.RandomState(4).randint(0, 256, size=(40, 40, 4)).astype(np.uint8)):
+            with mock.patch('utils.archive_encoder.features.check', return_value=False):
+                data = encode_lossless(rgba)
+            self.assertEqual(data[:4], b'\x89PNG')
+            np.testing.assert_array_equal(load_rgba(data), rgba)
+
+    def test_delta(self):
+        solution = render()
+        screenshot = solution.copy()
+        screenshot[0, 0, :3] = 0
+        delta = delta_against(screenshot, solution)
+        self.assertEqual(np.count_nonzero(delta[..., 3]), 1)
+        np.testing.assert_array_equal(undo_delta(delta, solution), screenshot)
+        # transparent screenshots could not be told apart from unchanged pixels
+        screenshot[1, 1, 3] = 0
+        self.assertIsNone(delta_against(screenshot, solution))
+
+    def test_term_of(self):
+        self.assertEqual(term_of('2018-07-01T14:22:32.365935-07:00'), '2018-summer')
+        self.assertEqual(term_of('2019-01-15T00:00:00'), '2019-spring')
+        self.assertEqual(term_of('2019-12-01T00:00:00'), '2019-fall')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Unit tests of the feature hooks of utils/browser_session.py with a stand-in driver.
+"""
+import pickle
+import unittest
+from utils.browser_session import BrowserSession, grading_features
+from utils.dom_audit import CollisionCollector
+from utils.virtual_time import VirtualClock
+
+
+class FakeDriver:
+    def __init__(self):
+        self.urls = []
+        self.sizes = []
+
+    def get(self, url):
+        self.urls.append(url)
+
+    def delete_all_cookies(self):
+        pass
+
+    def set_window_size(self, width, height):
+        self.sizes.append((width, height))
+
+    def execute_script(self, script, *args):
+        return [640, 480]
+
+    def quit(self):
+        pass
+
+
+class Recorder:
+    """feature recording the hooks it is called with"""
+
+    def __init__(self, driver=None):
+        self.calls = []
+        self.driver = driver
+
+    def started(self, driver):
+        self.calls.append('started')
+
+    def driver_for(self, url, is_submission):
+        return self.driver
+
+    def loaded(self, driver, url, is_submission):
+        self.calls.append(('loaded', url, is_submission))
+
+    def prepared(self, driver, is_submission):
+        self.calls.append('prepared')
+
+    def leaving(self, driver):
+        self.calls.append('leaving')
+
+    def stopping(self, driver):
+        self.calls.append('stopping')
+
+    def stats(self):
+        return {"calls": len(self.calls)}
+
+
+def session_with(*features):
+    session = BrowserSession('http://localhost/submission.html', list(features))
+    session.launch = lambda: setattr(session, 'driver', FakeDriver())
+    return session
+
+
+class TestBrowserSession(unittest.TestCase):
+    def test_hooks_of_a_borrow(self):
+        recorder = Recorder()
+        session = session_with(recorder)
+        driver = session.borrow()
+        session.release()
+        session.quit()
+        self.assertEqual(recorder.calls, ['started', 'leaving', ('loaded', 'http://localhost/submission.html', True),
+                                          'prepared', 'leaving', 'leaving', 'stopping'])
+        self.assertEqual(driver.urls, ['about:blank', 'http://localhost/submission.html', 'about:blank'])
+        self.assertEqual(driver.sizes, [(800, 600), (640, 480)])
+
+    def test_driver_for_serves_a_borrow_without_the_browser(self):
+        stand_in = FakeDriver()
+        session = session_with(Recorder(stand_in))
+        self.assertIs(session.borrow(), stand_in)
+        self.assertIsNone(session.driver)
+        self.assertEqual(session.stats()["borrows"], 1)
+
+    def test_stats_include_feature_stats(self):
+        session = session_with(Recorder())
+        session.borrow('http://localhost/other.html', fit_window=False)
+        stats = session.stats()
+        self.assertEqual((stats["borrows"], stats["calls"]), (1, 4))
+
+    def test_seconds_saved_from_the_measured_launch(self):
+        session = session_with()
+
+        def launch():
+            session.driver = FakeDriver()
+            session.launches += 1
+            session.launch_seconds = 2.0
+        session.launch = launch
+        for _ in range(3):
+            session.borrow()
+        self.assertEqual(session.stats()["seconds_saved"], 4.0)
+
+    def test_feature_lookup(self):
+        session = BrowserSession(features=grading_features())
+        self.assertIsInstance(session.feature(CollisionCollector), CollisionCollector)
+        self.assertIsNone(session_with(Recorder()).feature(CollisionCollector))
+
+    def test_shard_sessions_copy_the_features_and_pickle(self):
+        session = BrowserSession(features=grading_features())
+        session.feature(VirtualClock).enabled = True
+        session.replay_path = 'recording.jsonl'  # no chrome to attach to
+        shard = pickle.loads(pickle.dumps(session.shard()))
+        self.assertTrue(shard.feature(VirtualClock).enabled)
+        self.assertIsNot(shard.feature(CollisionCollector), session.feature(CollisionCollector))
+        self.assertIsNone(shard.driver)
+
+
+if __name__ == '__main__':
+    unittest.main()
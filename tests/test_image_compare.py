@@ -0,0 +1,110 @@
+"""
+Unit tests of utils/image_compare.py.
+"""
+import io
+import unittest
+import numpy as np
+from PIL import Image
+from utils.image_compare import (similarity_metrics, difference_image, comparison_image, load_rgba, open_rows,
+                                 _gray, _padded_rows, STRIP_ROWS, CHANGED_THRESHOLD)
+
+try:
+    from skimage.metrics import structural_similarity
+except ImportError:
+    structural_similarity = None
+
+
+def random_rgba(height, width, seed=0):
+    rgba = np.random.RandomState(seed).randint(0, 256, size=(height, width, 4)).astype(np.uint8)
+    rgba[..., 3] = 255
+    return rgba
+
+
+def blurred(rgba):
+    # a smoothed copy, so the images differ without being unrelated
+    out = rgba.astype(np.float32)
+    out[1:, :, :3] = (out[1:, :, :3] + out[:-1, :, :3]) / 2
+    return out.round().astype(np.uint8)
+
+
+class TestSimilarityMetrics(unittest.TestCase):
+    def test_identical_images(self):
+        img = random_rgba(40, 30)
+        metrics = similarity_metrics(img, img)
+        self.assertAlmostEqual(metrics["ssim"], 1.0)
+        self.assertEqual(metrics["changed_pixel_ratio"], 0.0)
+        self.assertEqual(np.max(metrics["region_diff"]), 0.0)
+
+    @unittest.skipIf(structural_similarity is None, "scikit-image is not installed")
+    def test_ssim_matches_scikit_image_across_strips(self):
+        # taller than a strip, so windows straddle the strip boundaries
+        img1 = random_rgba(STRIP_ROWS * 2 + 37, 50)
+        img2 = blurred(img1)
+        expected = structural_similarity(_gray(img1[..., :3].astype(np.float32)),
+                                         _gray(img2[..., :3].astype(np.float32)),
+                                         win_size=7, data_range=255)
+        self.assertAlmostEqual(similarity_metrics(img1, img2)["ssim"], expected, places=5)
+
+    def test_changed_pixels_and_regions(self):
+        img1 = np.full((80, 80, 4), 255, dtype=np.uint8)
+        img2 = img1.copy()
+        img2[:20, :20, :3] = 0  # the top left region of the 4 x 4 grid
+        img2[40:, :, :3] -= CHANGED_THRESHOLD  # within the threshold
+        metrics = similarity_metrics(img1, img2)
+        self.assertAlmostEqual(metrics["changed_pixel_ratio"], 400 / 6400)
+        self.assertAlmostEqual(metrics["region_diff"][0][0], 1.0)
+        self.assertEqual(metrics["region_diff"][0][1], 0.0)
+
+    def test_different_sizes_compare_on_the_white_padded_union(self):
+        white = np.full((20, 10, 4), 255, dtype=np.uint8)
+        metrics = similarity_metrics(white, np.full((10, 20, 4), 255, dtype=np.uint8))
+        self.assertEqual(metrics["changed_pixel_ratio"], 0.0)
+        self.assertEqual(metrics["solution_size"], [10, 20])
+        self.assertEqual(metrics["submission_size"], [20, 10])
+
+    def test_transparent_pixels_are_composited_on_white(self):
+        transparent = np.zeros((4, 4, 4), dtype=np.uint8)
+        np.testing.assert_array_equal(_padded_rows(transparent, 0, 4, 4), np.full((4, 4, 3), 255.0))
+
+
+class TestImages(unittest.TestCase):
+    def test_difference_image_marks_changed_pixels_red(self):
+        img1 = np.full((STRIP_ROWS + 10, 5, 4), 255, dtype=np.uint8)
+        img2 = img1.copy()
+        img2[-1, 0, :3] = 0
+        diff = difference_image(img1, img2)
+        self.assertEqual(diff.shape, (STRIP_ROWS + 10, 5, 3))
+        np.testing.assert_array_equal(diff[-1, 0], [255, 0, 0])
+        np.testing.assert_array_equal(diff[0, 0], [255, 255, 255])
+
+    def test_comparison_image_round_trips_as_png(self):
+        view = comparison_image(random_rgba(300, 200), random_rgba(250, 220, seed=1))
+        self.assertEqual(view.dtype, np.uint8)
+        out = io.BytesIO()
+        Image.fromarray(view).save(out, format='PNG')
+        np.testing.assert_array_equal(load_rgba(out.getvalue())[..., :3], view)
+
+
+
+class TestRowImage(unittest.TestCase):
+    def png(self, rgba):
+        out = io.BytesIO()
+        Image.fromarray(rgba).save(out, format='PNG')
+        return out.getvalue()
+
+    def test_rows_read_by_strip_give_the_same_results(self):
+        img1 = random_rgba(STRIP_ROWS * 2 + 5, 40)
+        img2 = blurred(img1)[:STRIP_ROWS + 9]
+        rows1, rows2 = open_rows(self.png(img1)), open_rows(self.png(img2))
+        self.assertEqual(rows1.shape, img1.shape)
+        np.testing.assert_array_equal(rows1[10:20], img1[10:20])
+        self.assertEqual(similarity_metrics(rows1, rows2), similarity_metrics(img1, img2))
+        np.testing.assert_array_equal(difference_image(rows1, rows2), difference_image(img1, img2))
+        np.testing.assert_array_equal(comparison_image(rows1, rows2), comparison_image(img1, img2))
+
+    def test_rgb_pngs_read_as_opaque_rgba(self):
+        rgb = random_rgba(10, 10)[..., :3]
+        np.testing.assert_array_equal(open_rows(self.png(rgb))[0:10], load_rgba(self.png(rgb)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+Unit tests of utils/mark_matching.py.
+"""
+import unittest
+import numpy as np
+from utils.mark_matching import match_marks
+
+
+class TestMatchMarks(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.expected = rng.uniform(0, 500, size=(200, 2))
+
+    def test_any_drawing_order_matches(self):
+        order = np.random.RandomState(1).permutation(len(self.expected))
+        report = match_marks(self.expected[order], self.expected)
+        self.assertTrue(report.all_matched)
+        self.assertEqual(report.fraction_matched, 1.0)
+        np.testing.assert_array_equal(order[report.matched[:, 0]], report.matched[:, 1])
+
+    def test_tolerance_is_per_axis_and_inclusive(self):
+        expected = [[10, 10], [100, 100]]
+        report = match_marks([[12, 8], [103, 100]], expected, tolerance=2)
+        np.testing.assert_array_equal(report.matched, [[0, 0]])
+        np.testing.assert_array_equal(report.missing, [1])
+        np.testing.assert_array_equal(report.extra, [1])
+
+    def test_overlapping_marks_pair_one_to_one(self):
+        expected = [[50, 50], [50, 50], [51, 50]]
+        report = match_marks([[50, 50], [51, 50], [50, 50]], expected, tolerance=2)
+        self.assertTrue(report.all_matched)
+        self.assertEqual(sorted(report.matched[:, 1].tolist()), [0, 1, 2])
+
+    def test_missing_and_extra_marks(self):
+        actual = np.vstack([self.expected[:150], [[-100, -100]]])
+        report = match_marks(actual, self.expected)
+        self.assertEqual(len(report.missing), 50)
+        np.testing.assert_array_equal(report.extra, [150])
+        self.assertAlmostEqual(report.fraction_matched, 0.75)
+        self.assertFalse(report.all_matched)
+
+    def test_nan_rows_never_match(self):
+        report = match_marks([[np.nan, 10], [20, 20]], [[10, 10], [20, 20]])
+        np.testing.assert_array_equal(report.matched, [[1, 1]])
+        np.testing.assert_array_equal(report.extra, [0])
+
+    def test_error_stats(self):
+        report = match_marks([[11, 10], [20, 18]], [[10, 10], [20, 20]], tolerance=2)
+        stats = report.axis_error_stats()
+        self.assertAlmostEqual(stats['x']['mean_abs'], 0.5)
+        self.assertAlmostEqual(stats['y']['max_abs'], 2.0)
+        self.assertAlmostEqual(stats['y']['rmse'], np.sqrt(2.0))
+        self.assertIn("matched 2/2 expected marks", report.summary())
+
+    def test_empty_inputs(self):
+        report = match_marks(np.empty((0, 2)), np.empty((0, 2)))
+        self.assertEqual(report.fraction_matched, 1.0)
+        self.assertIsNone(report.axis_error_stats()['x']['mean_abs'])
+        self.assertEqual(match_marks([[1, 1]], np.empty((0, 2))).fraction_matched, 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Unit tests of utils/pipeline.py.
+"""
+import time
+import threading
+import unittest
+from utils.pipeline import Pipeline
+
+
+def sleeper(seconds, value=None):
+    def stage(*results):
+        time.sleep(seconds)
+        return value
+    return stage
+
+
+class TestPipeline(unittest.TestCase):
+    def test_dependents_get_results_in_order(self):
+        pipeline = Pipeline()
+        pipeline.add('a', lambda: 1).add('b', lambda: 2)
+        pipeline.add('sum', lambda a, b: (a, b), after=['a', 'b'])
+        self.assertEqual(pipeline.run()['sum'], (1, 2))
+
+    def test_unknown_dependency(self):
+        with self.assertRaises(ValueError):
+            Pipeline().add('b', lambda a: a, after=['a'])
+
+    def test_independent_stages_overlap(self):
+        pipeline = Pipeline()
+        for name in 'abc':
+            pipeline.add(name, sleeper(0.3))
+        started = time.perf_counter()
+        pipeline.run()
+        self.assertLess(time.perf_counter() - started, 0.8)
+
+    def test_main_thread_stages(self):
+        pipeline = Pipeline()
+        pipeline.add('worker', lambda: threading.current_thread())
+        pipeline.add('main', lambda worker: threading.current_thread(), after=['worker'], main_thread=True)
+        results = pipeline.run()
+        self.assertIs(results['main'], threading.main_thread())
+        self.assertIsNot(results['worker'], threading.main_thread())
+
+    def test_failing_stage_raises(self):
+        def fail():
+            raise RuntimeError("no browser")
+        pipeline = Pipeline().add('browser', fail)
+        pipeline.add('tests', lambda browser: browser, after=['browser'], main_thread=True)
+        with self.assertRaises(RuntimeError):
+            pipeline.run()
+
+    def test_failing_optional_stage_passes_none(self):
+        def fail():
+            raise RuntimeError("upload failed")
+        pipeline = Pipeline().add('upload', fail, optional=True)
+        pipeline.add('link', lambda upload: upload, after=['upload'])
+        self.assertIsNone(pipeline.run()['link'])
+        self.assertIn("upload failed", pipeline.report()["stages"]["upload"]["error"])
+
+
+class TestCriticalPath(unittest.TestCase):
+    def test_follows_the_dependency_that_finished_last(self):
+        pipeline = Pipeline()
+        pipeline.add('server', sleeper(0.05))
+        pipeline.add('solution', sleeper(0.3), after=['server'])
+        pipeline.add('submission', sleeper(0.05), after=['server'])
+        pipeline.add('compare', sleeper(0.05), after=['solution', 'submission'])
+        pipeline.add('upload', sleeper(0.01), after=['submission'])
+        pipeline.run()
+        path, seconds = pipeline.critical_path()
+        self.assertEqual(path, ['server', 'solution', 'compare'])
+        self.assertGreaterEqual(seconds, 0.4)
+
+        report = pipeline.report()
+        self.assertEqual(report["critical_path"], path)
+        self.assertEqual(report["stages"]["compare"]["after"], ['solution', 'submission'])
+        self.assertGreaterEqual(report["stages"]["solution"]["seconds"], 0.3)
+        self.assertLessEqual(report["critical_path_seconds"], report["wall_seconds"])
+
+    def test_before_run(self):
+        self.assertEqual(Pipeline().add('a', lambda: None).critical_path(), ([], 0.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
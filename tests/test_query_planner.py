@@ -0,0 +1,115 @@
+"""
+Unit tests of utils/query_planner.py with a stand-in driver.
+"""
+import unittest
+from selenium.common.exceptions import NoSuchElementException
+from utils.query_planner import (QueryPlan, needs, requires_elements, element, axis, page_facts,
+                                 reset_page_facts, probe_presence, PLAN_SCRIPT, PRESENCE_SCRIPT)
+
+RECT = {"x": 10.4, "y": 20.6, "width": 30, "height": 40}
+
+
+class FakeDriver:
+    """answers the plan script with facts for the ids in present"""
+
+    def __init__(self, present):
+        self.present = present
+        self.scripts = []
+
+    def execute_script(self, script, *args):
+        self.scripts.append(script)
+        if script == PRESENCE_SCRIPT:
+            return [i for i in args[0] if i not in self.present]
+        assert script == PLAN_SCRIPT
+        payload = []
+        for need in args[0]:
+            if need['id'] not in self.present:
+                payload.append(None)
+                continue
+            facts = {"tag": "g", "text": need['id'], "rect": RECT, "transform": "none"}
+            if need['kind'] == 'axis':
+                facts.update(domain=RECT, ticks=[{"text": "0", "rect": RECT, "x2": None, "y2": "6"}])
+            payload.append(facts)
+        return payload
+
+
+class Planned:
+    @needs(axis('x_axis', within='g'), element('title'))
+    def test_a(self):
+        pass
+
+    @needs(element('x_axis', within='g'))
+    @requires_elements('symbols')
+    def test_b(self):
+        return 'ran'
+
+
+class TestQueryPlan(unittest.TestCase):
+    def setUp(self):
+        self.plan = QueryPlan.compile(Planned, {"elements": {"marks": ["symbols"], "titles": ["title"]}})
+
+    def test_merges_needs_of_every_test_and_the_rubric(self):
+        self.assertEqual(sorted((n.kind, n.id, n.within) for n in self.plan.request),
+                         [('axis', 'x_axis', 'g'), ('element', 'symbols', None), ('element', 'title', None)])
+
+    def test_fetch_is_one_script_call(self):
+        driver = FakeDriver({'x_axis', 'title'})
+        facts = self.plan.fetch(driver)
+        self.assertEqual(driver.scripts, [PLAN_SCRIPT])
+        x_axis = facts.axis('x_axis', within='g')
+        self.assertEqual(x_axis.location, {"x": 10, "y": 21})
+        self.assertEqual(x_axis.ticks[0].y2, "6")
+        self.assertEqual(facts.element('title').text, 'title')
+
+    def test_missing_and_unplanned_elements(self):
+        facts = self.plan.fetch(FakeDriver({'title'}))
+        self.assertIsNone(facts.element('symbols'))
+        with self.assertRaises(NoSuchElementException):
+            facts.require('symbols')
+        with self.assertRaises(KeyError):
+            facts.element('legend')
+        with self.assertRaises(KeyError):
+            facts.axis('title')  # planned as an element
+
+    def test_page_facts_are_memoized_until_reset(self):
+        Planned.query_plan = self.plan
+        Planned.driver = FakeDriver({'title'})
+        reset_page_facts(Planned)
+        test_case = Planned()
+        self.assertIs(page_facts(test_case), page_facts(test_case))
+        self.assertEqual(len(Planned.driver.scripts), 1)
+        reset_page_facts(Planned)
+        page_facts(test_case)
+        self.assertEqual(len(Planned.driver.scripts), 2)
+
+
+class TestRequiresElements(unittest.TestCase):
+    def test_missing_elements_fail_dependents_without_the_browser(self):
+        class Required(unittest.TestCase):
+            required_ids = ['symbols']
+
+            @requires_elements('symbols')
+            def test_marks(self):
+                pass
+        Required.driver = FakeDriver(set())
+        reset_page_facts(Required)
+        Required._missing_elements = ['symbols']  # as left by the presence probe of the class
+        result = unittest.TestResult()
+        unittest.TestSuite([Required('test_marks'), Required('test_marks')]).run(result)
+        self.assertEqual(len(result.failures), 2)
+        self.assertIn("#symbols", result.failures[0][1])
+        self.assertEqual(Required.driver.scripts, [])
+
+    def test_present_elements_run_the_test(self):
+        Planned._missing_elements = []
+        self.assertEqual(Planned().test_b(), 'ran')
+        self.assertEqual(Planned.test_b.__requires__, ('symbols',))
+
+    def test_probe_presence(self):
+        self.assertEqual(probe_presence(FakeDriver({'a'}), ['a']), [])
+        driver = FakeDriver({'a'})
+        self.assertEqual(probe_presence(driver, ['a', 'b'], timeout=0), ['b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+"""
+Unit tests of the readiness metrics of utils/readiness.py with a stand-in driver.
+"""
+import unittest
+from utils.readiness import ReadinessWaiter
+
+
+class FakeDriver:
+    """answers the wait script with the given results, in milliseconds"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+
+    def set_script_timeout(self, time_to_wait):
+        pass
+
+    def execute_async_script(self, script, *args):
+        return self.results.pop(0)
+
+
+class TestReadinessWaiter(unittest.TestCase):
+    def test_stats_report_every_load(self):
+        driver = FakeDriver({"settled": True, "time_to_stable": 420, "waited": 700, "pending": 0, "mutations": 30},
+                            {"settled": False, "time_to_stable": 10000, "waited": 10000, "pending": 1,
+                             "mutations": 5})
+        waiter = ReadinessWaiter()
+        waiter.loaded(driver, 'http://localhost/submission.html', True)
+        waiter.loaded(driver, 'http://localhost/other.html', False)
+        readiness = waiter.stats()["readiness"]
+        self.assertEqual(readiness["loads"], [
+            {"submission": True, "settled": True, "time_to_stable": 0.42, "waited": 0.7},
+            {"submission": False, "settled": False, "time_to_stable": 10.0, "waited": 10.0}])
+        self.assertEqual(readiness["settle_seconds"], 10.7)
+        self.assertEqual(readiness["unsettled_loads"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
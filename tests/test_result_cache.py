@@ -0,0 +1,95 @@
+"""
+Unit tests of utils/result_cache.py.
+"""
+import os
+import json
+import tempfile
+import unittest
+from utils.result_cache import ResultCache, mark_incomplete, incomplete_tests, hash_paths
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(os.path.join(self.tmp.name, 'results'), max_entries=2)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def results_file(self, tests):
+        path = os.path.join(self.tmp.name, 'results.json')
+        with open(path, 'w') as f:
+            json.dump({"score": 1.0, "tests": tests}, f)
+        return path
+
+    def test_put_then_get(self):
+        results_path = self.results_file([{"name": "test_01", "score": 1.0}])
+        self.assertTrue(self.cache.put('key', results_path))
+        self.assertEqual(self.cache.get('key')["tests"][0]["name"], "test_01")
+        self.assertIsNone(self.cache.get('other'))
+
+    def test_incomplete_runs_are_not_stored(self):
+        tests = [{"name": "test_01", "score": 1.0},
+                 mark_incomplete({"name": "test_02", "score": 0.0}, "timed out")]
+        self.assertEqual(incomplete_tests({"tests": tests}), ["test_02"])
+        self.assertFalse(self.cache.put('key', self.results_file(tests)))
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_mark_incomplete_keeps_extra_data(self):
+        entry = mark_incomplete({"name": "t", "extra_data": {"seconds": 1}}, "browser error")
+        self.assertEqual(entry["extra_data"], {"seconds": 1, "incomplete": "browser error"})
+
+    def test_evicts_least_recently_used(self):
+        results_path = self.results_file([])
+        for age, key in enumerate(['a', 'b']):
+            self.cache.put(key, results_path)
+            os.utime(self.cache._path(key), (1000 + age, 1000 + age))
+        self.cache.get('a')  # a hit makes 'a' the most recently used
+        self.cache.put('c', results_path)
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+    def test_corrupt_entry_is_a_miss(self):
+        write(self.cache._path('key'), '{"tests": [')
+        self.assertIsNone(self.cache.get('key'))
+
+
+class TestCacheKey(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.submission = os.path.join(self.tmp.name, 'submission')
+        write(os.path.join(self.submission, 'submission.html'), '<svg></svg>')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def key(self):
+        return ResultCache(self.tmp.name).key(self.submission, 'scatterplot')
+
+    def test_generated_files_do_not_change_the_key(self):
+        key = self.key()
+        write(os.path.join(self.submission, 'plot.png'), 'screenshot')
+        self.assertEqual(self.key(), key)
+
+    def test_submitted_files_change_the_key(self):
+        key = self.key()
+        write(os.path.join(self.submission, 'submission.html'), '<svg><circle/></svg>')
+        self.assertNotEqual(self.key(), key)
+
+    def test_hash_paths_covers_names_and_contents(self):
+        directory = os.path.join(self.tmp.name, 'grader')
+        write(os.path.join(directory, 'a.yaml'), 'x: 1')
+        first = hash_paths([directory]).hexdigest()
+        os.rename(os.path.join(directory, 'a.yaml'), os.path.join(directory, 'b.yaml'))
+        self.assertNotEqual(hash_paths([directory]).hexdigest(), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
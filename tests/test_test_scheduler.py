@@ -0,0 +1,109 @@
+"""
+Unit tests of utils/test_scheduler.py.
+"""
+import os
+import json
+import time
+import tempfile
+import unittest
+from gradescope_utils.autograder_utils.decorators import weight
+from utils import test_scheduler
+from utils.test_scheduler import (schedule, summarize_durations, load_durations, iter_tests, isolated_context,
+                                  BUDGET_SKIP_REASON)
+
+
+def suite():
+    # defined here so test runners do not collect them on their own
+    class Cheap(unittest.TestCase):
+        @weight(1)
+        def test_1(self):
+            """cheap test_1"""
+
+        @weight(4)
+        def test_2(self):
+            """cheap test_2"""
+
+    class Costly(unittest.TestCase):
+        @weight(10)
+        def test_3(self):
+            """costly test_3"""
+
+        def test_4(self):
+            """costly test_4"""
+            time.sleep(3)
+    loader = unittest.defaultTestLoader
+    return unittest.TestSuite([loader.loadTestsFromTestCase(Cheap), loader.loadTestsFromTestCase(Costly)])
+
+
+def names(suite):
+    return [test_scheduler.test_name(test) for test in iter_tests(suite)]
+
+
+class TestSchedule(unittest.TestCase):
+    def test_orders_classes_then_tests_by_points_per_second(self):
+        durations = {"cheap test_1": 0.5, "cheap test_2": 0.5, "costly test_3": 10, "costly test_4": 10}
+        # Cheap: 5 points in 1s, Costly: 10 points in 20s
+        self.assertEqual(names(schedule(suite(), durations)),
+                         ["cheap test_2", "cheap test_1", "costly test_3", "costly test_4"])
+
+    def test_ties_keep_discovery_order(self):
+        self.assertEqual(names(schedule(suite(), {"costly test_3": 1, "costly test_4": 1,
+                                                  "cheap test_1": 1, "cheap test_2": 1})),
+                         ["costly test_3", "costly test_4", "cheap test_2", "cheap test_1"])
+
+    def test_tests_past_the_deadline_are_skipped(self):
+        result = unittest.TestResult()
+        schedule(suite(), deadline=time.time()).run(result)
+        self.assertEqual(result.testsRun, 4)
+        self.assertEqual({reason for _, reason in result.skipped}, {BUDGET_SKIP_REASON})
+
+    def test_test_limit(self):
+        result = unittest.TestResult()
+        started = time.time()
+        slow = [test for test in iter_tests(suite()) if test._testMethodName == 'test_4']
+        schedule(unittest.TestSuite(slow), test_limit=1).run(result)
+        self.assertLess(time.time() - started, 2.5)
+        self.assertEqual(len(result.errors), 1)
+        self.assertIn("Timed out", result.errors[0][1])
+
+    def test_isolated_tests_run_last_in_their_class(self):
+        class Page(unittest.TestCase):
+            @weight(2.5)
+            @isolated_context
+            def test_03(self):
+                """hover test_03"""
+
+            @weight(2)
+            def test_02(self):
+                """marks test_02"""
+
+            @weight(0.25)
+            def test_13(self):
+                """axis test_13"""
+        suite = unittest.defaultTestLoader.loadTestsFromTestCase(Page)
+        self.assertEqual(names(schedule(suite)), ["marks test_02", "axis test_13", "hover test_03"])
+
+    def test_budget_is_kept_on_the_test(self):
+        test = next(iter_tests(schedule(suite(), deadline=123.0, test_limit=5)))
+        self.assertEqual(test.__budget__, (123.0, 5))
+
+
+class TestDurations(unittest.TestCase):
+    def test_summarize_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for run, seconds in enumerate((1.0, 2.0)):
+                paths.append(os.path.join(tmp, f'metrics{run}.jsonl'))
+                with open(paths[-1], 'w') as f:
+                    f.write(json.dumps({"tests": [{"name": "t", "seconds": seconds}]}) + '\n\n')
+            durations = summarize_durations(paths)
+            self.assertEqual(durations, {"t": 1.5})
+            path = os.path.join(tmp, 'durations.json')
+            with open(path, 'w') as f:
+                json.dump(durations, f)
+            self.assertEqual(load_durations(path), {"t": 1.5})
+            self.assertEqual(load_durations(os.path.join(tmp, 'missing.json')), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
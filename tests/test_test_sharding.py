@@ -0,0 +1,87 @@
+"""
+Unit tests of utils/test_sharding.py.
+"""
+import queue
+import unittest
+from utils.dom_audit import CollisionCollector
+from utils.test_sharding import _run_shard, error_scope
+
+
+class BrokenSetUp(unittest.TestCase):
+    # run by name in the shard below, not collected on its own
+    __test__ = False
+
+    @classmethod
+    def setUpClass(cls):
+        raise RuntimeError("no page")
+
+    def test_1(self):
+        pass
+
+
+class AlsoBrokenSetUp(BrokenSetUp):
+    __test__ = False
+
+
+class Passing(unittest.TestCase):
+    __test__ = False
+
+    def test_2(self):
+        pass
+
+
+class EntryResult(unittest.TestResult):
+    """result class with the constructor of CustomJSONTestResult, one entry per outcome"""
+    def __init__(self, stream, descriptions, verbosity, results, leaderboard):
+        super().__init__(stream, descriptions, verbosity)
+        self.results = results
+
+    def addSuccess(self, test):
+        super().addSuccess(test)
+        self.results.append({"name": test.id(), "status": "passed"})
+        self.on_result(test)
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        self.results.append({"name": str(test), "status": "failed"})
+        self.on_result(test)
+
+
+class FakeSession:
+    def quit(self):
+        pass
+
+    def feature(self, kind):
+        return CollisionCollector()
+
+
+class TestRunShard(unittest.TestCase):
+    def run_shard(self, classes, indices):
+        messages = queue.Queue()
+        test_ids = [(f"{__name__}.{cls.__name__}.{name}", None) for cls, name in classes]
+        _run_shard(EntryResult, False, False, test_ids, indices, FakeSession(), messages)
+        return [message for message in iter(messages.get_nowait, ('done', None, None))]
+
+    def test_class_errors_keyed_apart(self):
+        sent = self.run_shard([(BrokenSetUp, 'test_1'), (AlsoBrokenSetUp, 'test_1'), (Passing, 'test_2')],
+                              [3, 5, 8])
+        errors = [(index, payload) for kind, index, payload in sent if kind == 'error']
+        tests = [(index, payload) for kind, index, payload in sent if kind == 'test']
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(len({index for index, _ in errors}), 2)
+        self.assertEqual([scope for _, (scope, _) in errors],
+                         [f"{__name__}.BrokenSetUp", f"{__name__}.AlsoBrokenSetUp"])
+        self.assertEqual([index for index, _ in tests], [(8, 0)])
+        # merged in suite order: both errors come before the test that ran after them
+        self.assertEqual(sorted([index for index, _ in errors + tests])[-1], (8, 0))
+        self.assertLess((2, 0), min(index for index, _ in errors))
+
+    def test_error_scope(self):
+        holder = unittest.suite._ErrorHolder("setUpClass (test_d3.TestFiles)")
+        self.assertEqual(error_scope(holder), "test_d3.TestFiles")
+        holder = unittest.suite._ErrorHolder("setUpModule (test_d3)")
+        self.assertEqual(error_scope(holder), "test_d3")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+Unit tests of the WebDriver command meters of utils/timing_helper.py.
+"""
+import threading
+import unittest
+from utils.timing_helper import CommandMeter, MeterCommands, PhaseTimer, COMMANDS
+
+
+class FakeDriver:
+    def execute(self, driver_command, params=None):
+        return {"value": None}
+
+
+class TestCommandMeter(unittest.TestCase):
+    def test_counts_commands_of_drivers_in_many_threads(self):
+        meter = CommandMeter()
+        drivers = [meter.attach(FakeDriver()) for _ in range(4)]
+
+        def send(driver):
+            for _ in range(2000):
+                driver.execute('getTitle')
+        threads = [threading.Thread(target=send, args=(driver,)) for driver in drivers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(meter.reading()[0], 8000)
+
+    def test_own_meter_keeps_commands_from_the_tests(self):
+        tests_before = COMMANDS.reading()
+        render_meter = CommandMeter()
+        driver = FakeDriver()
+        MeterCommands(render_meter).started(driver)
+        driver.execute('screenshot')
+        self.assertEqual(COMMANDS.reading(), tests_before)
+        self.assertEqual(render_meter.reading()[0], 1)
+
+        timer = PhaseTimer()
+        timer.add('submission_render', 1.0, render_meter)
+        self.assertEqual(timer.report()["phases"][0]["webdriver_commands"], 1)
+
+    def test_shard_sessions_meter_their_process(self):
+        self.assertIsNone(MeterCommands(CommandMeter()).shard().meter)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+Unit tests of utils/upload_queue.py and the local storage connector of utils/dropbox_helper.py.
+"""
+import os
+import hashlib
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from utils.upload_queue import UploadQueue
+from utils.dropbox_helper import DropboxConnector, LocalStorageConnector, content_hash, HASH_BLOCK_SIZE
+
+
+class FlakyConnector:
+    """fails the first `failures` uploads of every path"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.attempts = {}
+        self.stored = []
+        self._lock = threading.Lock()
+
+    def upload_file(self, file_from, file_to):
+        with self._lock:
+            self.attempts[file_to] = self.attempts.get(file_to, 0) + 1
+            if self.attempts[file_to] <= self.failures:
+                raise ConnectionError("connection reset")
+            self.stored.append(file_to)
+        return True
+
+
+class TestUploadQueue(unittest.TestCase):
+    def setUp(self):
+        # no real waiting between retries
+        patcher = mock.patch('utils.upload_queue.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_uploads_every_file(self):
+        connector = FlakyConnector()
+        uploads = UploadQueue(connector, workers=2)
+        futures = [uploads.put(f'file{i}', f'/dest/{i}') for i in range(5)]
+        report = uploads.close(timeout=10)
+        self.assertTrue(all(future.result() for future in futures))
+        self.assertEqual(sorted(connector.stored), sorted(f'/dest/{i}' for i in range(5)))
+        self.assertEqual(report["pending"], 0)
+        self.assertEqual({entry["status"] for entry in report["uploads"]}, {"uploaded"})
+
+    def test_retries_with_exponential_backoff(self):
+        uploads = UploadQueue(FlakyConnector(failures=2), workers=1, retries=3, backoff=0.5)
+        self.assertTrue(uploads.put('a', '/a').result(timeout=10))
+        self.assertEqual([call[0][0] for call in self.sleep.call_args_list], [0.5, 1.0])
+        self.assertEqual(uploads.close()["uploads"][0]["attempts"], 3)
+
+    def test_gives_up_after_the_retries(self):
+        uploads = UploadQueue(FlakyConnector(failures=10), workers=1, retries=2)
+        future = uploads.put('a', '/a')
+        with self.assertRaises(ConnectionError):
+            future.result(timeout=10)
+        entry = uploads.close()["uploads"][0]
+        self.assertEqual((entry["status"], entry["attempts"]), ("failed", 3))
+        self.assertIn("connection reset", entry["error"])
+
+    def test_skipped_uploads(self):
+        connector = mock.Mock()
+        connector.upload_file.return_value = False
+        uploads = UploadQueue(connector)
+        self.assertFalse(uploads.put('a', '/a').result(timeout=10))
+        self.assertEqual(uploads.close()["uploads"][0]["status"], "skipped")
+
+
+class TestLocalStorageConnector(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.source = os.path.join(self.tmp.name, 'plot.png')
+        with open(self.source, 'wb') as f:
+            f.write(b'png bytes')
+        self.connector = LocalStorageConnector(os.path.join(self.tmp.name, 'archive'))
+
+    def test_same_content_is_skipped(self):
+        self.assertTrue(self.connector.upload_file(self.source, '/submissions/a/plot.png'))
+        self.assertFalse(self.connector.upload_file(self.source, '/submissions/a/plot.png'))
+        with open(self.source, 'wb') as f:
+            f.write(b'other bytes')
+        self.assertTrue(self.connector.upload_file(self.source, '/submissions/a/plot.png'))
+
+    def test_download_and_shared_link(self):
+        self.connector.upload_file(self.source, '/submissions/a/plot.png')
+        copy = os.path.join(self.tmp.name, 'copy.png')
+        self.connector.download_file('/submissions/a/plot.png', copy)
+        with open(copy, 'rb') as f:
+            self.assertEqual(f.read(), b'png bytes')
+        self.assertTrue(self.connector.get_shared_link('/submissions/a/plot.png').url.startswith('file://'))
+        with self.assertRaises(FileNotFoundError):
+            self.connector.get_shared_link('/submissions/a/missing.png')
+
+    def test_content_hash_is_dropbox_block_hash(self):
+        data = os.urandom(HASH_BLOCK_SIZE + 10)
+        with open(self.source, 'wb') as f:
+            f.write(data)
+        blocks = hashlib.sha256(hashlib.sha256(data[:HASH_BLOCK_SIZE]).digest() +
+                                hashlib.sha256(data[HASH_BLOCK_SIZE:]).digest())
+        self.assertEqual(content_hash(self.source), blocks.hexdigest())
+
+
+
+class TestDropboxConnector(unittest.TestCase):
+    def connector(self, chunk_size):
+        connector = DropboxConnector.__new__(DropboxConnector)  # without a Dropbox session
+        connector.chunk_size = chunk_size
+        connector.dbx = mock.Mock()
+        connector.dbx.files_get_metadata.return_value = mock.Mock(content_hash=None)
+        connector.dbx.files_upload_session_start.return_value = mock.Mock(session_id='s')
+        return connector
+
+    def test_large_files_are_sent_in_chunks(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b'x' * 25)
+            f.flush()
+            connector = self.connector(chunk_size=10)
+            self.assertTrue(connector.upload_file(f.name, '/a'))
+        dbx = connector.dbx
+        self.assertEqual(len(dbx.files_upload_session_start.call_args[0][0]), 10)
+        self.assertEqual(dbx.files_upload_session_append_v2.call_count, 1)
+        data, cursor, commit = dbx.files_upload_session_finish.call_args[0]
+        self.assertEqual((len(data), cursor.offset), (5, 20))
+        dbx.files_upload.assert_not_called()
+
+    def test_stored_content_is_skipped(self):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b'x')
+            f.flush()
+            connector = self.connector(chunk_size=10)
+            connector.dbx.files_get_metadata.return_value = mock.Mock(content_hash=content_hash(f.name))
+            self.assertFalse(connector.upload_file(f.name, '/a'))
+        connector.dbx.files_upload.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+"""
+Unit tests of utils/vector_scales.py against values of the d3-scale (v6) scales it mirrors.
+"""
+import unittest
+import numpy as np
+from utils.vector_scales import (LinearScale, PowScale, SqrtScale, LogScale, TimeScale, BandScale,
+                                 scale_linear)
+
+
+class TestLinearScale(unittest.TestCase):
+    def test_maps_and_extrapolates(self):
+        scale = LinearScale(domain=(0, 10), range=(0, 100))
+        np.testing.assert_allclose(scale([0, 2.5, 10, -1, 12]), [0, 25, 100, -10, 120])
+
+    def test_reversed_range(self):
+        # y scales map the domain onto (height, 0)
+        np.testing.assert_allclose(LinearScale(domain=(0, 50), range=(500, 0))([0, 10, 50]), [500, 400, 0])
+
+    def test_descending_domain(self):
+        np.testing.assert_allclose(LinearScale(domain=(10, 0), range=(0, 100))([10, 7.5, 0]), [0, 25, 100])
+
+    def test_polylinear(self):
+        scale = LinearScale(domain=(-1, 0, 1), range=(0, 100, 300))
+        np.testing.assert_allclose(scale([-1, -0.5, 0, 0.5, 1, 2]), [0, 50, 100, 200, 300, 500])
+
+    def test_clamp_and_round(self):
+        scale = LinearScale(domain=(0, 3), range=(0, 10), clamp=True, round=True)
+        np.testing.assert_allclose(scale([-5, 1, 2, 9]), [0, 3, 7, 10])
+
+    def test_round_halves_up(self):
+        # Math.round, not round half to even
+        np.testing.assert_allclose(LinearScale(domain=(0, 4), range=(0, 10), round=True)([1, 3]), [3, 8])
+
+    def test_degenerate_domain_maps_to_midpoint(self):
+        np.testing.assert_allclose(LinearScale(domain=(5, 5), range=(0, 100))([5, 7]), [50, 50])
+
+    def test_invert(self):
+        scale = LinearScale(domain=(0, 50), range=(500, 0))
+        np.testing.assert_allclose(scale.invert(scale([0, 12.5, 50])), [0, 12.5, 50])
+
+    def test_scale_linear_drop_in(self):
+        np.testing.assert_allclose(scale_linear([0, 5, 10], 0, 200, 0, 10, invert=True), [200, 100, 0])
+
+
+class TestPowScales(unittest.TestCase):
+    def test_sqrt(self):
+        np.testing.assert_allclose(SqrtScale(domain=(0, 100), range=(0, 10))([0, 25, 100]), [0, 5, 10])
+
+    def test_pow_preserves_sign(self):
+        scale = PowScale(domain=(-2, 2), range=(-4, 4), exponent=2)
+        np.testing.assert_allclose(scale([-2, -1, 0, 1, 2]), [-4, -1, 0, 1, 4])
+
+    def test_invert(self):
+        scale = PowScale(domain=(0, 3), range=(0, 9), exponent=2)
+        np.testing.assert_allclose(scale.invert([0, 1, 9]), [0, 1, 3])
+
+
+class TestLogScale(unittest.TestCase):
+    def test_positive_domain(self):
+        np.testing.assert_allclose(LogScale(domain=(1, 1000), range=(0, 3))([1, 10, 100, 1000]), [0, 1, 2, 3])
+
+    def test_negative_domain(self):
+        np.testing.assert_allclose(LogScale(domain=(-1000, -1), range=(0, 3))([-1000, -10, -1]), [0, 2, 3])
+
+    def test_values_outside_the_domain_sign_are_nan(self):
+        values = LogScale(domain=(1, 10))([-1, 0])
+        self.assertTrue(np.isnan(values[0]))
+        self.assertEqual(values[1], -np.inf)  # log(0), as in d3
+
+    def test_invert(self):
+        np.testing.assert_allclose(LogScale(domain=(1, 100), range=(0, 2)).invert([0, 1, 2]), [1, 10, 100])
+
+
+class TestTimeScale(unittest.TestCase):
+    def test_dates_as_epoch_milliseconds(self):
+        scale = TimeScale(domain=('2020-01-01', '2020-01-11'), range=(0, 10))
+        np.testing.assert_allclose(scale(np.array(['2020-01-01', '2020-01-06', '2020-01-11'], dtype='datetime64[D]')),
+                                   [0, 5, 10])
+
+    def test_missing_dates_are_nan(self):
+        scale = TimeScale(domain=('2020-01-01', '2020-01-11'), range=(0, 10))
+        self.assertTrue(np.isnan(scale(np.array(['NaT'], dtype='datetime64[ms]'))[0]))
+
+    def test_invert(self):
+        scale = TimeScale(domain=('2020-01-01', '2020-01-11'), range=(0, 10))
+        self.assertEqual(scale.invert([5])[0], np.datetime64('2020-01-06T00:00:00.000'))
+
+
+class TestBandScale(unittest.TestCase):
+    def test_positions_and_bandwidth(self):
+        scale = BandScale(domain=['a', 'b', 'c'], range=(0, 300))
+        np.testing.assert_allclose(scale(['a', 'b', 'c']), [0, 100, 200])
+        self.assertEqual(scale.bandwidth, 100)
+
+    def test_padding(self):
+        # d3.scaleBand().domain(['a', 'b']).range([0, 100]).padding(0.2)
+        scale = BandScale(domain=['a', 'b'], range=(0, 100), padding_inner=0.2, padding_outer=0.2)
+        np.testing.assert_allclose(scale(['a', 'b']), [100 / 11, 100 / 11 + 500 / 11])
+        self.assertAlmostEqual(scale.bandwidth, 400 / 11)
+
+    def test_reversed_range(self):
+        np.testing.assert_allclose(BandScale(domain=['a', 'b'], range=(100, 0))(['a', 'b']), [50, 0])
+
+    def test_round(self):
+        scale = BandScale(domain=['a', 'b', 'c'], range=(0, 100), round=True)
+        np.testing.assert_allclose(scale(['a', 'b', 'c']), [1, 34, 67])
+        self.assertEqual(scale.bandwidth, 33)
+
+    def test_unknown_values_are_nan(self):
+        values = BandScale(domain=['a'], range=(0, 10))(['a', 'z'])
+        self.assertEqual(values[0], 0)
+        self.assertTrue(np.isnan(values[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+"""
+Compact encoding of the archived renders of a grading run.
+The solution screenshot is stored once per term, named by its content hash; each attempt stores
+its screenshot as a lossless WebP delta against that solution (pixels equal to the solution are
+transparent, so a close submission costs little more than its differences), a small lossy
+WebP thumbnail for reviewers and a manifest naming the files. Full-resolution screenshot,
+comparison and difference views are rebuilt on demand from the stored images:
+
+    python -m utils.archive_encoder /submissions/<assignment>/<student>/<created_at>_archive.json views/ --archive-dir archive
+
+Without WebP support in Pillow, images are stored as PNG, with a palette when every color fits.
+
+For a close submission the archive of an attempt is a few KB, over ten times smaller than
+the comparison PNG each attempt used to store. The comparison view the student's link shows is
+uploaded next to it as lossless WebP at full resolution (about 20 KB for an 824 x 659 view):
+it is the feedback of the attempt rather than its archive, lossy WebP makes the text and thin
+marks of plots larger rather than smaller, and a downscaled view would be unreadable, so
+together they are only about twice smaller than before.
+"""
+import io
+import os
+import json
+import hashlib
+import argparse
+import tempfile
+import numpy as np
+from PIL import Image, features
+from utils.image_compare import load_rgba, save_png, comparison_image, difference_image
+
+THUMBNAIL_WIDTH = 240
+THUMBNAIL_QUALITY = 60
+# first month of the spring, summer and fall terms
+TERM_STARTS = ((1, 'spring'), (5, 'summer'), (8, 'fall'))
+
+
+def term_of(created_at):
+    """term of an ISO submission date, e.g. '2018-07-01T14:22:32.365935-07:00' -> '2018-summer'"""
+    year, month = int(created_at[:4]), int(created_at[5:7])
+    return f"{year}-{[name for first, name in TERM_STARTS if month >= first][-1]}"
+
+
+def image_extension():
+    return '.webp' if features.check('webp') else '.png'
+
+
+def encode_lossless(rgba):
+    """bytes of rgba (or RGB) as lossless WebP, or as PNG (with a palette when <= 256 colors)
+    without WebP"""
+    out = io.BytesIO()
+    if rgba.shape[2] == 3:
+        rgba = np.dstack([rgba, np.full(rgba.shape[:2], 255, dtype=np.uint8)])
+    if features.check('webp'):
+        Image.fromarray(rgba).save(out, format='WEBP', lossless=True, method=6)
+        return out.getvalue()
+    colors, indices = np.unique(rgba.reshape(-1, 4), axis=0, return_inverse=True)
+    if len(colors) > 256:
+        Image.fromarray(rgba).save(out, format='PNG', optimize=True)
+        return out.getvalue()
+    # an exact palette of every color (with its alpha), so it is still lossless
+    image = Image.fromarray(indices.reshape(rgba.shape[:2]).astype(np.uint8), 'P')
+    image.putpalette(colors[:, :3].flatten().tolist())
+    image.save(out, format='PNG', optimize=True, transparency=bytes(colors[:, 3].tolist()))
+    return out.getvalue()
+
+
+def delta_against(screenshot, solution):
+    """screenshot with the pixels equal to solution made transparent, None when the images
+    are not the same size or the screenshot is not opaque (the delta could not be undone)
+    """
+    if screenshot.shape != solution.shape or screenshot[..., 3].min() != 255:
+        return None
+    delta = screenshot.copy()
+    delta[np.all(screenshot == solution, axis=2)] = 0
+    return delta
+
+
+def undo_delta(delta, solution):
+    return np.where(delta[..., 3:4] == 0, solution, delta)
+
+
+def thumbnail(rgba, width=THUMBNAIL_WIDTH):
+    """bytes of a lossy WebP (JPEG without WebP support) at most width pixels wide"""
+    image = Image.fromarray(rgba).convert('RGB')
+    image.thumbnail((width, image.height), Image.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, format='WEBP' if features.check('webp') else 'JPEG', quality=THUMBNAIL_QUALITY)
+    return out.getvalue()
+
+
+def content_name(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def encode_attempt(solution_png, submission_png, comparison_png, out_dir, solution_dir, attempt_prefix):
+    """Write the archive files of one attempt to out_dir.
+    comparison_png is the solution / submission / blend view (see image_compare.comparison_image),
+    uploaded for the student's link but not part of the archive; the manifest lists the bytes of
+    each file.
+    solution_dir and attempt_prefix are the storage paths the files will be uploaded under;
+    returns the manifest and the [(local path, storage path)] to upload, the manifest last.
+    """
+    solution = load_rgba(solution_png)
+    screenshot = load_rgba(submission_png)
+    extension = image_extension()
+    solution_data = encode_lossless(solution)
+    delta = delta_against(screenshot, solution)
+    files = {
+        "solution": (solution_dir + content_name(solution_data) + extension, solution_data),
+        "screenshot": (attempt_prefix + "plot" + extension,
+                       encode_lossless(screenshot if delta is None else delta)),
+        "view": (attempt_prefix + "comparison" + extension, encode_lossless(load_rgba(comparison_png))),
+        "thumbnail": (attempt_prefix + "thumbnail" + ('.webp' if features.check('webp') else '.jpg'),
+                      thumbnail(screenshot)),
+    }
+    manifest = {name: storage_path for name, (storage_path, _) in files.items()}
+    manifest["delta"] = delta is not None
+    manifest["size"] = [int(screenshot.shape[1]), int(screenshot.shape[0])]
+    manifest["bytes"] = {name: len(data) for name, (_, data) in files.items()}
+
+    uploads = []
+    for name, (storage_path, data) in files.items():
+        local_path = os.path.join(out_dir, 'archive_' + os.path.basename(storage_path))
+        with open(local_path, 'wb') as f:
+            f.write(data)
+        uploads.append((local_path, storage_path))
+    manifest_path = os.path.join(out_dir, 'archive.json')
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=4)
+    uploads.append((manifest_path, attempt_prefix + "archive.json"))
+    return manifest, uploads
+
+
+def decode_attempt(connector, manifest_path):
+    """(solution, screenshot) RGBA arrays of an archived attempt, downloaded through connector"""
+    with tempfile.TemporaryDirectory() as tmp:
+        def download(storage_path):
+            local_path = os.path.join(tmp, os.path.basename(storage_path))
+            connector.download_file(storage_path, local_path)
+            return local_path
+        with open(download(manifest_path)) as f:
+            manifest = json.load(f)
+        solution = load_rgba(download(manifest["solution"]))
+        screenshot = load_rgba(download(manifest["screenshot"]))
+    return solution, (undo_delta(screenshot, solution) if manifest["delta"] else screenshot)
+
+
+def write_views(solution, screenshot, out_dir):
+    """the on-demand views of an attempt: screenshot, side by side + blend comparison and diff"""
+    os.makedirs(out_dir, exist_ok=True)
+    views = {"screenshot": screenshot,
+             "comparison": comparison_image(solution, screenshot),
+             "difference": difference_image(solution, screenshot)}
+    for name, rgba in views.items():
+        save_png(rgba, os.path.join(out_dir, name + '.png'))
+    return sorted(views)
+
+
+if __name__ == '__main__':
+    from utils.dropbox_helper import DropboxConnector, LocalStorageConnector
+    parser = argparse.ArgumentParser(description="Rebuild the views of an archived attempt.")
+    parser.add_argument('manifest', help="storage path of the attempt's archive.json")
+    parser.add_argument('out_dir')
+    storage = parser.add_mutually_exclusive_group(required=True)
+    storage.add_argument('--archive-dir', help="local archive folder (ARCHIVE_DIR of the runs)")
+    storage.add_argument('--token', help="Dropbox access token")
+    args = parser.parse_args()
+    connector = LocalStorageConnector(args.archive_dir) if args.archive_dir else DropboxConnector(args.token)
+    names = write_views(*decode_attempt(connector, args.manifest), args.out_dir)
+    print(f"wrote {', '.join(name + '.png' for name in names)} to {args.out_dir}")
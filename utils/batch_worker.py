@@ -0,0 +1,121 @@
+"""
+Per-process grading worker used by batch_grade.py and grading_daemon.py.
+Each worker process owns a staging directory, a static file server on its own
+ephemeral port and a browser session, and grades one submission at a time through JSONTestRunner.
+Workers can also save a render snapshot next to each results.json ('capture') or grade
+from previously captured snapshots without a browser ('replay').
+"""
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from multiprocessing.util import Finalize
+from utils.gs_helper import JSONTestRunner
+from utils.browser_session import get_session
+from utils.static_server import StaticServer
+from utils.render_snapshot import SNAPSHOT_NAME, SnapshotSource, SnapshotCapture
+from utils.dom_audit import CollisionCollector
+from utils.timing_helper import PhaseTimer
+
+
+class _Worker:
+    def __init__(self, recycle_jobs=None, recycle_memory_mb=None, snapshots=None):
+        self.snapshots = snapshots
+        self.recycle_jobs = recycle_jobs
+        self.recycle_memory_mb = recycle_memory_mb
+        self.jobs_since_launch = 0
+        self.staging_dir = tempfile.mkdtemp(prefix='visgrader-worker-')
+        self.server = StaticServer(self.staging_dir).start()
+        self.session = get_session()
+        self.session.submission_url = self.server.url('submission.html')
+
+    def stage(self, submission_dir):
+        """lay out the submission like run_autograder does: student files plus data/ and lib/"""
+        for name in os.listdir(self.staging_dir):
+            path = os.path.join(self.staging_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        for name in os.listdir(submission_dir):
+            path = os.path.join(submission_dir, name)
+            if os.path.isdir(path):
+                shutil.copytree(path, os.path.join(self.staging_dir, name))
+            else:
+                shutil.copy(path, self.staging_dir)
+        # the official data and d3 libraries replace any copies the student submitted
+        for shared_dir in ('data', 'lib'):
+            shutil.rmtree(os.path.join(self.staging_dir, shared_dir), ignore_errors=True)
+            shutil.copytree(shared_dir, os.path.join(self.staging_dir, shared_dir))
+
+    def warm_up(self, assignment_id):
+        """launch chrome and import the test suites before the first job arrives"""
+        self.session.start()
+        unittest.defaultTestLoader.discover(assignment_id + '/tests')
+
+    def after_job(self):
+        """relaunch chrome after recycle_jobs jobs or once it grows past recycle_memory_mb"""
+        self.jobs_since_launch += 1
+        too_many_jobs = self.recycle_jobs and self.jobs_since_launch >= self.recycle_jobs
+        memory = self.session.memory_bytes() if self.recycle_memory_mb else None
+        too_much_memory = memory is not None and memory > self.recycle_memory_mb * 1024 * 1024
+        if too_many_jobs or too_much_memory:
+            self.session.restart()
+            self.jobs_since_launch = 0
+
+    def shutdown(self):
+        self.session.quit()
+        self.server.shutdown()
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+
+_worker = None
+
+def init_worker(assignment_id='scatterplot', warm=False, recycle_jobs=None, recycle_memory_mb=None,
+                snapshots=None):
+    """ProcessPoolExecutor initializer: start this process' server.
+    With warm=True chrome is launched and the test suites imported right away.
+    snapshots is None, 'capture' or 'replay'.
+    """
+    global _worker
+    _worker = _Worker(recycle_jobs, recycle_memory_mb, snapshots)
+    Finalize(None, _worker.shutdown, exitpriority=10)
+    if warm:
+        _worker.warm_up(assignment_id)
+
+
+def grade_submission(submission_dir, results_path, assignment_id='scatterplot', comment=''):
+    """Grade one submission directory in this worker and write its results.json.
+    In replay mode submission_dir only needs to contain a snapshot.json.gz.
+    Returns the results as a dict.
+    """
+    os.makedirs(os.path.dirname(results_path) or '.', exist_ok=True)
+    metrics = PhaseTimer()
+    try:
+        if _worker.snapshots == 'replay':
+            _worker.session.feature(SnapshotSource).path = os.path.join(submission_dir, SNAPSHOT_NAME)
+        else:
+            with metrics.phase('stage'):
+                _worker.stage(submission_dir)
+        if _worker.snapshots == 'capture':
+            _worker.session.feature(SnapshotCapture).path = os.path.join(os.path.dirname(results_path) or '.', SNAPSHOT_NAME)
+        suite = unittest.defaultTestLoader.discover(assignment_id + '/tests')
+        dom_audit = _worker.session.feature(CollisionCollector).reset()
+        JSONTestRunner(
+            stream=None,
+            results_path=results_path,
+            stdout_visibility='hidden',
+            visibility='visible',
+            comment=comment,
+            extra_data={"dom_audit": dom_audit},
+            metrics=metrics,
+            metrics_path=os.path.join(os.path.dirname(results_path) or '.', 'metrics.jsonl'),
+            ).run(suite)
+    except Exception as e:
+        json_data = {"output": f"[ERROR] Batch grading failed: {e!r}", "score": 0.0}
+        json.dump(json_data, open(results_path, 'w'), indent=4)
+    if _worker.snapshots != 'replay':
+        _worker.after_job()
+    with open(results_path) as f:
+        return json.load(f)
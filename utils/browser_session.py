@@ -0,0 +1,266 @@
+"""
+Session-scoped headless Chrome shared by every phase of a grading run
+(solution screenshot, submission screenshot and each test module).
+Borrowers get fresh page state by reloading instead of relaunching the browser.
+With replay_path set, the WebDriver traffic is answered from a recording instead of a browser
+(utils/webdriver_replay.py). shard() gives test shards sessions of their own in the same chrome,
+each in a separate browser context (see utils/test_sharding.py).
+
+BrowserSession only manages the driver; everything else it does to the pages comes from its
+features, objects defining any of these hooks:
+
+    started(driver)                       a driver was started
+    driver_for(url, is_submission)        a driver to borrow instead of loading url, or None
+    loaded(driver, url, is_submission)    url was loaded
+    prepared(driver, is_submission)       the window was fitted, the driver goes to the borrower
+    leaving(driver)                       the loaded page is about to be left
+    stopping(driver)                      the driver is about to quit
+    shard()                               the feature for a shard's session (omitted without it)
+    stats()                               entries added to BrowserSession.stats()
+
+grading_features() are the features of a grading run: command metering (utils/timing_helper.py),
+readiness waits (utils/readiness.py), the id collision audit (utils/dom_audit.py), the virtual
+clock (utils/virtual_time.py) and render snapshots (utils/render_snapshot.py).
+"""
+import os
+import time
+import atexit
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from utils.render_snapshot import SnapshotSource, SnapshotCapture
+from utils.readiness import ReadinessWaiter
+from utils.virtual_time import VirtualClock
+from utils.dom_audit import CollisionCollector
+from utils.timing_helper import MeterCommands
+from utils.webdriver_replay import ReplayDriver
+
+# the grading entry point replaces this with the URL of its own static server
+SUBMISSION_URL = 'http://localhost:8080/submission.html'
+
+# headless chrome's default viewport, which every borrower starts from
+DEFAULT_WINDOW_SIZE = (800, 600)
+
+
+def make_chrome_options():
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--disable-gpu')
+    return chrome_options
+
+
+def grading_features():
+    """the features of a grading run's session, in the order they are installed on a page"""
+    return [MeterCommands(), ReadinessWaiter(), CollisionCollector(), VirtualClock(),
+            SnapshotSource(), SnapshotCapture()]
+
+
+class BrowserSession:
+    """Owns one webdriver.Chrome for the lifetime of the grading process."""
+
+    def __init__(self, submission_url=SUBMISSION_URL, features=None):
+        self.driver = None
+        self.submission_url = submission_url
+        self.features = grading_features() if features is None else features
+        self.launch_seconds = 0.0
+        self.launches = 0
+        self.borrows = 0
+        # answer every command from this recording instead of launching chrome
+        self.replay_path = None
+        # devtools address of the chrome this session attaches to (see shard()), and its
+        # browser context there
+        self.debugger_address = None
+        self._context = None
+
+    def feature(self, kind):
+        """the feature of this session that is a kind, None without one"""
+        return next((f for f in self.features if isinstance(f, kind)), None)
+
+    def _notify(self, hook, *args):
+        for f in self.features:
+            if hasattr(f, hook):
+                getattr(f, hook)(*args)
+
+    def start(self):
+        """launch chrome if it is not running yet"""
+        if self.driver is None:
+            if self.replay_path:
+                self.driver = ReplayDriver(self.replay_path)
+                # the recorded commands load the URL of the recording run
+                self.submission_url = self.driver.recording.get('submission_url', self.submission_url)
+            elif self.debugger_address is not None:
+                self.attach()
+            else:
+                self.launch()
+            self._notify('started', self.driver)
+        return self.driver
+
+    def launch(self):
+        start_time = time.time()
+        self.driver = new_chrome(make_chrome_options())
+        self.launch_seconds = time.time() - start_time
+        self.launches += 1
+
+    def attach(self):
+        """start a chromedriver session on the running chrome at self.debugger_address and move
+        it to a new page in a browser context of its own (cookies, storage and cache are not shared)
+        """
+        start_time = time.time()
+        options = webdriver.ChromeOptions()
+        options.add_experimental_option('debuggerAddress', self.debugger_address)
+        self.driver = new_chrome(options)
+        self._context = self.driver.execute_cdp_cmd('Target.createBrowserContext', {})['browserContextId']
+        target = self.driver.execute_cdp_cmd('Target.createTarget', {'url': 'about:blank',
+                                                                     'browserContextId': self._context})
+        # chromedriver's window handles are devtools target ids
+        self.driver.switch_to.window(target['targetId'])
+        self.launch_seconds = time.time() - start_time
+        self.launches += 1
+
+    def shard(self):
+        """New BrowserSession with the settings and features of this one for a test shard.
+        It attaches to the chrome of this session on start() (replays and snapshots need no chrome)
+        and, until then, holds no driver, so it can be pickled to a shard process.
+        """
+        shard = BrowserSession(self.submission_url, [f.shard() for f in self.features if hasattr(f, 'shard')])
+        shard.replay_path = self.replay_path
+        snapshot = self.feature(SnapshotSource)
+        if not (self.replay_path or (snapshot and snapshot.path)):
+            self.start()
+            shard.debugger_address = self.driver.capabilities['goog:chromeOptions']['debuggerAddress']
+        return shard
+
+    def borrow(self, url=None, window_size=DEFAULT_WINDOW_SIZE, fit_window=True):
+        """Load url (the submission by default) with fresh page state and return the driver.
+        With fit_window the window is resized to the rendered page, as each test module used to do.
+        """
+        is_submission = url in (None, self.submission_url)
+        for f in self.features:
+            driver = f.driver_for(url, is_submission) if hasattr(f, 'driver_for') else None
+            if driver is not None:
+                self.borrows += 1
+                return driver
+        driver = self.start()
+        self.borrows += 1
+        self._notify('leaving', driver)
+        self.reset(window_size)
+        driver.get(url or self.submission_url)
+        self._notify('loaded', driver, url or self.submission_url, is_submission)
+        if fit_window:
+            self.fit_window()
+        self._notify('prepared', driver, is_submission)
+        return driver
+
+    def reset(self, window_size=DEFAULT_WINDOW_SIZE):
+        """drop the previous page (scripts, timers, DOM) and restore the initial viewport"""
+        self.driver.get('about:blank')
+        self.driver.delete_all_cookies()
+        self.driver.set_window_size(*window_size)
+
+    def fit_window(self):
+        # set chromedrive window dimensions to student submission dimensions
+        rendered_width, rendered_height = self.driver.execute_script(
+            "return [document.documentElement.scrollWidth, document.documentElement.scrollHeight]")
+        self.driver.set_window_size(rendered_width, rendered_height)
+
+    def release(self):
+        """called by borrowers when done; the browser stays up for the next one"""
+        if self.driver is not None:
+            self._notify('leaving', self.driver)
+            self.driver.get('about:blank')
+
+    def _stop(self):
+        self._notify('leaving', self.driver)
+        if self._context is not None:
+            # an attached session leaves chrome running, so its context is closed here
+            try:
+                self.driver.execute_cdp_cmd('Target.disposeBrowserContext', {'browserContextId': self._context})
+            except WebDriverException:
+                pass
+            self._context = None
+        self._notify('stopping', self.driver)
+        self.driver.quit()
+        self.driver = None
+
+    def restart(self):
+        """relaunch chrome, e.g. to recycle a long-lived browser"""
+        if self.driver is not None:
+            self._stop()
+        return self.start()
+
+    def memory_bytes(self):
+        """resident memory of chromedriver and the chrome processes it spawned (Linux only)"""
+        if self.driver is None or not os.path.exists('/proc'):
+            return None
+        return process_tree_rss(self.driver.service.process.pid)
+
+    def time_saved(self):
+        """wall-clock seconds not spent relaunching chrome: the measured launch time times the
+        launches that reusing the browser avoided (one per borrow after the first of each launch)
+        """
+        return max(0, self.borrows - self.launches) * self.launch_seconds
+
+    def stats(self):
+        stats = {"launches": self.launches,
+                 "borrows": self.borrows,
+                 "launch_seconds": round(self.launch_seconds, 2),
+                 "seconds_saved": round(self.time_saved(), 2)}
+        for f in self.features:
+            if hasattr(f, 'stats'):
+                stats.update(f.stats())
+        return stats
+
+    def quit(self):
+        if self.driver is not None:
+            self._stop()
+            print(f"browser session: {self.borrows} page loads on {self.launches} chrome launch(es), "
+                  f"saved {self.time_saved():0.2f}s ({self.launch_seconds:0.2f}s per launch)")
+
+
+def new_chrome(options):
+    if os.path.exists('/autograder'):  # gradescope run
+        return webdriver.Chrome(options=options)
+    return webdriver.Chrome(executable_path="utils/chromedriver", options=options)
+
+
+def process_tree_rss(pid):
+    """sum of the resident set size of pid and all of its descendants, read from /proc"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    total = 0
+    stack = [pid]
+    while stack:
+        p = stack.pop()
+        try:
+            with open(f'/proc/{p}/statm') as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            pass
+        stack.extend(children.get(p, []))
+    return total
+
+
+_session = None
+
+def set_session(session):
+    """make session the process-wide BrowserSession, e.g. in a test shard's process"""
+    global _session
+    _session = session
+
+
+def get_session():
+    """the process-wide BrowserSession, created on first use"""
+    global _session
+    if _session is None:
+        _session = BrowserSession()
+        atexit.register(_session.quit)
+    return _session
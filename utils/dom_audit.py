@@ -0,0 +1,189 @@
+"""
+Single-pass DOM audit.
+install_audit() makes chrome run a MutationObserver before the scripts of every page that
+records every id shared by several elements, whenever it happens (also after the initial load).
+run_audit() then checks required-element presence and tag names, current duplicate ids and the
+required nesting of the rubric in one execute_script call; read_collisions() returns what the
+observer recorded for the page so far.
+"""
+from selenium.common.exceptions import WebDriverException
+from utils.render_snapshot import register_query
+
+INSTRUMENT_SCRIPT = """
+(function() {
+    if (window.__visgraderAudit) return;
+    // id: {count: most elements seen sharing it, after_load: first seen after the load event};
+    // ids are the page's own, so Maps and Sets keep e.g. 'constructor' or '__proto__' apart from
+    // inherited properties
+    var audit = window.__visgraderAudit = {collisions: new Map()};
+    function check(ids) {
+        ids.forEach(function(id) {
+            var count = document.querySelectorAll('[id="' + CSS.escape(id) + '"]').length;
+            if (count < 2) return;
+            var seen = audit.collisions.get(id);
+            if (!seen) {
+                audit.collisions.set(id, {count: count, after_load: document.readyState === 'complete'});
+            } else if (count > seen.count) {
+                seen.count = count;
+            }
+        });
+    }
+    new MutationObserver(function(records) {
+        // each id is counted once per batch of mutations
+        var ids = new Set();
+        records.forEach(function(record) {
+            if (record.type === 'attributes') {
+                if (record.target.id) ids.add(record.target.id);
+                return;
+            }
+            Array.prototype.forEach.call(record.addedNodes, function(node) {
+                if (node.nodeType !== 1) return;
+                if (node.id) ids.add(node.id);
+                Array.prototype.forEach.call(node.querySelectorAll('[id]'), function(el) { ids.add(el.id); });
+            });
+        });
+        check(ids);
+    }).observe(document, {childList: true, subtree: true, attributes: true, attributeFilter: ['id']});
+})();
+"""
+
+# the collisions recorded since the page started loading (since now, for pages loaded
+# without the instrumentation), as [id, collision] pairs
+COLLISIONS_SCRIPT = INSTRUMENT_SCRIPT + """
+return Array.from(window.__visgraderAudit.collisions);
+"""
+
+# arguments: {tag: [ids]} of required elements and {id: ancestor id} of required nesting
+AUDIT_SCRIPT = INSTRUMENT_SCRIPT + """
+var required = arguments[0], nesting = arguments[1];
+var counts = new Map(), elements = {}, nested = {};
+Array.prototype.forEach.call(document.querySelectorAll('[id]'), function(el) {
+    counts.set(el.id, (counts.get(el.id) || 0) + 1);
+});
+// [id, count] pairs, like the collisions
+var duplicates = Array.from(counts).filter(function(entry) { return entry[1] > 1; });
+Object.keys(required).forEach(function(tag) {
+    required[tag].forEach(function(id) {
+        var el = document.getElementById(id);
+        elements[id] = {expected: tag, tag: el ? el.tagName.toLowerCase() : null};
+    });
+});
+Object.keys(nesting).forEach(function(id) {
+    var el = document.getElementById(id), ancestor = document.getElementById(nesting[id]);
+    nested[id] = {within: nesting[id], ok: !!(el && ancestor && ancestor !== el && ancestor.contains(el))};
+});
+return {elements: elements, duplicates: duplicates, nesting: nested,
+        collisions: Array.from(window.__visgraderAudit.collisions)};
+"""
+
+register_query(COLLISIONS_SCRIPT)
+
+
+def _audit_args(rubric_config):
+    return (rubric_config.get('elements') or {}, rubric_config.get('nesting') or {})
+
+
+def prepare_audit(rubric_config):
+    """register the audit of rubric_config with the snapshot queries; call at import time"""
+    register_query(AUDIT_SCRIPT, *_audit_args(rubric_config))
+
+
+def install_audit(driver):
+    """run the collision observer before the scripts of every page driver loads from now on"""
+    try:
+        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': INSTRUMENT_SCRIPT})
+        return True
+    except (AttributeError, WebDriverException):  # not chrome, or no devtools access
+        return False
+
+
+class DomAudit:
+    """result of run_audit() for one page"""
+
+    def __init__(self, payload):
+        # id: {'expected': required tag, 'tag': tag found or None}
+        self.elements = payload['elements']
+        # id: number of elements sharing it now
+        self.duplicates = dict(payload['duplicates'])
+        # id: {'within': required ancestor id, 'ok': bool}
+        self.nesting = payload['nesting']
+        # id: {'count': int, 'after_load': bool}, recorded by the observer
+        self.collisions = dict(payload['collisions'])
+
+    def missing(self, tag=None):
+        """required ids not found (of the given required tag)"""
+        return [i for i, e in self.elements.items() if e['tag'] is None and tag in (None, e['expected'])]
+
+    def mismatched(self, tag=None):
+        """required ids found with another tag name"""
+        return [i for i, e in self.elements.items()
+                if e['tag'] is not None and e['tag'] != e['expected'] and tag in (None, e['expected'])]
+
+    def misplaced(self):
+        """ids not nested inside their required ancestor"""
+        return [i for i, n in self.nesting.items() if not n['ok']]
+
+    def all_duplicates(self):
+        """ids duplicated now or at any point since the page started loading"""
+        return sorted(set(self.duplicates) | set(self.collisions))
+
+    def report(self):
+        return {"missing": self.missing(),
+                "mismatched": self.mismatched(),
+                "misplaced": self.misplaced(),
+                "duplicates": self.all_duplicates()}
+
+
+def run_audit(driver, rubric_config):
+    """DomAudit of the page loaded in driver, in one execute_script call"""
+    return DomAudit(driver.execute_script(AUDIT_SCRIPT, *_audit_args(rubric_config)))
+
+
+def read_collisions(driver):
+    """id collisions the observer recorded on the page loaded in driver"""
+    return dict(driver.execute_script(COLLISIONS_SCRIPT))
+
+
+def merge_collisions(into, collisions):
+    """merge the collisions of one page into the accumulated ones of a session"""
+    for element_id, seen in collisions.items():
+        known = into.get(element_id)
+        if known is None:
+            into[element_id] = dict(seen)
+        else:
+            known['count'] = max(known['count'], seen['count'])
+            known['after_load'] = known['after_load'] and seen['after_load']
+    return into
+
+
+class CollisionCollector:
+    """BrowserSession feature: collects the id collisions of every submission page it leaves.
+    report is the DOM audit report of the grading job; test modules add their findings to it.
+    """
+
+    def __init__(self):
+        self.report = {"collisions": {}}
+        self._on_submission = False
+
+    def reset(self):
+        """start the report of a new grading job and return it"""
+        self.report = {"collisions": {}}
+        return self.report
+
+    def started(self, driver):
+        install_audit(driver)
+
+    def loaded(self, driver, url, is_submission):
+        self._on_submission = is_submission
+
+    def leaving(self, driver):
+        # read the collisions of the loaded submission page once, before it is left
+        if self._on_submission:
+            self._on_submission = False
+            try:
+                merge_collisions(self.report["collisions"], read_collisions(driver))
+            except WebDriverException as e:
+                print(f"could not read id collisions: {e.msg}")
+
+    def shard(self):
+        return CollisionCollector()
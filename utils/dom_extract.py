@@ -0,0 +1,120 @@
+"""
+Util to extract mark and axis geometry from a rendered page in a single WebDriver round trip
+"""
+import numpy as np
+
+# Runs in the page. Numeric attributes are returned as flat arrays (null when missing
+# or unparsable); fills and transforms are palette-encoded since most marks share them.
+MARK_GEOMETRY_SCRIPT = """
+var marks = document.querySelectorAll(arguments[0]);
+var n = marks.length;
+var payload = {count: n, cx: new Array(n), cy: new Array(n), r: new Array(n),
+               fill: new Array(n), fill_palette: [],
+               transform: new Array(n), transform_palette: []};
+// Maps, so values like 'constructor' or 'toString' are not found among inherited properties
+var paletteIndex = {fill: new Map(), transform: new Map()};
+function num(el, name) {
+    var v = parseFloat(el.getAttribute(name));
+    return isNaN(v) ? null : v;
+}
+function encode(key, value) {
+    var index = paletteIndex[key];
+    if (!index.has(value)) {
+        index.set(value, payload[key + '_palette'].length);
+        payload[key + '_palette'].push(value);
+    }
+    return index.get(value);
+}
+for (var i = 0; i < n; i++) {
+    var el = marks[i];
+    payload.cx[i] = num(el, 'cx');
+    payload.cy[i] = num(el, 'cy');
+    payload.r[i] = num(el, 'r');
+    payload.fill[i] = encode('fill', window.getComputedStyle(el).getPropertyValue('fill'));
+    payload.transform[i] = encode('transform', el.getAttribute('transform') || '');
+}
+return payload;
+"""
+
+
+class MarkGeometry:
+    """Geometry of every mark matched by a selector, one array entry per mark in DOM order.
+    Missing numeric attributes are NaN.
+    """
+    def __init__(self, payload):
+        self.cx = np.asarray(payload['cx'], dtype=np.float64).reshape(-1)
+        self.cy = np.asarray(payload['cy'], dtype=np.float64).reshape(-1)
+        self.r = np.asarray(payload['r'], dtype=np.float64).reshape(-1)
+        self.fill_codes = np.asarray(payload['fill'], dtype=np.intp).reshape(-1)
+        self.fill_palette = list(payload['fill_palette'])
+        self.transform_codes = np.asarray(payload['transform'], dtype=np.intp).reshape(-1)
+        self.transform_palette = list(payload['transform_palette'])
+
+    def __len__(self):
+        return len(self.cx)
+
+    @property
+    def fill(self):
+        """computed fill color of each mark, e.g. 'rgb(70, 130, 180)'"""
+        return np.asarray(self.fill_palette, dtype=object)[self.fill_codes]
+
+    @property
+    def transform(self):
+        """transform attribute of each mark ('' when not set)"""
+        return np.asarray(self.transform_palette, dtype=object)[self.transform_codes]
+
+    def positions(self):
+        """(n, 2) array of cx, cy"""
+        return np.column_stack((self.cx, self.cy))
+
+    def fill_groups(self):
+        """map each distinct fill color to the indices of the marks drawn with it"""
+        return {color: np.flatnonzero(self.fill_codes == code)
+                for code, color in enumerate(self.fill_palette)}
+
+
+def extract_marks(driver, selector):
+    """Return the MarkGeometry (cx, cy, r, fill, transform) of all elements matching
+    a CSS selector using one execute_script call, regardless of the number of marks.
+    """
+    return MarkGeometry(driver.execute_script(MARK_GEOMETRY_SCRIPT, selector))
+
+
+# Runs in the page. For each axis id: bounding rect of the domain path and the text and
+# page position of every tick, or null when the axis is missing.
+AXIS_SCRIPT = """
+function rect(el) {
+    var r = el.getBoundingClientRect();
+    return {x: r.x, y: r.y, width: r.width, height: r.height};
+}
+return arguments[0].map(function(id) {
+    var axis = document.getElementById(id);
+    if (!axis) return null;
+    var domain = axis.querySelector('.domain');
+    return {
+        domain: domain ? rect(domain) : null,
+        ticks: Array.prototype.map.call(axis.querySelectorAll('.tick'), function(tick) {
+            var r = tick.getBoundingClientRect();
+            return {text: tick.textContent.trim(), x: r.x, y: r.y};
+        })
+    };
+});
+"""
+
+
+def parse_tick_value(text):
+    """numeric value of a d3 tick label, e.g. '1,000' -> 1000, '\u22122.5' -> -2.5; None if not numeric"""
+    try:
+        # d3-format writes negative numbers with a unicode minus sign
+        value = float(text.replace(',', '').replace('\u2212', '-'))
+    except ValueError:
+        return None
+    return int(value) if value.is_integer() else value
+
+
+def extract_axes(driver, axis_ids):
+    """Return {axis id: {'domain': rect, 'ticks': [{'text', 'x', 'y'}, ...]} or None}
+    for all axes in one execute_script call.
+    """
+    axis_ids = list(axis_ids)
+    return dict(zip(axis_ids, driver.execute_script(AXIS_SCRIPT, axis_ids)))
@@ -1,16 +1,65 @@
+import os
+import shutil
+import hashlib
+from collections import namedtuple
 import dropbox
+import dropbox.files
 import dropbox.sharing
+import dropbox.exceptions
+
+# files larger than this are sent in chunks of this size through an upload session
+CHUNK_SIZE = 8 * 1024 * 1024
+# Dropbox content hashes are computed over blocks of this size
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+SharedLink = namedtuple('SharedLink', ['url'])
+
+
+def content_hash(path):
+    """Dropbox content hash of a local file: sha256 over the sha256 of each 4 MB block
+    """
+    block_hashes = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            block_hashes.update(hashlib.sha256(block).digest())
+    return block_hashes.hexdigest()
+
 
 class DropboxConnector:
-    def __init__(self, access_token):
+    def __init__(self, access_token, max_connections=8, chunk_size=CHUNK_SIZE):
         self.access_token = access_token
-        self.dbx = dropbox.Dropbox(self.access_token)
+        self.chunk_size = chunk_size
+        # one pool of keep-alive connections shared by every upload thread
+        self.dbx = dropbox.Dropbox(self.access_token, session=dropbox.create_session(max_connections=max_connections))
 
-    def upload_file(self, file_from, file_to):
-        """upload a file to Dropbox using API v2
+    def upload_file(self, file_from, file_to)->bool:
+        """upload a file to Dropbox using API v2, in chunks when it is larger than chunk_size
+        returns False without uploading when file_to already has the same content
         """
+        if self.stored_hash(file_to) == content_hash(file_from):
+            return False
+        size = os.path.getsize(file_from)
+        mode = dropbox.files.WriteMode.overwrite
         with open(file_from, 'rb') as f:
-            self.dbx.files_upload(f.read(), file_to, mode=dropbox.files.WriteMode.overwrite)
+            if size <= self.chunk_size:
+                self.dbx.files_upload(f.read(), file_to, mode=mode)
+                return True
+            session = self.dbx.files_upload_session_start(f.read(self.chunk_size))
+            cursor = dropbox.files.UploadSessionCursor(session_id=session.session_id, offset=f.tell())
+            while size - f.tell() > self.chunk_size:
+                self.dbx.files_upload_session_append_v2(f.read(self.chunk_size), cursor)
+                cursor.offset = f.tell()
+            self.dbx.files_upload_session_finish(f.read(), cursor, dropbox.files.CommitInfo(path=file_to, mode=mode))
+        return True
+
+    def stored_hash(self, path):
+        """content hash of the file stored at path, None when there is none
+        """
+        try:
+            metadata = self.dbx.files_get_metadata(path)
+        except dropbox.exceptions.ApiError:
+            return None
+        return getattr(metadata, 'content_hash', None)
 
     def download_file(self, file_from, file_to):
         """download a file from Dropbox using API v2
@@ -25,3 +74,37 @@ class DropboxConnector:
         settings = dropbox.sharing.SharedLinkSettings(access=dropbox.sharing.RequestedLinkAccessLevel.viewer, requested_visibility=dropbox.sharing.RequestedVisibility.public)
         shared_url = self.dbx.sharing_create_shared_link_with_settings(path,settings)
         return shared_url
+
+
+class LocalStorageConnector:
+    """Same interface as DropboxConnector, storing the files under a local folder
+    (e.g. to run the archival uploads without a Dropbox account)
+    """
+    def __init__(self, root):
+        self.root = root
+
+    def _local_path(self, path):
+        return os.path.join(self.root, path.lstrip('/'))
+
+    def upload_file(self, file_from, file_to)->bool:
+        if self.stored_hash(file_to) == content_hash(file_from):
+            return False
+        local_path = self._local_path(file_to)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        # copy then rename, so a stored file is never half written
+        shutil.copyfile(file_from, local_path + '.part')
+        os.replace(local_path + '.part', local_path)
+        return True
+
+    def stored_hash(self, path):
+        local_path = self._local_path(path)
+        return content_hash(local_path) if os.path.isfile(local_path) else None
+
+    def download_file(self, file_from, file_to):
+        shutil.copyfile(self._local_path(file_from), file_to)
+
+    def get_shared_link(self, path):
+        local_path = self._local_path(path)
+        if not os.path.isfile(local_path):
+            raise FileNotFoundError(path)
+        return SharedLink('file://' + os.path.abspath(local_path))
@@ -5,11 +5,38 @@ import json
 from unittest import result
 from unittest.signals import registerResult
 
+from urllib3.exceptions import HTTPError
+from selenium.common.exceptions import WebDriverException, SessionNotCreatedException, InvalidSessionIdException
 from gradescope_utils.autograder_utils.json_test_runner import JSONTestResult
+from utils.timing_helper import COMMANDS, TimeoutException
+from utils.render_snapshot import SnapshotUnavailable
+from utils.result_cache import mark_incomplete
+from utils.test_sharding import run_sharded
 
 def load_meta_json(metadata_json = "/autograder/submission_metadata.json"):
 	return json.load(open(metadata_json))
 
+def write_json_atomic(json_data, path):
+	"""replace path with json_data in one step, so readers never see a half-written file"""
+	tmp_path = path + '.tmp'
+	with open(tmp_path, 'w') as f:
+		json.dump(json_data, f, indent=4)
+		f.write('\n')
+	os.replace(tmp_path, path)
+
+# output of results.json while the suite is still running; check_interval() does not count
+# [INFO] results, like timed out runs
+PARTIAL_RESULTS_NOTE = "[INFO] Grading stopped before all tests finished. The scores of the completed tests are shown.\n"
+
+# errors of the grading environment rather than of the submission (test time limit, lost
+# browser, snapshot gaps); a bare WebDriverException is chrome failing, its subclasses (e.g.
+# NoSuchElementException) are usually the submission's
+INFRA_ERRORS = (TimeoutException, ConnectionError, HTTPError, SessionNotCreatedException,
+				InvalidSessionIdException, SnapshotUnavailable)
+
+def is_infra_error(error):
+	return isinstance(error, INFRA_ERRORS) or type(error) is WebDriverException
+
 class NoStd():
     def __enter__(self):
         self._original_stdout = sys.stdout
@@ -20,6 +47,38 @@ class NoStd():
         sys.stdout = self._original_stdout
 
 class CustomJSONTestResult(JSONTestResult):
+	def startTest(self, test):
+		self._test_started, self._test_reading = time.perf_counter(), COMMANDS.reading()
+		super(CustomJSONTestResult, self).startTest(test)
+
+	def buildResult(self, test, err=None):
+		# time and WebDriver commands of the test, in the extra_data of its entry
+		result = super(CustomJSONTestResult, self).buildResult(test, err)
+		result.setdefault("extra_data", {})["metrics"] = COMMANDS.since(self._test_reading, self._test_started)
+		if err is not None and is_infra_error(err[1]):
+			mark_incomplete(result, f"{type(err[1]).__name__}: {err[1]}")
+		return result
+
+	def processResult(self, test, err=None):
+		super(CustomJSONTestResult, self).processResult(test, err)
+		on_result = getattr(self, 'on_result', None)
+		if on_result is not None:
+			on_result(test)
+
+	def addSkip(self, test, reason):
+		# skipped tests are listed with no points, so the student sees why
+		super(CustomJSONTestResult, self).addSkip(test, reason)
+		entry = self.buildResult(test)
+		if "max_score" in entry:
+			entry["score"] = 0.0
+		entry["status"] = "failed"
+		entry["output"] = reason
+		mark_incomplete(entry, reason)
+		self.results.append(entry)
+		on_result = getattr(self, 'on_result', None)
+		if on_result is not None:
+			on_result(test)
+
 	def addError(self, test, err):
 		super(JSONTestResult, self).addError(test, err)
 		# Prevent output from being printed to stdout on failure
@@ -33,9 +92,20 @@ class JSONTestRunner(object):
 
 	def __init__(self, stream=sys.stdout, descriptions=True, verbosity=1,
 				 failfast=False, buffer=True, visibility=None,
-				 stdout_visibility=None, comment=""):
+				 stdout_visibility=None, comment="", extra_data=None, metrics=None, metrics_path=None,
+				 results_path=None, shards=1, durations=None):
 		"""
 		Set buffer to True to include test output in JSON
+		extra_data is written as-is to the "extra_data" field of the results
+		metrics is a utils.timing_helper.PhaseTimer of the grading run; the test run is added
+		to it as the 'tests' phase and its report written to extra_data["metrics"] and,
+		with metrics_path, appended as one JSON line to that file (see write_metrics())
+		With results_path the results are also written to that file while the suite runs: each
+		finished test is appended to <results_path without extension>.jsonl and results_path is
+		replaced by the results so far, so a run killed midway still reports partial scores.
+		stream may then be None.
+		With shards > 1 the tests run in that many processes sharing one chrome, balanced by
+		durations ({test name: seconds}, see utils/test_sharding.py).
 		"""
 		self.stream = stream
 		self.descriptions = descriptions
@@ -50,6 +120,14 @@ class JSONTestRunner(object):
 			self.json_data["visibility"] = visibility
 		if stdout_visibility:
 			self.json_data["stdout_visibility"] = stdout_visibility
+		if extra_data:
+			self.json_data["extra_data"] = extra_data
+		self.metrics = metrics
+		self.metrics_path = metrics_path
+		self.results_path = results_path
+		self.progress_path = os.path.splitext(results_path)[0] + '.jsonl' if results_path else None
+		self.shards = shards
+		self.durations = durations
 
 	def _makeResult(self):
 		return self.resultclass(self.stream, self.descriptions, self.verbosity,
@@ -62,11 +140,27 @@ class JSONTestRunner(object):
 		result.failfast = self.failfast
 		result.buffer = self.buffer
 		startTime = time.time()
+		if self.results_path:
+			self._progress = open(self.progress_path, 'w')
+			self._logged = 0
+			result.on_result = lambda test: self.test_finished(startTime)
+			self.test_finished(startTime)
 		startTestRun = getattr(result, 'startTestRun', None)
 		if startTestRun is not None:
 			startTestRun()
+		if self.shards > 1:
+			def run_tests():
+				run_sharded(test, self, self.shards, self.durations,
+							on_result=lambda: self.test_finished(startTime) if self.results_path else None)
+		else:
+			def run_tests():
+				test(result)
 		try:
-			test(result)
+			if self.metrics is not None:
+				with self.metrics.phase('tests'):
+					run_tests()
+			else:
+				run_tests()
 		finally:
 			stopTestRun = getattr(result, 'stopTestRun', None)
 			if stopTestRun is not None:
@@ -78,10 +172,48 @@ class JSONTestRunner(object):
 
 		total_score = 0
 		for test in self.json_data["tests"]:
-			total_score += test["score"]
+			total_score += test.get("score", 0.0)
 
 		self.json_data["score"] = total_score
 
-		json.dump(self.json_data, self.stream, indent=4)
-		self.stream.write('\n')
+		if self.metrics is not None:
+			self.write_metrics()
+
+		if self.results_path:
+			self._progress.close()
+			write_json_atomic(self.json_data, self.results_path)
+		if self.stream is not None:
+			json.dump(self.json_data, self.stream, indent=4)
+			self.stream.write('\n')
 		return result
+
+	def test_finished(self, startTime):
+		"""log the newest test result and rewrite results_path with the partial results"""
+		tests = self.json_data["tests"]
+		for entry in tests[self._logged:]:
+			self._progress.write(json.dumps(entry) + '\n')
+		self._progress.flush()
+		self._logged = len(tests)
+		partial = dict(self.json_data)
+		partial["output"] = PARTIAL_RESULTS_NOTE + self.json_data["output"]
+		partial["score"] = sum(entry["score"] for entry in tests if "score" in entry)
+		partial["execution_time"] = format(time.time() - startTime, "0.2f")
+		write_json_atomic(partial, self.results_path)
+
+	def write_metrics(self, metrics_path=None, **sections):
+		"""Write the metrics report to extra_data["metrics"] and append it to metrics_path
+		(self.metrics_path by default). run() calls this when the tests are done; a caller timing
+		more phases afterwards can call it again, with sections (e.g. uploads=...) to add.
+		"""
+		metrics = self.metrics.report()
+		metrics["tests"] = [{"name": test["name"], **test["extra_data"]["metrics"]}
+							for test in self.json_data["tests"] if "metrics" in test.get("extra_data", {})]
+		metrics.update(sections)
+		self.json_data.setdefault("extra_data", {})["metrics"] = metrics
+		metrics_path = metrics_path or self.metrics_path
+		if metrics_path:
+			# one line per grading run, so runs can be aggregated with e.g. pandas.read_json(lines=True)
+			line = dict(timestamp=time.time(), execution_time=float(self.json_data["execution_time"]),
+						score=self.json_data["score"], **metrics)
+			with open(metrics_path, 'a') as f:
+				f.write(json.dumps(line) + '\n')
@@ -0,0 +1,211 @@
+"""
+NumPy screenshot comparison used in place of the matplotlib/scikit-image compare_plots.
+Works on in-memory RGBA uint8 buffers, builds the side-by-side + blend comparison image
+directly as a uint8 array and computes similarity metrics for the results JSON.
+Every function reads its images in horizontal strips, and open_rows() gives images whose RGBA
+rows are converted from the decoded PNG one strip at a time (Pillow cannot decode part of a
+PNG, so it holds each image once, in the file's own mode). Compared with whole RGBA arrays and
+their float32 intermediates, that leaves one compact copy of each image plus a strip;
+difference_image() still returns a full-size image.
+Pillow is only used to decode/encode PNG and to draw the panel titles.
+"""
+import io
+import numpy as np
+from PIL import Image, ImageDraw
+
+STRIP_ROWS = 256
+SSIM_WINDOW = 7
+# per-channel difference above which a pixel counts as changed (ignores anti-aliasing noise)
+CHANGED_THRESHOLD = 16
+REGION_GRID = (4, 4)
+
+PANEL_WIDTH = 400
+MAX_PANEL_HEIGHT = 1200
+TITLE_HEIGHT = 24
+MARGIN = 8
+
+
+def load_rgba(source):
+    """decode a PNG given as a path or bytes into an (h, w, 4) uint8 array"""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with Image.open(source) as img:
+        return np.asarray(img.convert('RGBA'))
+
+
+class RowImage:
+    """image decoded by Pillow whose rows are read as RGBA uint8 arrays on demand, e.g. img[0:256];
+    has the shape of the equivalent load_rgba() array
+    """
+
+    def __init__(self, image):
+        self.image = image
+        self.shape = (image.height, image.width, 4)
+
+    def __getitem__(self, rows):
+        start, stop, _ = rows.indices(self.shape[0])
+        return np.asarray(self.image.crop((0, start, self.shape[1], max(start, stop))).convert('RGBA'))
+
+
+def open_rows(source):
+    """RowImage of a PNG given as a path or bytes"""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    image = Image.open(source)
+    image.load()
+    return RowImage(image)
+
+
+def save_png(rgba, path):
+    Image.fromarray(rgba).save(path)
+
+
+def _strips(height, rows=STRIP_ROWS):
+    for start in range(0, height, rows):
+        yield start, min(height, start + rows)
+
+
+def _padded_rows(img, start, stop, width):
+    """rows [start, stop) of img (an array or a RowImage) as float32 RGB composited on white,
+    padded to width; rows beyond the image are white, like the page background
+    """
+    out = np.full((stop - start, width, 3), 255.0, dtype=np.float32)
+    rows = img[start:min(stop, img.shape[0])]
+    if len(rows) == 0:
+        return out
+    if rows[..., 3].min() == 255:  # screenshots are opaque, skip compositing
+        out[:len(rows), :rows.shape[1]] = rows[..., :3]
+    else:
+        alpha = rows[..., 3:4].astype(np.float32) / 255.0
+        out[:len(rows), :rows.shape[1]] = rows[..., :3] * alpha + 255.0 * (1.0 - alpha)
+    return out
+
+
+def _gray(rgb):
+    # ITU-R 709 luma, as skimage.color.rgb2gray
+    return rgb @ np.array([0.2125, 0.7154, 0.0721], dtype=np.float32)
+
+
+def _box_mean(a, w):
+    """mean over every valid w x w window of a 2d array"""
+    s = np.zeros((a.shape[0] + 1, a.shape[1] + 1), dtype=np.float64)
+    np.cumsum(np.cumsum(a, axis=0, dtype=np.float64), axis=1, out=s[1:, 1:])
+    return (s[w:, w:] - s[:-w, w:] - s[w:, :-w] + s[:-w, :-w]) / (w * w)
+
+
+def similarity_metrics(img1, img2):
+    """SSIM (7x7 windows on luma, as skimage's defaults), changed-pixel ratio and the mean
+    absolute luma difference per region of a REGION_GRID, comparing img1 against img2.
+    Images of different sizes are compared on their union, padded with white.
+    """
+    height = max(img1.shape[0], img2.shape[0])
+    width = max(img1.shape[1], img2.shape[1])
+    w, half = SSIM_WINDOW, SSIM_WINDOW // 2
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    cov_norm = w * w / (w * w - 1)
+
+    ssim_sum, ssim_count, changed = 0.0, 0, 0
+    grid_rows, grid_cols = REGION_GRID
+    col_edges = (np.arange(grid_cols) * width) // grid_cols
+    region_sums = np.zeros(REGION_GRID, dtype=np.float64)
+
+    for start, stop in _strips(height):
+        # read the strip with a halo of `half` rows so ssim windows can be centred on every row
+        lo, hi = max(0, start - half), min(height, stop + half)
+        a = _padded_rows(img1, lo, hi, width)
+        b = _padded_rows(img2, lo, hi, width)
+        inner = slice(start - lo, stop - lo)
+        changed += int(np.count_nonzero(np.any(np.abs(a[inner] - b[inner]) > CHANGED_THRESHOLD, axis=2)))
+        ga, gb = _gray(a), _gray(b)
+        diff = np.abs(ga[inner] - gb[inner])
+        row_regions = (np.arange(start, stop) * grid_rows) // height
+        np.add.at(region_sums, row_regions, np.add.reduceat(diff, col_edges, axis=1))
+
+        # valid windows are centred on rows [half, height - half)
+        first, last = max(start, half), min(stop, height - half)
+        if last <= first or width < w:
+            continue
+        ga = ga[first - half - lo:last + half - lo]
+        gb = gb[first - half - lo:last + half - lo]
+        ux, uy = _box_mean(ga, w), _box_mean(gb, w)
+        vx = cov_norm * (_box_mean(ga * ga, w) - ux * ux)
+        vy = cov_norm * (_box_mean(gb * gb, w) - uy * uy)
+        vxy = cov_norm * (_box_mean(ga * gb, w) - ux * uy)
+        s = ((2 * ux * uy + c1) * (2 * vxy + c2)) / ((ux * ux + uy * uy + c1) * (vx + vy + c2))
+        ssim_sum += float(s.sum())
+        ssim_count += s.size
+
+    region_pixels = np.outer(np.bincount((np.arange(height) * grid_rows) // height, minlength=grid_rows),
+                             np.diff(np.append(col_edges, width)))
+    return {
+        "ssim": ssim_sum / ssim_count if ssim_count else None,
+        "changed_pixel_ratio": changed / float(height * width),
+        "changed_threshold": CHANGED_THRESHOLD,
+        "region_diff": (region_sums / np.maximum(region_pixels, 1) / 255.0).round(4).tolist(),
+        "solution_size": [int(img1.shape[1]), int(img1.shape[0])],
+        "submission_size": [int(img2.shape[1]), int(img2.shape[0])],
+    }
+
+
+def _downscale(img, factor, height, width):
+    """block-average img (padded with white to height x width) by an integer factor, strip by strip"""
+    out_h, out_w = -(-height // factor), -(-width // factor)
+    out = np.empty((out_h, out_w, 3), dtype=np.float32)
+    rows = max(factor, (STRIP_ROWS // factor) * factor)
+    for start in range(0, out_h * factor, rows):
+        stop = min(start + rows, out_h * factor)
+        strip = _padded_rows(img, start, stop, out_w * factor)
+        out[start // factor:stop // factor] = strip.reshape(
+            (stop - start) // factor, factor, out_w, factor, 3).mean(axis=(1, 3))
+    return out
+
+
+def difference_image(img1, img2):
+    """uint8 RGB image of img2 over a faded img1, with the pixels that differ by more than
+    CHANGED_THRESHOLD in red; images of different sizes are compared on their union
+    """
+    height = max(img1.shape[0], img2.shape[0])
+    width = max(img1.shape[1], img2.shape[1])
+    out = np.empty((height, width, 3), dtype=np.uint8)
+    for start, stop in _strips(height):
+        a = _padded_rows(img1, start, stop, width)
+        b = _padded_rows(img2, start, stop, width)
+        changed = np.any(np.abs(a - b) > CHANGED_THRESHOLD, axis=2)
+        strip = 0.25 * a + 0.75 * 255.0
+        strip[changed] = (255.0, 0.0, 0.0)
+        out[start:stop] = strip.round().astype(np.uint8)
+    return out
+
+
+def comparison_image(img1, img2, titles=('Solution', 'Submission', 'Blend comparison')):
+    """uint8 RGB image with img1 and img2 side by side on top and their 50/50 blend below,
+    like skimage.util.compare_images(method='blend'), downscaled to a bounded size
+    """
+    height = max(img1.shape[0], img2.shape[0])
+    width = max(img1.shape[1], img2.shape[1])
+    factor = max(1, -(-width // PANEL_WIDTH), -(-height // MAX_PANEL_HEIGHT))
+    small1 = _downscale(img1, factor, height, width)
+    small2 = _downscale(img2, factor, height, width)
+    # the blend spans both panels, so it gets twice the width
+    blend_factor = max(1, -(-width // (2 * PANEL_WIDTH)), -(-height // MAX_PANEL_HEIGHT))
+    if blend_factor == factor:  # tall pages: the height bound decides both factors
+        blend = 0.5 * small1 + 0.5 * small2
+    else:
+        blend = 0.5 * _downscale(img1, blend_factor, height, width) + 0.5 * _downscale(img2, blend_factor, height, width)
+
+    panel_h, panel_w = small1.shape[:2]
+    canvas_w = max(2 * panel_w + 3 * MARGIN, blend.shape[1] + 2 * MARGIN)
+    canvas_h = 2 * TITLE_HEIGHT + panel_h + blend.shape[0] + 3 * MARGIN
+    canvas = np.full((canvas_h, canvas_w, 3), 255, dtype=np.uint8)
+    top = TITLE_HEIGHT + MARGIN
+    canvas[top:top + panel_h, MARGIN:MARGIN + panel_w] = small1.round().astype(np.uint8)
+    canvas[top:top + panel_h, 2 * MARGIN + panel_w:2 * MARGIN + 2 * panel_w] = small2.round().astype(np.uint8)
+    bottom = top + panel_h + MARGIN + TITLE_HEIGHT
+    canvas[bottom:bottom + blend.shape[0], MARGIN:MARGIN + blend.shape[1]] = blend.round().astype(np.uint8)
+
+    image = Image.fromarray(canvas)
+    draw = ImageDraw.Draw(image)
+    draw.text((MARGIN, MARGIN), titles[0], fill=(0, 0, 0))
+    draw.text((2 * MARGIN + panel_w, MARGIN), titles[1], fill=(0, 0, 0))
+    draw.text((MARGIN, bottom - TITLE_HEIGHT + MARGIN), titles[2], fill=(0, 0, 0))
+    return np.asarray(image)
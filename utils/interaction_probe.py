@@ -0,0 +1,154 @@
+"""
+Batched in-page interaction probing.
+One async script sends pointer events to a sample of marks (or all of them), lets transitions
+finish (fast-forwarding the virtual clock of utils/virtual_time.py when the page has one) and
+returns the probed attributes of every mark before, during and after the hover, so
+interaction coverage across the whole chart costs about as much as probing one mark.
+"""
+import numpy as np
+from utils.render_snapshot import register_query
+
+# Async. Marks are hovered one after the other ('sequential') or all at once ('together', only
+# valid when the handlers change nothing but the hovered mark: with a handler that resets the
+# other marks, every mark but the last reads wrong 'over' values). After each phase the script waits until the
+# probed attributes are unchanged for a few frames, at most maxWait ms.
+PROBE_SCRIPT = """
+var selector = arguments[0], sample = arguments[1], attributes = arguments[2], mode = arguments[3];
+var maxWait = arguments[4], callback = arguments[arguments.length - 1];
+var marks = document.querySelectorAll(selector), indices = [];
+if (sample === null || sample >= marks.length) {
+    for (var i = 0; i < marks.length; i++) indices.push(i);
+} else if (typeof sample === 'number') {
+    for (var i = 0; i < sample; i++) indices.push(Math.floor(i * marks.length / sample));
+} else {
+    indices = sample.filter(function(i) { return i < marks.length; });
+}
+var probed = indices.map(function(i) { return marks[i]; });
+var clock = window.__visgraderClock;
+var later = clock ? clock.realSetTimeout : window.setTimeout.bind(window);
+function read(group) {
+    return group.map(function(el) {
+        return attributes.map(function(name) { return el.getAttribute(name); });
+    });
+}
+function dispatch(el, types) {
+    var r = el.getBoundingClientRect(), x = r.x + r.width / 2, y = r.y + r.height / 2;
+    types.forEach(function(type) {
+        var init = {bubbles: !/(enter|leave)$/.test(type), cancelable: true, view: window, clientX: x, clientY: y};
+        el.dispatchEvent(type.indexOf('pointer') === 0 ? new PointerEvent(type, init) : new MouseEvent(type, init));
+    });
+}
+var OVER = ['pointerover', 'pointerenter', 'mouseover', 'mouseenter', 'pointermove', 'mousemove'];
+var OUT = ['pointerout', 'pointerleave', 'mouseout', 'mouseleave'];
+// calls done once the attributes of group have been stable for 5 frames (d3 schedules,
+// starts and ticks a transition on separate frames)
+function settle(group, done) {
+    if (clock) clock.advance(60000);
+    var last = JSON.stringify(read(group)), stable = 0, started = Date.now(), ticket = 0;
+    function frame() {
+        if (clock) clock.advance(0);
+        var now = JSON.stringify(read(group));
+        stable = now === last ? stable + 1 : 0;
+        last = now;
+        // the ticket also stops the other pending frame callback once done
+        var mine = ++ticket;
+        if (stable >= 5 || Date.now() - started > maxWait) { done(); return; }
+        var next = function() { if (mine === ticket) frame(); };
+        requestAnimationFrame(next);
+        later(next, 20);
+    }
+    frame();
+}
+var result = {count: marks.length, indices: indices, attributes: attributes,
+              before: read(probed), over: [], out: []};
+if (mode === 'together') {
+    probed.forEach(function(el) { dispatch(el, OVER); });
+    settle(probed, function() {
+        result.over = read(probed);
+        probed.forEach(function(el) { dispatch(el, OUT); });
+        settle(probed, function() {
+            result.out = read(probed);
+            callback(result);
+        });
+    });
+} else {
+    var k = 0;
+    (function step() {
+        if (k >= probed.length) { callback(result); return; }
+        var el = probed[k];
+        dispatch(el, OVER);
+        settle([el], function() {
+            result.over.push(read([el])[0]);
+            dispatch(el, OUT);
+            settle([el], function() {
+                result.out.push(read([el])[0]);
+                k++;
+                step();
+            });
+        });
+    })();
+}
+"""
+
+# how long one settle phase may wait for transitions (without a virtual clock), in seconds
+MAX_SETTLE_WAIT = 2
+# cap on a whole probe, in seconds
+PROBE_TIMEOUT = 120
+
+
+def _probe_args(selector, sample, attributes, mode):
+    sample = list(sample) if isinstance(sample, (list, tuple)) else sample
+    return (selector, sample, list(attributes), mode, MAX_SETTLE_WAIT * 1000)
+
+
+def prepare_probe(selector, sample=None, attributes=('r',), mode='sequential'):
+    """register a probe with the snapshot queries, so it can be replayed offline;
+    call at import time, before any page is captured
+    """
+    register_query(PROBE_SCRIPT, *_probe_args(selector, sample, attributes, mode), asynchronous=True)
+
+
+class ProbeResult:
+    """Attributes of the probed marks; before, over and out are (n probed, n attributes)
+    arrays of the attribute strings (None when missing).
+    """
+    def __init__(self, payload):
+        self.count = payload['count']
+        self.indices = np.asarray(payload['indices'], dtype=np.intp)
+        self.attributes = list(payload['attributes'])
+        shape = (len(self.indices), len(self.attributes))
+        self.before = np.asarray(payload['before'], dtype=object).reshape(shape)
+        self.over = np.asarray(payload['over'], dtype=object).reshape(shape)
+        self.out = np.asarray(payload['out'], dtype=object).reshape(shape)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def numeric(self, phase, attribute):
+        """float values of attribute for every probed mark in phase ('before', 'over' or 'out');
+        NaN when missing or not a number
+        """
+        column = getattr(self, phase)[:, self.attributes.index(attribute)]
+        values = np.full(len(column), np.nan)
+        for i, value in enumerate(column):
+            try:
+                values[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return values
+
+    def grows_on_over(self, attribute='r'):
+        """boolean array, True where the attribute is larger while hovered than before"""
+        return self.numeric('over', attribute) > self.numeric('before', attribute)
+
+    def shrinks_on_out(self, attribute='r'):
+        """boolean array, True where the attribute is smaller after mouseout than while hovered"""
+        return self.numeric('out', attribute) < self.numeric('over', attribute)
+
+
+def probe_interactions(driver, selector, sample=None, attributes=('r',), mode='sequential'):
+    """Hover and un-hover the marks matching selector in one async script.
+    sample is None (all marks), a number of evenly spaced marks or a list of mark indices.
+    """
+    driver.set_script_timeout(PROBE_TIMEOUT)
+    return ProbeResult(driver.execute_async_script(PROBE_SCRIPT, *_probe_args(selector, sample, attributes, mode)))
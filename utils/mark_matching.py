@@ -0,0 +1,110 @@
+"""
+Util to match submitted mark positions against expected positions independent of drawing order.
+Candidate pairs come from a KD-tree nearest-neighbour search within a per-axis (Chebyshev)
+tolerance, so a correct plot drawn in any order matches and partial matches can be scored.
+"""
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import maximum_bipartite_matching
+from scipy.spatial import cKDTree
+
+
+class MatchReport:
+    """Result of matching submitted (actual) marks against expected marks.
+
+    matched: (m, 2) array of (actual index, expected index) pairs
+    missing: expected indices with no submitted mark within tolerance
+    extra:   actual indices that do not correspond to any expected mark
+    error:   (m, 2) array of actual - expected x/y offsets of the matched pairs
+    """
+    def __init__(self, matched, missing, extra, error, expected_count, actual_count, tolerance):
+        self.matched = matched
+        self.missing = missing
+        self.extra = extra
+        self.error = error
+        self.expected_count = expected_count
+        self.actual_count = actual_count
+        self.tolerance = tolerance
+
+    @property
+    def all_matched(self):
+        return len(self.missing) == 0 and len(self.extra) == 0
+
+    @property
+    def fraction_matched(self):
+        """share of expected marks that were matched, usable for partial credit"""
+        if self.expected_count == 0:
+            return 1.0 if self.actual_count == 0 else 0.0
+        return len(self.matched) / self.expected_count
+
+    def axis_error_stats(self):
+        """mean absolute, max absolute and RMS error per axis over the matched marks"""
+        stats = {}
+        for axis, column in (('x', 0), ('y', 1)):
+            e = self.error[:, column]
+            if len(e) == 0:
+                stats[axis] = {'mean_abs': None, 'max_abs': None, 'rmse': None}
+                continue
+            stats[axis] = {'mean_abs': float(np.mean(np.abs(e))),
+                           'max_abs': float(np.max(np.abs(e))),
+                           'rmse': float(np.sqrt(np.mean(e ** 2)))}
+        return stats
+
+    def summary(self):
+        stats = self.axis_error_stats()
+        text = (f"matched {len(self.matched)}/{self.expected_count} expected marks "
+                f"(tolerance {self.tolerance}px), {len(self.missing)} missing, {len(self.extra)} extra.")
+        for axis in ('x', 'y'):
+            if stats[axis]['max_abs'] is not None:
+                text += f"\n{axis}-axis error: mean {stats[axis]['mean_abs']:.2f}px, max {stats[axis]['max_abs']:.2f}px"
+        return text
+
+
+def _candidate_pairs(query_points, tree, tolerance, k):
+    """(query index, tree index) pairs of the k nearest tree points within tolerance"""
+    k = min(k, tree.n)
+    dist, idx = tree.query(query_points, k=k, p=np.inf, distance_upper_bound=tolerance)
+    dist = dist.reshape(len(query_points), k)
+    idx = idx.reshape(len(query_points), k)
+    rows, cols = np.nonzero(np.isfinite(dist))
+    return rows, idx[rows, cols]
+
+
+def match_marks(actual_positions, expected_positions, tolerance=2, k=16):
+    """Match (n, 2) arrays of actual and expected x/y positions within a per-axis tolerance.
+    Candidate pairs are the k nearest neighbours (searched from both sides) and the
+    assignment is a maximum bipartite matching over them, so overlapping marks are paired
+    one-to-one. Runs in O(n log n) for plots without heavy overplotting; rows containing
+    NaN never match.
+    """
+    actual = np.asarray(actual_positions, dtype=np.float64).reshape(-1, 2)
+    expected = np.asarray(expected_positions, dtype=np.float64).reshape(-1, 2)
+    # cKDTree excludes points exactly at the bound, the original check accepted |diff| == tolerance
+    bound = np.nextafter(float(tolerance), np.inf)
+
+    actual_valid = np.flatnonzero(np.all(np.isfinite(actual), axis=1))
+    expected_valid = np.flatnonzero(np.all(np.isfinite(expected), axis=1))
+    actual_match = np.full(len(actual), -1, dtype=np.intp)
+    if len(actual_valid) and len(expected_valid):
+        a_rows, e_cols = _candidate_pairs(actual[actual_valid], cKDTree(expected[expected_valid]), bound, k)
+        e_rows, a_cols = _candidate_pairs(expected[expected_valid], cKDTree(actual[actual_valid]), bound, k)
+        rows = np.concatenate((a_rows, a_cols))
+        cols = np.concatenate((e_cols, e_rows))
+        graph = csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)),
+                           shape=(len(actual_valid), len(expected_valid)))
+        graph.sum_duplicates()
+        local_match = maximum_bipartite_matching(graph, perm_type='column')
+        hit = local_match >= 0
+        actual_match[actual_valid[hit]] = expected_valid[local_match[hit]]
+
+    matched_actual = np.flatnonzero(actual_match >= 0)
+    matched = np.column_stack((matched_actual, actual_match[matched_actual]))
+    expected_matched = np.zeros(len(expected), dtype=bool)
+    expected_matched[matched[:, 1]] = True
+    return MatchReport(matched=matched,
+                       missing=np.flatnonzero(~expected_matched),
+                       extra=np.flatnonzero(actual_match < 0),
+                       error=actual[matched[:, 0]] - expected[matched[:, 1]],
+                       expected_count=len(expected),
+                       actual_count=len(actual),
+                       tolerance=tolerance)
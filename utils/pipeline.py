@@ -0,0 +1,132 @@
+"""
+Asyncio pipeline of grading phases.
+Stages are plain functions with explicit dependencies; every stage starts as soon as the
+stages it depends on are done, in a worker thread, so independent phases (solution render,
+submission render, uploads, tests) overlap. Stages that need the main thread (signals,
+forking) are marked main_thread; the event loop then runs in a thread of its own and hands
+them to the main thread, so other stages keep starting meanwhile. report() gives the time of
+every stage and the critical path, the chain of dependent stages that decided the length of
+the run.
+
+    pipeline = Pipeline()
+    pipeline.add('render', render, after=['server'])
+    results = pipeline.run()
+"""
+import time
+import queue
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class Stage:
+    def __init__(self, name, func, after=(), main_thread=False, optional=False):
+        self.name = name
+        self.func = func
+        self.after = tuple(after)
+        self.main_thread = main_thread
+        # a failing optional stage is reported and its dependents get None for its result
+        self.optional = optional
+        self.started = None
+        self.finished = None
+        self.error = None
+
+
+class Pipeline:
+    def __init__(self, max_workers=8):
+        self.stages = OrderedDict()
+        self.max_workers = max_workers
+        self.results = {}
+
+    def add(self, name, func, after=(), main_thread=False, optional=False):
+        """func is called with the results of the stages in after, in that order"""
+        for dependency in after:
+            if dependency not in self.stages:
+                raise ValueError(f"stage '{name}' depends on unknown stage '{dependency}'")
+        self.stages[name] = Stage(name, func, after, main_thread, optional)
+        return self
+
+    async def _run_stage(self, stage, tasks, executor):
+        results = [await tasks[dependency] for dependency in stage.after]
+        loop = asyncio.get_event_loop()
+        stage.started = time.perf_counter()
+        try:
+            if stage.main_thread:
+                future = Future()
+                self._main_jobs.put((lambda: stage.func(*results), future))
+                result = await asyncio.wrap_future(future)
+            else:
+                result = await loop.run_in_executor(executor, lambda: stage.func(*results))
+        except Exception as e:
+            stage.error = repr(e)
+            if not stage.optional:
+                raise
+            print(f"stage '{stage.name}' failed: {e!r}")
+            result = None
+        finally:
+            stage.finished = time.perf_counter()
+        self.results[stage.name] = result
+        return result
+
+    async def _run(self):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            tasks = {}
+            for stage in self.stages.values():  # dependencies are added before their dependents
+                tasks[stage.name] = asyncio.ensure_future(self._run_stage(stage, tasks, executor))
+            await asyncio.gather(*tasks.values())
+
+    def _run_loop(self, errors):
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._run())
+        except Exception as e:
+            errors.append(e)
+        finally:
+            loop.close()
+            self._main_jobs.put(None)
+
+    def run(self):
+        """run every stage; returns {stage name: result}"""
+        self.started = time.perf_counter()
+        self._main_jobs = queue.Queue()
+        errors = []
+        loop_thread = threading.Thread(target=self._run_loop, args=(errors,))
+        loop_thread.start()
+        # run main_thread stages here until the loop is done
+        for func, future in iter(self._main_jobs.get, None):
+            try:
+                future.set_result(func())
+            except Exception as e:
+                future.set_exception(e)
+        loop_thread.join()
+        self.finished = time.perf_counter()
+        if errors:
+            raise errors[0]
+        return self.results
+
+    def critical_path(self):
+        """(stage names, seconds) of the longest chain of dependent stages, by finish time"""
+        finished = {name: stage for name, stage in self.stages.items() if stage.finished is not None}
+        if not finished:
+            return [], 0.0
+        # walk back from the last stage to finish through the dependency that finished last
+        path = [max(finished.values(), key=lambda s: s.finished)]
+        while True:
+            dependencies = [finished[d] for d in path[-1].after if d in finished]
+            if not dependencies:
+                break
+            path.append(max(dependencies, key=lambda s: s.finished))
+        path.reverse()
+        return [s.name for s in path], round(path[-1].finished - self.started, 3)
+
+    def report(self):
+        path, seconds = self.critical_path()
+        return {"stages": {name: {"after": list(stage.after),
+                                  "start": stage.started and round(stage.started - self.started, 3),
+                                  "seconds": stage.finished and round(stage.finished - stage.started, 3),
+                                  "error": stage.error}
+                           for name, stage in self.stages.items()},
+                "critical_path": path,
+                "critical_path_seconds": seconds,
+                "wall_seconds": round(self.finished - self.started, 3)}
@@ -0,0 +1,260 @@
+"""
+Rubric-driven query planner.
+Tests declare the DOM facts they read with @needs(...); query_plan() merges those needs with
+the required elements of the rubric into one in-page extraction, so a test class fetches every
+element, axis tick and domain it uses in a single execute_script call and reads the memoized
+PageFacts afterwards.
+Tests that cannot run without an element declare it with @requires_elements(...); one presence
+probe per test class then decides which of them fail right away.
+"""
+import functools
+from collections import namedtuple
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from utils.rubric_helper import get_rubric_config
+from utils.render_snapshot import register_query, SnapshotDriver
+
+# how long the presence probe waits for required elements to be rendered
+PROBE_TIMEOUT = 10
+
+# within is a CSS selector for the element the id is searched under (its first match),
+# e.g. 'g' for `find_element_by_tag_name("g").find_element_by_id(...)`; None searches the document
+Need = namedtuple('Need', ['kind', 'id', 'within'])
+
+
+def element(element_id, within=None):
+    """tag name, text, rect and computed transform of the element with element_id"""
+    return Need('element', element_id, within)
+
+
+def axis(axis_id, within=None):
+    """element facts of an axis <g> plus its .domain rect and the text, location and
+    line x2/y2 of every .tick
+    """
+    return Need('axis', axis_id, within)
+
+
+class needs(object):
+    """Decorator to add a __needs__ property to a test method
+
+    Usage: @needs(axis('x_axis', within='g'), element('title'))
+    """
+    def __init__(self, *specs):
+        self.specs = specs
+
+    def __call__(self, func):
+        func.__needs__ = getattr(func, '__needs__', ()) + self.specs
+        return func
+
+
+class requires_elements(object):
+    """Decorator failing a test without touching the browser when one of the element ids
+    it depends on was missing in the presence probe of its class
+
+    Usage: @requires_elements("symbols", "x_axis")
+    """
+    def __init__(self, *ids):
+        self.ids = ids
+
+    def __call__(self, func):
+        ids = self.ids
+
+        @functools.wraps(func)
+        def wrapper(test_case):
+            missing = [i for i in ids if i in missing_elements(test_case)]
+            if missing:
+                test_case.fail(f"Required element(s) {', '.join('#' + i for i in missing)} not found "
+                               f"within {PROBE_TIMEOUT} seconds of page load; this test depends on them.")
+            return func(test_case)
+        wrapper.__requires__ = getattr(func, '__requires__', ()) + ids
+        return wrapper
+
+
+PRESENCE_SCRIPT = """
+return arguments[0].filter(function(id) { return !document.getElementById(id); });
+"""
+
+
+def probe_presence(driver, ids, timeout=PROBE_TIMEOUT):
+    """ids still missing after waiting up to timeout seconds for all of them to be present"""
+    missing = driver.execute_script(PRESENCE_SCRIPT, ids)
+    if missing and not isinstance(driver, SnapshotDriver):  # a snapshot never changes
+        try:
+            WebDriverWait(driver, timeout).until(lambda d: not d.execute_script(PRESENCE_SCRIPT, ids))
+            missing = []
+        except TimeoutException:
+            missing = driver.execute_script(PRESENCE_SCRIPT, ids)
+    return missing
+
+
+# Runs in the page. One entry per need, null when the element is missing.
+PLAN_SCRIPT = """
+function pageRect(el) {
+    var r = el.getBoundingClientRect();
+    return {x: r.x + window.scrollX, y: r.y + window.scrollY, width: r.width, height: r.height};
+}
+function visibleText(el) {
+    if (el.innerText !== undefined) return el.innerText.trim();
+    return el.textContent.replace(/\\s+/g, ' ').trim();
+}
+function describe(el, kind) {
+    var facts = {tag: el.tagName.toLowerCase(), text: visibleText(el), rect: pageRect(el),
+                 transform: window.getComputedStyle(el).getPropertyValue('transform')};
+    if (kind === 'axis') {
+        var domain = el.querySelector('.domain');
+        facts.domain = domain ? pageRect(domain) : null;
+        facts.ticks = Array.prototype.map.call(el.querySelectorAll('.tick'), function(tick) {
+            var line = tick.querySelector('line');
+            return {text: visibleText(tick), rect: pageRect(tick),
+                    x2: line ? line.getAttribute('x2') : null,
+                    y2: line ? line.getAttribute('y2') : null};
+        });
+    }
+    return facts;
+}
+return arguments[0].map(function(need) {
+    var root = need.within ? document.querySelector(need.within) : document;
+    var el = root ? root.querySelector('[id="' + CSS.escape(need.id) + '"]') : null;
+    return el ? describe(el, need.kind) : null;
+});
+"""
+
+
+def _location(rect):
+    # selenium rounds WebElement.location
+    return {"x": round(rect['x']), "y": round(rect['y'])}
+
+
+class ElementFacts:
+    def __init__(self, payload):
+        self.tag_name = payload['tag']
+        self.text = payload['text']
+        self.rect = payload['rect']
+        self.location = _location(self.rect)
+        self.size = {"height": self.rect['height'], "width": self.rect['width']}
+        self.transform = payload['transform']
+
+
+class TickFacts:
+    def __init__(self, payload):
+        self.text = payload['text']
+        self.rect = payload['rect']
+        self.location = _location(self.rect)
+        self.x2 = payload['x2']
+        self.y2 = payload['y2']
+
+
+class AxisFacts(ElementFacts):
+    def __init__(self, payload):
+        super().__init__(payload)
+        self.domain = payload['domain']
+        self.ticks = [TickFacts(t) for t in payload['ticks']]
+
+    def require_domain(self):
+        """rect of the .domain path; NoSuchElementException when the axis has none"""
+        if self.domain is None:
+            raise NoSuchElementException("Unable to locate the .domain path of the axis")
+        return self.domain
+
+
+class PageFacts:
+    """result of a QueryPlan for one page load"""
+
+    def __init__(self, plan, payload):
+        self._facts = {}
+        for need, facts in zip(plan.request, payload):
+            if facts is not None:
+                facts = AxisFacts(facts) if need.kind == 'axis' else ElementFacts(facts)
+            self._facts[(need.id, need.within)] = facts
+
+    def _get(self, element_id, within):
+        try:
+            return self._facts[(element_id, within)]
+        except KeyError:
+            raise KeyError(f"'{element_id}' (within {within!r}) is not in the query plan; "
+                           "declare it with @needs") from None
+
+    def element(self, element_id, within=None):
+        """ElementFacts (AxisFacts for axis needs) or None when the element is missing"""
+        return self._get(element_id, within)
+
+    def axis(self, axis_id, within=None):
+        facts = self._get(axis_id, within)
+        if facts is not None and not isinstance(facts, AxisFacts):
+            raise KeyError(f"'{axis_id}' is planned as an element, declare it with @needs(axis(...))")
+        return facts
+
+    def require(self, element_id, within=None):
+        """like element(), raising NoSuchElementException when the element is missing"""
+        facts = self._get(element_id, within)
+        if facts is None:
+            raise NoSuchElementException(f"Unable to locate element with id='{element_id}'")
+        return facts
+
+
+class QueryPlan:
+    def __init__(self, specs):
+        # one entry per (id, within); an axis need covers an element need for the same lookup
+        planned = {}
+        for spec in specs:
+            key = (spec.id, spec.within)
+            if key not in planned or spec.kind == 'axis':
+                planned[key] = spec
+        self.request = list(planned.values())
+        self.script_args = [need._asdict() for need in self.request]
+        # snapshots record the plan so tests can replay it offline
+        register_query(PLAN_SCRIPT, self.script_args)
+
+    @classmethod
+    def compile(cls, test_case_class, rubric_config):
+        """plan for the required elements of the rubric and the @needs of every test method"""
+        specs = [element(element_id)
+                 for ids in (rubric_config.get('elements') or {}).values()
+                 for element_id in ids]
+        for name in sorted(dir(test_case_class)):
+            specs.extend(getattr(getattr(test_case_class, name), '__needs__', ()))
+        return cls(specs)
+
+    def fetch(self, driver):
+        """PageFacts of the page loaded in driver, in one execute_script call"""
+        return PageFacts(self, driver.execute_script(PLAN_SCRIPT, self.script_args))
+
+
+def query_plan(rubric_path):
+    """Class decorator compiling the QueryPlan of a TestCase at import time, before any
+    page is rendered (so snapshot captures include it)
+    """
+    def decorate(test_case_class):
+        test_case_class.query_plan = QueryPlan.compile(test_case_class, get_rubric_config(rubric_path))
+        test_case_class.required_ids = sorted({element_id for name in dir(test_case_class)
+                                               for element_id in getattr(getattr(test_case_class, name),
+                                                                         '__requires__', ())})
+        if test_case_class.required_ids:
+            register_query(PRESENCE_SCRIPT, test_case_class.required_ids)
+        reset_page_facts(test_case_class)
+        return test_case_class
+    return decorate
+
+
+def page_facts(test_case):
+    """PageFacts of the class under test, fetched from its driver on first use and memoized
+    on the class until setUpClass calls reset_page_facts()
+    """
+    cls = type(test_case)
+    if cls._page_facts is None:
+        cls._page_facts = cls.query_plan.fetch(cls.driver)
+    return cls._page_facts
+
+
+def missing_elements(test_case):
+    """required ids of the class under test missing from its page, probed once per class"""
+    cls = type(test_case)
+    if cls._missing_elements is None:
+        cls._missing_elements = probe_presence(cls.driver, cls.required_ids) if cls.required_ids else []
+    return cls._missing_elements
+
+
+def reset_page_facts(test_case_class):
+    """forget the facts and presence probe of the previous page load"""
+    test_case_class._page_facts = None
+    test_case_class._missing_elements = None
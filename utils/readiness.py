@@ -0,0 +1,156 @@
+"""
+Render-settled readiness signal.
+install() makes chrome run a small instrumentation script before the scripts of every page:
+it counts pending fetch/XHR requests (d3.csv, d3.json) and timestamps every DOM mutation.
+wait_until_settled() then returns as soon as the document is loaded, no request is pending
+and the DOM has not changed for a quiet period (checked once per animation frame),
+instead of polling for elements with fixed waits. Pages with the virtual clock of
+utils/virtual_time.py are fast-forwarded whenever they go idle, so transitions end at once.
+ReadinessWaiter does both for the pages of a BrowserSession.
+"""
+from collections import namedtuple
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from utils.virtual_time import FAST_FORWARD_MS
+
+# seconds without DOM mutations after which the visualization counts as stable
+QUIET_PERIOD = 0.25
+# hard cap on the wait, in seconds
+SETTLE_TIMEOUT = 10
+
+INSTRUMENT_SCRIPT = """
+(function() {
+    if (window.__visgraderReadiness) return;
+    var state = window.__visgraderReadiness = {pending: 0, mutations: 0};
+    // wall-clock time, also when the page runs on the virtual clock of utils/virtual_time.py
+    state.now = function() {
+        return window.__visgraderClock ? window.__visgraderClock.realNow() : performance.now();
+    };
+    state.lastMutation = state.now();
+    function done() { state.pending = Math.max(0, state.pending - 1); }
+    if (window.fetch) {
+        var fetch = window.fetch;
+        window.fetch = function() {
+            state.pending++;
+            return fetch.apply(this, arguments).then(
+                function(response) { done(); return response; },
+                function(error) { done(); throw error; });
+        };
+    }
+    var send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        state.pending++;
+        this.addEventListener('loadend', done);
+        return send.apply(this, arguments);
+    };
+    new MutationObserver(function(records) {
+        state.mutations += records.length;
+        state.lastMutation = state.now();
+    }).observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+})();
+"""
+
+# Async. Resolves once the page is settled or after the cap; pages loaded without the
+# instrumentation (e.g. in a browser that was not set up by install()) are observed from now on.
+WAIT_SCRIPT = INSTRUMENT_SCRIPT + """
+var quiet = arguments[0], cap = arguments[1], fastForward = arguments[2], callback = arguments[3];
+var state = window.__visgraderReadiness, started = state.now(), finished = false, ticket = 0;
+var clock = window.__visgraderClock, advancedAt = -1;
+var later = clock ? clock.realSetTimeout : window.setTimeout.bind(window);
+function finish(settled) {
+    if (finished) return;
+    finished = true;
+    // the page became stable with its last DOM mutation, a quiet period before it was detected
+    callback({settled: settled, time_to_stable: settled ? state.lastMutation : state.now(),
+              waited: state.now() - started,
+              pending: state.pending, mutations: state.mutations});
+}
+function check() {
+    if (finished) return;
+    var idle = document.readyState === 'complete' && state.pending === 0;
+    if (idle && clock && fastForward && advancedAt !== state.mutations) {
+        // new DOM activity since the last jump, e.g. joins run after the data loaded
+        advancedAt = state.mutations;
+        clock.advance(fastForward);
+    }
+    var now = state.now();
+    if (idle && now - state.lastMutation >= quiet) {
+        finish(true);
+    } else if (now - started >= cap) {
+        finish(false);
+    } else {
+        // animation frames are throttled in hidden pages, so also poll with a timer;
+        // whichever fires first runs the next check
+        var mine = ++ticket;
+        var next = function() { if (mine === ticket) check(); };
+        requestAnimationFrame(next);
+        later(next, 50);
+    }
+}
+check();
+"""
+
+Readiness = namedtuple('Readiness', ['settled', 'time_to_stable', 'waited', 'pending', 'mutations'])
+
+
+def install(driver):
+    """run the instrumentation before the scripts of every page driver loads from now on"""
+    try:
+        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': INSTRUMENT_SCRIPT})
+        return True
+    except (AttributeError, WebDriverException):  # not chrome, or no devtools access
+        return False
+
+
+def wait_until_settled(driver, quiet_period=QUIET_PERIOD, timeout=SETTLE_TIMEOUT, fast_forward_ms=0):
+    """Wait until the page is stable, at most timeout seconds.
+    With fast_forward_ms, a page with a virtual clock is moved that far ahead each time it goes idle.
+    time_to_stable is the time of the last DOM mutation (of the cap when not settled) since the
+    start of navigation, waited the time spent in this call; both in seconds.
+    """
+    driver.set_script_timeout(timeout + 5)
+    try:
+        result = driver.execute_async_script(WAIT_SCRIPT, quiet_period * 1000, timeout * 1000, fast_forward_ms)
+    except TimeoutException:
+        return Readiness(False, None, timeout, None, None)
+    return Readiness(result['settled'], result['time_to_stable'] / 1000, result['waited'] / 1000,
+                     result['pending'], result['mutations'])
+
+
+class ReadinessWaiter:
+    """BrowserSession feature: instruments every page and waits for borrowed pages to settle.
+    Pages without the virtual clock ignore fast_forward_ms.
+    """
+
+    def __init__(self, quiet_period=QUIET_PERIOD, settle_timeout=SETTLE_TIMEOUT, fast_forward_ms=FAST_FORWARD_MS):
+        self.quiet_period = quiet_period
+        self.settle_timeout = settle_timeout
+        self.fast_forward_ms = fast_forward_ms
+        # readiness of every page load, and totals over all loads
+        self.loads = []
+        self.settle_seconds = 0.0
+        self.unsettled_loads = 0
+
+    def started(self, driver):
+        install(driver)
+
+    def loaded(self, driver, url, is_submission):
+        # wait for data loads, joins and transitions instead of polling for elements
+        readiness = wait_until_settled(driver, self.quiet_period, self.settle_timeout, self.fast_forward_ms)
+        self.loads.append({"submission": is_submission, "settled": readiness.settled,
+                           "time_to_stable": readiness.time_to_stable and round(readiness.time_to_stable, 3),
+                           "waited": round(readiness.waited, 3)})
+        self.settle_seconds += readiness.waited
+        self.unsettled_loads += not readiness.settled
+        if not readiness.settled:
+            print(f"page did not settle within {self.settle_timeout}s "
+                  f"({readiness.pending} pending requests), continuing anyway")
+
+    def stats(self):
+        """time to stable of every page load (in seconds since navigation), total wait and
+        loads that did not settle"""
+        return {"readiness": {"loads": self.loads,
+                              "settle_seconds": round(self.settle_seconds, 3),
+                              "unsettled_loads": self.unsettled_loads}}
+
+    def shard(self):
+        return ReadinessWaiter(self.quiet_period, self.settle_timeout, self.fast_forward_ms)
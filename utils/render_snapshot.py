@@ -0,0 +1,402 @@
+"""
+Offline render snapshots.
+capture_snapshot() serializes one render of a page (DOM tree, attributes, text, bounding rects,
+selected computed styles, page source and the results of registered execute_script queries)
+into a gzipped JSON file. SnapshotDriver answers the subset of the WebDriver API the test
+modules use from such a file, so a cohort can be re-graded after a rubric change without a browser.
+"""
+import re
+import gzip
+import json
+import hashlib
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+from utils.dom_extract import MARK_GEOMETRY_SCRIPT, AXIS_SCRIPT
+
+SNAPSHOT_NAME = 'snapshot.json.gz'
+SNAPSHOT_VERSION = 1
+
+# computed styles kept for every element (value_of_css_property)
+STYLE_PROPERTIES = ('transform', 'fill', 'stroke', 'stroke-width', 'opacity', 'display',
+                    'visibility', 'font-size', 'font-family', 'font-weight', 'text-anchor')
+
+# execute_script / execute_async_script calls answered from the snapshot, as (script, args, asynchronous)
+QUERIES = []
+
+
+def register_query(script, *args, asynchronous=False):
+    """record the result of execute_script(script, *args) (execute_async_script when
+    asynchronous) in every snapshot captured from now on
+    """
+    if (script, args, asynchronous) not in QUERIES:
+        QUERIES.append((script, args, asynchronous))
+
+
+register_query(MARK_GEOMETRY_SCRIPT, '#symbols circle')
+register_query(AXIS_SCRIPT, ['x_axis', 'y_axis'])
+
+
+def query_key(script, args):
+    return hashlib.sha1((script + '\0' + json.dumps(list(args), sort_keys=True)).encode()).hexdigest()
+
+
+class SnapshotUnavailable(WebDriverException):
+    """raised for driver calls that cannot be answered from a snapshot (e.g. interactions)"""
+
+
+# Runs in the page. Elements are emitted in document order; each node lists its children as
+# node indices (elements) or strings (text nodes). Computed styles are palette-encoded.
+CAPTURE_SCRIPT = """
+var styleNames = arguments[0];
+var nodes = [], styles = [], styleIndex = {};
+var sx = window.scrollX, sy = window.scrollY;
+function visit(el) {
+    var index = nodes.length;
+    var node = {t: el.tagName.toLowerCase(), a: {}, c: []};
+    nodes.push(node);
+    for (var i = 0; i < el.attributes.length; i++) {
+        node.a[el.attributes[i].name] = el.attributes[i].value;
+    }
+    var r = el.getBoundingClientRect();
+    node.r = [r.x + sx, r.y + sy, r.width, r.height];
+    var computed = window.getComputedStyle(el);
+    var style = styleNames.map(function(name) { return computed.getPropertyValue(name); });
+    var key = JSON.stringify(style);
+    if (!(key in styleIndex)) {
+        styleIndex[key] = styles.length;
+        styles.push(style);
+    }
+    node.s = styleIndex[key];
+    for (var child = el.firstChild; child; child = child.nextSibling) {
+        if (child.nodeType === 1) node.c.push(visit(child));
+        else if (child.nodeType === 3 && child.nodeValue.trim()) node.c.push(child.nodeValue);
+    }
+    return index;
+}
+visit(document.documentElement);
+return {nodes: nodes, styles: styles,
+        window_size: [window.innerWidth, window.innerHeight]};
+"""
+
+
+def capture_snapshot(driver):
+    """serialize the page currently loaded in driver; returns the snapshot dict"""
+    snapshot = driver.execute_script(CAPTURE_SCRIPT, list(STYLE_PROPERTIES))
+    snapshot['version'] = SNAPSHOT_VERSION
+    snapshot['style_names'] = list(STYLE_PROPERTIES)
+    snapshot['url'] = driver.current_url
+    snapshot['page_source'] = driver.page_source
+    snapshot['queries'] = {}
+    # async queries (interaction probes) run last since they may change the page
+    for script, args, asynchronous in sorted(QUERIES, key=lambda query: query[2]):
+        execute = driver.execute_async_script if asynchronous else driver.execute_script
+        try:
+            result = {"value": execute(script, *args)}
+        except WebDriverException as e:
+            result = {"error": e.msg or str(e)}
+        snapshot['queries'][query_key(script, args)] = result
+    return snapshot
+
+
+def save_snapshot(snapshot, path):
+    with gzip.open(path, 'wt') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+
+
+def load_snapshot(path):
+    with gzip.open(path, 'rt') as f:
+        snapshot = json.load(f)
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"{path} is a version {snapshot.get('version')} snapshot, expected {SNAPSHOT_VERSION}")
+    return snapshot
+
+
+_COMPOUND = re.compile(r'^(\*|[a-zA-Z][\w-]*)?((?:[#.][\w-]+)*)$')
+
+
+def _parse_selector(selector):
+    """CSS selector -> list of (combinator, tag, ids, classes); supports tag, #id, .class,
+    their compounds and the descendant / child combinators
+    """
+    steps, combinator = [], ' '
+    for token in selector.replace('>', ' > ').split():
+        if token == '>':
+            combinator = '>'
+            continue
+        match = _COMPOUND.match(token)
+        if not match:
+            raise SnapshotUnavailable(f"selector '{selector}' is not supported by snapshots")
+        tag = match.group(1) if match.group(1) not in (None, '*') else None
+        parts = re.findall(r'([#.])([\w-]+)', match.group(2))
+        steps.append((combinator, tag,
+                      [name for kind, name in parts if kind == '#'],
+                      [name for kind, name in parts if kind == '.']))
+        combinator = ' '
+    if not steps:
+        raise SnapshotUnavailable(f"empty selector '{selector}'")
+    return steps
+
+
+class _Finders:
+    """the find_element(s)_by_* shorthands of selenium 3, in terms of find_element(s)"""
+
+    def find_element_by_id(self, id_):
+        return self.find_element(By.ID, id_)
+
+    def find_elements_by_id(self, id_):
+        return self.find_elements(By.ID, id_)
+
+    def find_element_by_tag_name(self, name):
+        return self.find_element(By.TAG_NAME, name)
+
+    def find_elements_by_tag_name(self, name):
+        return self.find_elements(By.TAG_NAME, name)
+
+    def find_element_by_class_name(self, name):
+        return self.find_element(By.CLASS_NAME, name)
+
+    def find_elements_by_class_name(self, name):
+        return self.find_elements(By.CLASS_NAME, name)
+
+    def find_element_by_css_selector(self, css_selector):
+        return self.find_element(By.CSS_SELECTOR, css_selector)
+
+    def find_elements_by_css_selector(self, css_selector):
+        return self.find_elements(By.CSS_SELECTOR, css_selector)
+
+    def find_element_by_xpath(self, xpath):
+        return self.find_element(By.XPATH, xpath)
+
+    def find_elements_by_xpath(self, xpath):
+        return self.find_elements(By.XPATH, xpath)
+
+
+class SnapshotElement(_Finders):
+    """WebElement look-alike for one captured element"""
+
+    def __init__(self, driver, index):
+        self._driver = driver
+        self._node = driver._nodes[index]
+        self.id = index
+
+    def __eq__(self, other):
+        return isinstance(other, SnapshotElement) and other._driver is self._driver and other.id == self.id
+
+    def __hash__(self):
+        return hash((id(self._driver), self.id))
+
+    @property
+    def tag_name(self):
+        return self._node['t']
+
+    @property
+    def text(self):
+        return ' '.join(self._driver._text(self.id).split())
+
+    @property
+    def rect(self):
+        x, y, width, height = self._node['r']
+        return {"x": x, "y": y, "width": width, "height": height}
+
+    @property
+    def location(self):
+        x, y = self._node['r'][:2]
+        return {"x": round(x), "y": round(y)}
+
+    @property
+    def size(self):
+        width, height = self._node['r'][2:]
+        return {"height": height, "width": width}
+
+    def get_attribute(self, name):
+        return self._node['a'].get(name)
+
+    def value_of_css_property(self, property_name):
+        try:
+            column = self._driver._style_names.index(property_name)
+        except ValueError:
+            raise SnapshotUnavailable(f"computed style '{property_name}' was not captured")
+        return self._driver._styles[self._node['s']][column]
+
+    def is_displayed(self):
+        return (self.value_of_css_property('display') != 'none'
+                and self.value_of_css_property('visibility') != 'hidden')
+
+    def find_elements(self, by=By.ID, value=None):
+        return self._driver._find(by, value, self.id)
+
+    def find_element(self, by=By.ID, value=None):
+        return self._driver._first(by, value, self.id)
+
+class SnapshotDriver(_Finders):
+    """WebDriver look-alike answering element lookups, page_source and registered
+    execute_script queries from a snapshot. Navigation and window calls are no-ops;
+    interactions (ActionChains) raise SnapshotUnavailable.
+    """
+    w3c = True
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        self._nodes = snapshot['nodes']
+        self._styles = snapshot['styles']
+        self._style_names = snapshot['style_names']
+        self._parents = [None] * len(self._nodes)
+        for index, node in enumerate(self._nodes):
+            for child in node['c']:
+                if isinstance(child, int):
+                    self._parents[child] = index
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_snapshot(path))
+
+    @property
+    def page_source(self):
+        return self._snapshot['page_source']
+
+    @property
+    def current_url(self):
+        return self._snapshot['url']
+
+    def find_elements(self, by=By.ID, value=None):
+        return self._find(by, value, None)
+
+    def find_element(self, by=By.ID, value=None):
+        return self._first(by, value, None)
+
+    def execute_script(self, script, *args):
+        result = self._snapshot['queries'].get(query_key(script, args))
+        if result is None:
+            raise SnapshotUnavailable("script was not recorded in the snapshot; "
+                                      "add it with render_snapshot.register_query()")
+        if 'error' in result:
+            raise WebDriverException(result['error'])
+        return result['value']
+
+    execute_async_script = execute_script
+
+    def set_script_timeout(self, time_to_wait):
+        pass
+
+    def execute(self, driver_command, params=None):
+        raise SnapshotUnavailable(f"'{driver_command}' needs a live browser")
+
+    def get(self, url):
+        pass
+
+    def delete_all_cookies(self):
+        pass
+
+    def set_window_size(self, width, height, windowHandle='current'):
+        pass
+
+    def get_window_size(self, windowHandle='current'):
+        width, height = self._snapshot['window_size']
+        return {"width": width, "height": height}
+
+    def quit(self):
+        pass
+
+    def _text(self, index):
+        node = self._nodes[index]
+        if node['t'] in ('script', 'style', 'head'):
+            return ''
+        return ' '.join(child if isinstance(child, str) else self._text(child) for child in node['c'])
+
+    def _descendants(self, index):
+        """element indices below index in document order; index None is the document"""
+        if index is None:
+            stack = [0]
+        else:
+            stack = [child for child in reversed(self._nodes[index]['c']) if isinstance(child, int)]
+        while stack:
+            child = stack.pop()
+            yield child
+            stack.extend(c for c in reversed(self._nodes[child]['c']) if isinstance(c, int))
+
+    def _matches(self, index, tag, ids, classes):
+        node = self._nodes[index]
+        if tag is not None and node['t'] != tag.lower():
+            return False
+        if any(node['a'].get('id') != i for i in ids):
+            return False
+        node_classes = node['a'].get('class', '').split()
+        return all(c in node_classes for c in classes)
+
+    def _select(self, selector, root):
+        steps = _parse_selector(selector)
+        matches = []
+        for index in self._descendants(root):
+            if not self._matches(index, *steps[-1][1:]):
+                continue
+            # walk the ancestors right to left, stopping at the search root
+            current, ok = index, True
+            for position in range(len(steps) - 1, 0, -1):
+                combinator = steps[position][0]
+                step = steps[position - 1][1:]
+                current = self._parents[current]
+                if combinator == '>':
+                    ok = current is not None and current != root and self._matches(current, *step)
+                else:
+                    while current is not None and current != root and not self._matches(current, *step):
+                        current = self._parents[current]
+                    ok = current is not None and current != root
+                if not ok:
+                    break
+            if ok:
+                matches.append(index)
+        return matches
+
+    def _find(self, by, value, root):
+        if by == By.ID:
+            selector = '#' + value
+        elif by == By.TAG_NAME:
+            selector = value
+        elif by == By.CLASS_NAME:
+            selector = '.' + value
+        elif by == By.CSS_SELECTOR:
+            selector = value
+        elif by == By.XPATH and value in ('//*[@id]', './/*[@id]'):
+            return [SnapshotElement(self, i) for i in self._descendants(root) if 'id' in self._nodes[i]['a']]
+        else:
+            raise SnapshotUnavailable(f"locator ({by}, {value}) is not supported by snapshots")
+        return [SnapshotElement(self, i) for i in self._select(selector, root)]
+
+    def _first(self, by, value, root):
+        found = self._find(by, value, root)
+        if not found:
+            raise NoSuchElementException(f"Unable to locate element: {{\"method\":\"{by}\",\"selector\":\"{value}\"}}")
+        return found[0]
+
+
+class SnapshotSource:
+    """BrowserSession feature: serves submission borrows from the snapshot at path (when set)
+    instead of a live page
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._driver = None
+
+    def driver_for(self, url, is_submission):
+        if not (self.path and is_submission):
+            return None
+        # loaded once per path
+        if self._driver is None or self._driver[0] != self.path:
+            self._driver = (self.path, SnapshotDriver.from_file(self.path))
+        return self._driver[1]
+
+    def shard(self):
+        return SnapshotSource(self.path)
+
+
+class SnapshotCapture:
+    """BrowserSession feature: writes a snapshot of the next submission page borrowed to path"""
+
+    def __init__(self, path=None):
+        self.path = path
+
+    def prepared(self, driver, is_submission):
+        if self.path and is_submission:
+            save_snapshot(capture_snapshot(driver), self.path)
+            self.path = None  # one capture per render
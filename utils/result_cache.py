@@ -0,0 +1,108 @@
+"""
+Memoization of grading results for byte-identical resubmissions.
+Results are keyed by a hash of the submitted files and a hash of everything that grades them
+(rubric/config YAML, test modules, grader utils, data and d3 libraries) and kept in a bounded
+on-disk store with least-recently-used eviction. Only complete runs are stored: results with a
+test that was skipped, timed out or hit a browser error (see mark_incomplete()) are not.
+
+The store lives under $VISGRADER_CACHE_DIR (default .visgrader_cache) in the working directory.
+On Gradescope every run starts in a fresh container, so the cache only pays off where that
+directory persists between runs: batch grading, the grading daemon, or a VISGRADER_CACHE_DIR on
+a volume that outlives the container.
+"""
+import os
+import json
+import hashlib
+import tempfile
+from utils.solution_cache import DEFAULT_CACHE_DIR
+
+# files the grader writes into the submission folder, not part of what the student submitted
+GENERATED_FILES = ('plot.png', 'comparison.png')
+
+
+def hash_paths(paths, digest=None, skip=()):
+    """sha256 over the relative names and contents of files under paths (files or directories)"""
+    digest = digest or hashlib.sha256()
+    for top in paths:
+        if os.path.isfile(top):
+            walk = [(os.path.dirname(top), [], [os.path.basename(top)])]
+        else:
+            walk = os.walk(top)
+        for root, dirs, files in walk:
+            dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+            for name in sorted(files):
+                if name in skip:
+                    continue
+                path = os.path.join(root, name)
+                digest.update(path.encode() + b'\0')
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(chunk)
+    return digest
+
+
+def mark_incomplete(entry, reason):
+    """flag a test entry whose score does not reflect the submission, e.g. a test that was not
+    run or lost its browser; results with such entries are not cached"""
+    entry.setdefault("extra_data", {})["incomplete"] = reason
+    return entry
+
+
+def incomplete_tests(results):
+    """names of the tests of a results.json whose entries are marked incomplete"""
+    return [test.get("name") for test in results.get("tests", [])
+            if "incomplete" in test.get("extra_data", {})]
+
+
+class ResultCache:
+    def __init__(self, cache_dir=os.path.join(DEFAULT_CACHE_DIR, 'results'), max_entries=5000):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def key(self, submission_dir, assignment_id):
+        submission_hash = hash_paths([submission_dir], skip=GENERATED_FILES).hexdigest()
+        grader_hash = hash_paths(['config/' + assignment_id, assignment_id + '/tests',
+                                  'utils', 'data', 'lib']).hexdigest()
+        return f"{submission_hash}-{grader_hash}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def get(self, key):
+        """cached results.json content for key, or None; a hit marks the entry recently used"""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                results = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return results
+
+    def put(self, key, results_path):
+        """store a finished results.json and evict the least recently used entries;
+        returns False, storing nothing, when a test of it is incomplete
+        """
+        with open(results_path) as f:
+            results = json.load(f)
+        if incomplete_tests(results):
+            return False
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(results, f)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+        return True
+
+    def evict(self):
+        entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                   if name.endswith('.json')]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -7,3 +7,16 @@ def get_rubric_config(config_filepath):
     with open(config_filepath, 'r') as stream:
         config = yaml.safe_load(stream)
     return config
+
+
+def derive_rubric_data(config, reference):
+    """fill x_ticks / y_ticks left empty in the rubric with the tick values of the solution render"""
+    if reference is None:
+        return config
+    data = config.get('data') or {}
+    config['data'] = data
+    for key, axis_id in (('x_ticks', 'x_axis'), ('y_ticks', 'y_axis')):
+        axis = reference['axes'].get(axis_id)
+        if not data.get(key) and axis is not None:
+            data[key] = [t for t in axis['ticks'] if t is not None]
+    return config
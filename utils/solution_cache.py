@@ -0,0 +1,136 @@
+"""
+Content-addressed cache of solution artifacts.
+The solution screenshot and the reference facts extracted from the solution render
+(tick values, axis extents, mark positions) are stored under a hash of the solution
+directory (HTML, data, d3 libraries) and the viewport, so a grading run only renders
+the solution when one of those inputs changed.
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from utils.browser_session import DEFAULT_WINDOW_SIZE
+from utils.static_server import StaticServer
+from utils.dom_extract import extract_marks, extract_axes, parse_tick_value
+
+DEFAULT_CACHE_DIR = os.environ.get('VISGRADER_CACHE_DIR', '.visgrader_cache')
+
+SCREENSHOT_NAME = 'solution_plot.png'
+REFERENCE_NAME = 'solution_reference.json'
+REFERENCE_PATH = os.path.join('solution', REFERENCE_NAME)
+
+# bump when extract_reference() changes so stale references are not reused
+# (2: references of 404 pages were cached by version 1)
+REFERENCE_VERSION = 2
+
+
+class InvalidReference(Exception):
+    """the solution render lacks the axes or marks the reference is built from"""
+
+
+def extract_reference(driver, axis_ids=('x_axis', 'y_axis'), mark_selector='#symbols circle'):
+    """reference facts of the page currently loaded in driver (two execute_script calls)"""
+    axes = {}
+    for axis_id, axis in extract_axes(driver, axis_ids).items():
+        if axis is None:
+            axes[axis_id] = None
+            continue
+        axes[axis_id] = {
+            "ticks": [parse_tick_value(t['text']) for t in axis['ticks']],
+            "tick_labels": [t['text'] for t in axis['ticks']],
+            "tick_positions": [[t['x'], t['y']] for t in axis['ticks']],
+            "extent": axis['domain'],
+        }
+    marks = extract_marks(driver, mark_selector)
+    return {
+        "axes": axes,
+        "marks": {"selector": mark_selector,
+                  "cx": marks.cx.tolist(),
+                  "cy": marks.cy.tolist(),
+                  "r": marks.r.tolist(),
+                  "fill": marks.fill.tolist()},
+    }
+
+
+def check_reference(reference, page):
+    """raise InvalidReference when an axis or every mark is missing, e.g. when page was not found"""
+    missing = [axis_id for axis_id, axis in reference["axes"].items() if axis is None]
+    if not reference["marks"]["cx"]:
+        missing.append(reference["marks"]["selector"])
+    if missing:
+        raise InvalidReference(f"the solution render of '{page}' has no {', '.join(missing)}; "
+                               "check that the page exists in the solution folder")
+
+
+def load_reference(path=REFERENCE_PATH):
+    """the reference written by the last solution render, or None"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+class SolutionCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def key(self, solution_dir, viewport=DEFAULT_WINDOW_SIZE):
+        """sha256 over every input file of the solution page plus the viewport"""
+        digest = hashlib.sha256(f"v{REFERENCE_VERSION} viewport={viewport}".encode())
+        for root, dirs, files in os.walk(solution_dir):
+            dirs.sort()
+            for name in sorted(files):
+                if name in (SCREENSHOT_NAME, REFERENCE_NAME):
+                    continue
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, solution_dir).encode() + b'\0')
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(chunk)
+        return digest.hexdigest()
+
+    def restore(self, key, solution_dir):
+        """copy cached artifacts into solution_dir; returns the reference, or None on a miss"""
+        entry = os.path.join(self.cache_dir, key)
+        if not os.path.exists(os.path.join(entry, REFERENCE_NAME)):
+            return None
+        for name in (SCREENSHOT_NAME, REFERENCE_NAME):
+            shutil.copy(os.path.join(entry, name), solution_dir)
+        return load_reference(os.path.join(solution_dir, REFERENCE_NAME))
+
+    def store(self, key, solution_dir):
+        """add the artifacts in solution_dir under key; concurrent writers are harmless"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.cache_dir)
+        for name in (SCREENSHOT_NAME, REFERENCE_NAME):
+            shutil.copy(os.path.join(solution_dir, name), staging)
+        try:
+            os.rename(staging, os.path.join(self.cache_dir, key))
+        except OSError:  # another run stored the same key first
+            shutil.rmtree(staging, ignore_errors=True)
+
+
+def render_solution(session, solution_dir='solution', page='submission.html', cache=None):
+    """Write solution_plot.png and solution_reference.json into solution_dir, restoring them
+    from the cache when possible and rendering the solution in the shared browser otherwise.
+    Returns the reference facts; a render without the axes or marks raises InvalidReference
+    and is not cached.
+    """
+    cache = cache or SolutionCache()
+    key = cache.key(solution_dir, DEFAULT_WINDOW_SIZE)
+    reference = cache.restore(key, solution_dir)
+    if reference is not None:
+        return reference
+
+    # ( must perform on GS , becuase uploading a local copy could have different dimensions/shape
+    with StaticServer(solution_dir) as server:
+        driver = session.borrow(server.url(page))
+        driver.save_screenshot(os.path.join(solution_dir, SCREENSHOT_NAME))
+        reference = extract_reference(driver)
+        session.release()
+    check_reference(reference, page)
+    with open(os.path.join(solution_dir, REFERENCE_NAME), 'w') as f:
+        json.dump(reference, f, indent=4)
+    cache.store(key, solution_dir)
+    return reference
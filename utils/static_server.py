@@ -0,0 +1,114 @@
+"""
+Embeddable threaded static file server owned by the grading entry point.
+Binds an ephemeral port by default, serves the shared lib/ and data/ folders from an
+in-memory cache with validators and caching headers, and shuts down cleanly.
+
+    with StaticServer('submission') as server:
+        driver.get(server.url('submission.html'))
+"""
+import os
+import io
+import hashlib
+import threading
+from email.utils import formatdate
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+# folders identical for every submission (copied from the grader's source), safe to cache
+CACHED_DIRS = ('lib', 'data')
+CACHE_MAX_AGE = 24 * 60 * 60
+
+_file_cache = {}
+_file_cache_lock = threading.Lock()
+
+
+class _CachedFile:
+    def __init__(self, path):
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        self.key = (stat.st_mtime_ns, stat.st_size)
+        self.etag = '"' + hashlib.sha1(self.data).hexdigest() + '"'
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+
+def _cached_file(path):
+    """file contents from the process-wide cache, reloaded when the file changes on disk"""
+    stat = os.stat(path)
+    with _file_cache_lock:
+        entry = _file_cache.get(path)
+        if entry is None or entry.key != (stat.st_mtime_ns, stat.st_size):
+            entry = _file_cache[path] = _CachedFile(path)
+        return entry
+
+
+class StaticRequestHandler(SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler that serves CACHED_DIRS from memory and marks everything
+    else (the student's own files, which change between gradings on the same URL) no-store
+    """
+    def send_head(self):
+        path = self.translate_path(self.path)
+        relative = os.path.relpath(path, self.directory).split(os.sep)
+        if relative[0] not in CACHED_DIRS or not os.path.isfile(path):
+            self._cacheable = False
+            return super().send_head()
+
+        self._cacheable = True
+        entry = _cached_file(path)
+        if self.headers.get('If-None-Match') == entry.etag:
+            self.send_response(304)
+            self.send_header('ETag', entry.etag)
+            self.end_headers()
+            return None
+        self.send_response(200)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Length', str(len(entry.data)))
+        self.send_header('ETag', entry.etag)
+        self.send_header('Last-Modified', entry.last_modified)
+        self.end_headers()
+        return io.BytesIO(entry.data)
+
+    def end_headers(self):
+        if getattr(self, '_cacheable', False):
+            self.send_header('Cache-Control', f'public, max-age={CACHE_MAX_AGE}')
+        else:
+            self.send_header('Cache-Control', 'no-store')
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StaticServer:
+    """Serves directory on host:port (port 0 picks a free ephemeral port) from a daemon thread."""
+
+    def __init__(self, directory, host='localhost', port=0):
+        self.directory = os.path.abspath(directory)
+        handler = partial(StaticRequestHandler, directory=self.directory)
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.host = host
+        self.port = self.httpd.server_address[1]
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+            self._thread.start()
+        return self
+
+    def url(self, path=''):
+        return f'http://{self.host}:{self.port}/{path}'
+
+    def shutdown(self):
+        if self._thread is not None:
+            self.httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
@@ -0,0 +1,128 @@
+"""
+Weight-aware scheduling of a grading suite.
+schedule() orders the tests by points per expected second (the @weight of a test over its mean
+duration in past runs), keeping the tests of a class together so each class loads its page
+once, and runs every test under move_time_limit(). Tests that would start after the time
+budget of the run is used up are reported as skipped instead, so the points earned so far stay.
+Tests marked @isolated_context change the page (e.g. by hovering marks), so they run last in
+their class, after the tests that read the page.
+
+Past durations come from the metrics.jsonl files of earlier runs (see utils/timing_helper.py):
+
+    python -m utils.test_scheduler batch_results/*/metrics.jsonl > config/scatterplot/test_durations.json
+"""
+import os
+import sys
+import json
+import time
+import unittest
+from collections import defaultdict
+from utils.timing_helper import move_time_limit, TimeoutException
+
+# expected duration of tests without past runs, in seconds
+DEFAULT_TEST_SECONDS = 1.0
+BUDGET_SKIP_REASON = "Not run: the grading time budget was used up before this test started."
+
+
+def iter_tests(suite):
+    """the test cases of a (nested) suite, in order"""
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from iter_tests(test)
+        else:
+            yield test
+
+
+def test_name(test):
+    # the name of the test in results.json and metrics.jsonl
+    return test.shortDescription() or str(test)
+
+
+def test_weight(test):
+    return getattr(getattr(test, test._testMethodName, None), '__weight__', None) or 0.0
+
+
+def isolated_context(func):
+    """Decorator for tests that change the page state. Sharded (utils/test_sharding.py), the test
+    runs in its own browser context, apart from the rest of its class; unsharded, it runs after
+    the other tests of its class.
+    """
+    func.__isolated__ = True
+    return func
+
+
+def is_isolated(test):
+    return getattr(getattr(test, test._testMethodName, None), '__isolated__', False)
+
+
+def load_durations(path):
+    """{test name: seconds} saved by summarize_durations(), {} when path does not exist"""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def summarize_durations(metrics_paths):
+    """mean duration of every test over the runs logged in metrics_paths"""
+    runs = defaultdict(list)
+    for path in metrics_paths:
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    for test in json.loads(line).get('tests', []):
+                        runs[test['name']].append(test['seconds'])
+    return {name: round(sum(seconds) / len(seconds), 3) for name, seconds in runs.items()}
+
+
+def _budgeted(test, deadline, test_limit):
+    """make test skip itself past deadline and run under the time limit otherwise"""
+    run = test.run
+
+    def budgeted_run(result=None):
+        remaining = None if deadline is None else deadline - time.time()
+        if remaining is not None and remaining < 1:
+            result.startTest(test)
+            result.addSkip(test, BUDGET_SKIP_REASON)
+            result.stopTest(test)
+            return result
+        limits = [limit for limit in (test_limit, remaining) if limit is not None]
+        if not limits:
+            return run(result)
+        try:
+            with move_time_limit(max(1, int(min(limits)))):
+                return run(result)
+        except TimeoutException:  # the alarm went off outside the test method, e.g. in tearDown
+            print(f"{test.id()} exceeded its time limit")
+            return result
+    test.run = budgeted_run
+    # kept so a test loaded again elsewhere (e.g. in a shard process) can get the same budget
+    test.__budget__ = (deadline, test_limit)
+    return test
+
+
+def schedule(suite, durations=None, deadline=None, test_limit=None):
+    """Suite with the tests of suite, highest points per expected second first, the
+    @isolated_context tests of each class after its other tests.
+    deadline is a time.time() after which no test starts; test_limit caps each test, in seconds.
+    """
+    durations = durations or {}
+    classes = defaultdict(list)
+    for test in iter_tests(suite):
+        classes[type(test)].append(test)
+
+    def seconds(test):
+        return max(durations.get(test_name(test), DEFAULT_TEST_SECONDS), 0.001)
+
+    def value(tests):
+        return sum(test_weight(t) for t in tests) / sum(seconds(t) for t in tests)
+    # sorted() is stable, so ties keep the order of discovery
+    ordered = []
+    for tests in sorted(classes.values(), key=value, reverse=True):
+        ordered.extend(sorted(tests, key=lambda t: (not is_isolated(t), test_weight(t) / seconds(t)), reverse=True))
+    return unittest.TestSuite(_budgeted(test, deadline, test_limit) for test in ordered)
+
+
+if __name__ == '__main__':
+    json.dump(summarize_durations(sys.argv[1:]), sys.stdout, indent=4, sort_keys=True)
+    sys.stdout.write('\n')
@@ -0,0 +1,173 @@
+"""
+Sharded test runs for one submission.
+run_sharded() splits a suite across spawned worker processes, each with a BrowserSession
+attached to the grading session's chrome in a browser context of its own (see
+BrowserSession.shard()). Shards are balanced by expected cost, longest tests first onto the
+least loaded shard, and every finished test entry is streamed back to the runner; the entries
+are merged in suite order. Tests marked @isolated_context (they change page state, e.g. by
+hovering marks) run in a shard of their own, together with the isolated tests of their class.
+"""
+import queue
+import unittest
+import traceback
+import multiprocessing
+from utils import browser_session
+from utils.result_cache import mark_incomplete
+from utils.dom_audit import merge_collisions, CollisionCollector
+from utils.test_scheduler import (iter_tests, test_name, _budgeted, isolated_context, is_isolated,
+                                  DEFAULT_TEST_SECONDS)
+
+# expected cost of a setUpClass (a page load) in every shard that runs tests of the class
+CLASS_SETUP_SECONDS = 2.0
+# seconds between liveness checks of the shard processes
+POLL_SECONDS = 1.0
+
+
+def plan_shards(tests, shards, durations=None):
+    """Lists of indices into tests, one per shard, each in suite order.
+    The isolated tests of each class get a shard of their own; the other tests are spread
+    over the remaining shards (at least one).
+    """
+    durations = durations or {}
+
+    def cost(i):
+        return durations.get(test_name(tests[i]), DEFAULT_TEST_SECONDS)
+    isolated = {}
+    regular = []
+    for i, test in enumerate(tests):
+        if is_isolated(test):
+            isolated.setdefault(type(test), []).append(i)
+        else:
+            regular.append(i)
+    bins = [{"tests": [], "load": 0.0, "classes": set()}
+            for _ in range(max(1, shards - len(isolated)))]
+    for i in sorted(regular, key=cost, reverse=True):
+        def added_load(b):
+            return cost(i) + (0.0 if type(tests[i]) in b["classes"] else CLASS_SETUP_SECONDS)
+        target = min(bins, key=lambda b: b["load"] + added_load(b))
+        target["load"] += added_load(target)
+        target["tests"].append(i)
+        target["classes"].add(type(tests[i]))
+    plans = [sorted(b["tests"]) for b in bins if b["tests"]]
+    return plans + list(isolated.values())
+
+
+def _load_test(test_id, budget):
+    """the test named test_id, loaded again in a shard process, with the time budget it had"""
+    suite = unittest.defaultTestLoader.loadTestsFromName(test_id)
+    test = next(iter_tests(suite))
+    return _budgeted(test, *budget) if budget else test
+
+
+def error_scope(holder):
+    """prefix of the ids of the tests a class or module level error covers, e.g.
+    'test_d3.TestFiles' for the error holder 'setUpClass (test_d3.TestFiles)'"""
+    return holder.description.rsplit('(', 1)[-1].rstrip(')')
+
+
+def _run_shard(resultclass, buffer, failfast, test_ids, indices, shard_session, messages):
+    """body of a shard process: run tests in a session attached to the grading session's chrome.
+    Test entries are sent with their suite index; class and module level errors (e.g. in
+    setUpClass) with their position after the last test reported and the scope they cover.
+    """
+    browser_session.set_session(shard_session)
+    entries = []
+    result = resultclass(None, True, 1, entries, [])
+    result.failfast = failfast
+    result.buffer = buffer
+    sent = 0
+    index_of = {}
+    position, errors = indices[0] - 1, 0
+
+    def send(test):
+        nonlocal sent, position, errors
+        for entry in entries[sent:]:
+            index = index_of.get(test.id())
+            if index is None:  # unittest's _ErrorHolder
+                errors += 1
+                messages.put(('error', (position, 1, indices[0], errors), (error_scope(test), entry)))
+            else:
+                position = index
+                messages.put(('test', (index, 0), entry))
+        sent = len(entries)
+    result.on_result = send
+    try:
+        # the processes are spawned, so the tests are imported again here by name
+        tests = [_load_test(test_id, budget) for test_id, budget in test_ids]
+        index_of = {test.id(): index for test, index in zip(tests, indices)}
+        # the suite runs setUpClass / tearDownClass of each class in this shard
+        unittest.TestSuite(tests)(result)
+    except Exception:
+        traceback.print_exc()
+    finally:
+        shard_session.quit()
+        messages.put(('audit', None, shard_session.feature(CollisionCollector).report))
+        messages.put(('done', None, None))
+
+
+def lost_entry(runner, test, exitcode):
+    """failed entry, with no points, of a test whose shard ended before reporting it"""
+    reason = f"Not run: the test shard running it exited with code {exitcode} before the test finished."
+    result = runner._makeResult()
+    result.startTest(test)
+    entry = result.buildResult(test, (RuntimeError, RuntimeError(reason), None))
+    result.stopTest(test)
+    return mark_incomplete(entry, reason)
+
+
+def run_sharded(suite, runner, shards, durations=None, on_result=None):
+    """Run suite in shards processes and add the test entries to runner.json_data["tests"]
+    in suite order. on_result is called after each entry arrives. Class and module level errors
+    are added where they occurred, and, as without shards, the tests they kept from running get
+    no entries; other tests a shard did not report (e.g. when it crashed) are added as failed.
+    """
+    tests = list(iter_tests(suite))
+    plans = plan_shards(tests, shards, durations)
+    session = browser_session.get_session()
+    audit = session.feature(CollisionCollector).report
+    # spawned rather than forked: the grading process runs threads (pipeline stages, static
+    # servers, uploads) whose locks a forked child could inherit held
+    context = multiprocessing.get_context('spawn')
+    messages = context.Queue()
+    processes = [context.Process(target=_run_shard,
+                                 args=(runner.resultclass, runner.buffer, runner.failfast,
+                                       [(tests[i].id(), getattr(tests[i], '__budget__', None)) for i in plan],
+                                       plan, session.shard(), messages))
+                 for plan in plans]
+    for process in processes:
+        process.start()
+    # entries by (suite index, 0) for tests and (position, 1, shard, n) for class level errors
+    received = {}
+    # scopes of the class and module level errors of each shard, by its first suite index
+    error_scopes = {}
+    done = 0
+    while done < len(processes):
+        try:
+            kind, index, payload = messages.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                break  # a shard died without reporting back
+            continue
+        if kind in ('test', 'error'):
+            if kind == 'error':
+                scope, payload = payload
+                error_scopes.setdefault(index[2], []).append(scope)
+            received[index] = payload
+            runner.json_data["tests"].append(payload)
+            if on_result is not None:
+                on_result()
+        elif kind == 'audit':
+            merge_collisions(audit["collisions"], payload.pop("collisions", {}))
+            audit.update(payload)
+        else:
+            done += 1
+    for process, plan in zip(processes, plans):
+        process.join()
+        scopes = error_scopes.get(plan[0], [])
+        for i in plan:
+            if (i, 0) in received or any(tests[i].id().startswith(scope + '.') for scope in scopes):
+                continue
+            print(f"{tests[i].id()} was lost: its shard exited with code {process.exitcode}")
+            received[(i, 0)] = lost_entry(runner, tests[i], process.exitcode)
+    # deterministic output: suite order, whatever shard finished first
+    runner.json_data["tests"][:] = [received[i] for i in sorted(received)]
@@ -1,4 +1,6 @@
+import time
 import signal
+import threading
 from contextlib import contextmanager
 
 class TimeoutException(Exception): pass
@@ -13,3 +15,98 @@ def move_time_limit(seconds):
         yield
     finally:
         signal.alarm(0)
+
+
+class CommandMeter:
+    """Counts the WebDriver commands of every attached driver and their cumulative latency.
+    Drivers may send commands from different threads.
+    """
+
+    def __init__(self):
+        self.commands = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def attach(self, driver):
+        """time every command driver sends from now on"""
+        execute = driver.execute
+
+        def timed_execute(driver_command, params=None):
+            start = time.perf_counter()
+            try:
+                return execute(driver_command, params)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.commands += 1
+                    self.seconds += elapsed
+        driver.execute = timed_execute
+        return driver
+
+    def reading(self):
+        with self._lock:
+            return self.commands, self.seconds
+
+    def since(self, reading, started):
+        """metrics since reading (of reading()) taken at perf_counter() time started"""
+        commands, seconds = reading
+        now_commands, now_seconds = self.reading()
+        return {"seconds": round(time.perf_counter() - started, 3),
+                "webdriver_commands": now_commands - commands,
+                "webdriver_seconds": round(now_seconds - seconds, 3)}
+
+
+# process-wide meter of the test drivers, attached to the drivers of utils/browser_session.py;
+# the per-test counts of utils/gs_helper.py read it
+COMMANDS = CommandMeter()
+
+
+class MeterCommands:
+    """BrowserSession feature attaching meter (COMMANDS by default) to every driver the session
+    starts. Sessions whose commands are not the tests' (e.g. renders running alongside them)
+    get a meter of their own.
+    """
+
+    def __init__(self, meter=None):
+        self.meter = meter
+
+    def started(self, driver):
+        # COMMANDS is looked up at call time, so a copy in a shard process meters that process
+        (self.meter or COMMANDS).attach(driver)
+
+    def shard(self):
+        # a shard's tests are metered by COMMANDS of the process running them
+        return MeterCommands()
+
+
+class PhaseTimer:
+    """Wall-clock time and WebDriver commands of the named phases of a grading run
+
+    Usage:
+        with timer.phase('compare_plots'):
+            ...
+    """
+
+    def __init__(self, meter=COMMANDS):
+        self.meter = meter
+        self.phases = []
+        self.started, self.reading = time.perf_counter(), meter.reading()
+
+    @contextmanager
+    def phase(self, name):
+        started, reading = time.perf_counter(), self.meter.reading()
+        try:
+            yield
+        finally:
+            self.phases.append(dict(name=name, **self.meter.since(reading, started)))
+
+    def add(self, name, seconds, meter=None):
+        """record a phase timed elsewhere, e.g. the browser launch, with the commands counted by
+        meter when it metered that phase alone"""
+        commands, command_seconds = meter.reading() if meter is not None else (0, 0.0)
+        self.phases.append({"name": name, "seconds": round(seconds, 3),
+                            "webdriver_commands": commands, "webdriver_seconds": round(command_seconds, 3)})
+
+    def report(self):
+        """the phases plus totals since the timer was created"""
+        return dict(phases=self.phases, **self.meter.since(self.reading, self.started))
@@ -0,0 +1,69 @@
+"""
+Background archival uploads.
+UploadQueue sends files to a storage connector (utils/dropbox_helper.py: DropboxConnector, or
+LocalStorageConnector for runs without Dropbox) from a few worker threads, so archiving a
+submission overlaps with grading instead of preceding it. Failed uploads are retried with
+exponential backoff; files already stored with the same content are skipped by the connector.
+
+    uploads = UploadQueue(DropboxConnector(ACCESS_TOKEN))
+    uploaded = uploads.put('submission/comparison.png', '/submissions/.../plot.png')
+    uploaded.result()  # True once sent, False if it was already stored
+    uploads.close(timeout=30)
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class UploadQueue:
+    def __init__(self, connector, workers=4, retries=3, backoff=1.0):
+        self.connector = connector
+        self.retries = retries
+        self.backoff = backoff
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.futures = []
+        # one entry per finished upload, see report()
+        self.log = []
+        self._lock = threading.Lock()
+
+    def _upload(self, file_from, file_to):
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                sent = self.connector.upload_file(file_from, file_to) is not False
+                self._record(file_to, "uploaded" if sent else "skipped", attempt, started)
+                return sent
+            except Exception as e:
+                if attempt > self.retries:
+                    self._record(file_to, "failed", attempt, started, repr(e))
+                    raise
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+    def _record(self, path, status, attempts, started, error=None):
+        with self._lock:
+            self.log.append({"path": path, "status": status, "attempts": attempts,
+                             "seconds": round(time.perf_counter() - started, 3), "error": error})
+
+    def put(self, file_from, file_to):
+        """Queue file_from for upload to file_to; returns a Future of whether it was sent.
+        The file is read when its upload starts, so it must not change after put().
+        """
+        future = self.executor.submit(self._upload, file_from, file_to)
+        self.futures.append(future)
+        return future
+
+    def close(self, timeout=None):
+        """Wait up to timeout seconds for the queued uploads; returns report().
+        Uploads still running after timeout finish in the background before the process exits.
+        """
+        wait(self.futures, timeout=timeout)
+        self.executor.shutdown(wait=False)
+        return self.report()
+
+    def report(self):
+        with self._lock:
+            log = list(self.log)
+        return {"uploads": log,
+                "pending": sum(not future.done() for future in self.futures)}
@@ -0,0 +1,175 @@
+"""
+Vectorized, browser-free equivalents of the d3 scales used to compute expected mark positions.
+Each scale maps a whole array of data values at once and follows d3-scale (v6) semantics:
+piecewise (poly-linear) domains, reversed domains/ranges, clamping and rounding.
+"""
+import numpy as np
+
+
+def _js_round(x):
+    # Math.round rounds halves up, np.round to even
+    return np.floor(x + 0.5)
+
+
+class ContinuousScale:
+    """Base class for d3 continuous scales (linear, pow/sqrt, log, time)."""
+
+    def __init__(self, domain=(0, 1), range=(0, 1), clamp=False, round=False):
+        self.domain = list(domain)
+        self.range = list(range)
+        self.clamp = clamp
+        self.round = round
+
+    def _to_numeric(self, values):
+        return np.asarray(values, dtype=np.float64)
+
+    def _transform(self, x):
+        return x
+
+    def _untransform(self, x):
+        return x
+
+    @staticmethod
+    def _piecewise(x, domain, range, clamp):
+        # d3 uses min(len(domain), len(range)) - 1 segments and flips descending domains
+        j = min(len(domain), len(range))
+        domain = np.asarray(domain[:j], dtype=np.float64)
+        range = np.asarray(range[:j], dtype=np.float64)
+        if j >= 2 and domain[-1] < domain[0]:
+            domain = domain[::-1]
+            range = range[::-1]
+        if clamp:
+            x = np.clip(x, domain[0], domain[-1])
+        # segment i covers [domain[i], domain[i + 1]], the outer segments extrapolate
+        i = np.clip(np.searchsorted(domain[1:-1], x, side='right'), 0, j - 2)
+        d0, d1 = domain[i], domain[i + 1]
+        r0, r1 = range[i], range[i + 1]
+        width = d1 - d0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(width == 0, 0.5, (x - d0) / np.where(width == 0, 1, width))
+        return r0 + t * (r1 - r0)
+
+    def __call__(self, values):
+        x = self._transform(self._to_numeric(values))
+        domain = self._transform(self._to_numeric(self.domain))
+        y = self._piecewise(x, domain, self.range, self.clamp)
+        return _js_round(y) if self.round else y
+
+    def invert(self, values):
+        """map range values back to the domain (numeric ranges only)"""
+        y = np.asarray(values, dtype=np.float64)
+        domain = self._transform(self._to_numeric(self.domain))
+        x = self._piecewise(y, self.range, domain, self.clamp)
+        return self._untransform(x)
+
+
+class LinearScale(ContinuousScale):
+    """d3.scaleLinear"""
+
+
+class PowScale(ContinuousScale):
+    """d3.scalePow, sign-preserving x^exponent transform"""
+
+    def __init__(self, domain=(0, 1), range=(0, 1), exponent=1, clamp=False, round=False):
+        super().__init__(domain, range, clamp, round)
+        self.exponent = exponent
+
+    def _transform(self, x):
+        return np.sign(x) * np.power(np.abs(x), self.exponent)
+
+    def _untransform(self, x):
+        return np.sign(x) * np.power(np.abs(x), 1 / self.exponent)
+
+
+class SqrtScale(PowScale):
+    """d3.scaleSqrt"""
+
+    def __init__(self, domain=(0, 1), range=(0, 1), clamp=False, round=False):
+        super().__init__(domain, range, 0.5, clamp, round)
+
+
+class LogScale(ContinuousScale):
+    """d3.scaleLog. As in d3, a strictly negative domain is mapped through -log(-x)
+    and values outside the sign of the domain produce NaN. The base only affects ticks.
+    """
+
+    def __init__(self, domain=(1, 10), range=(0, 1), base=10, clamp=False, round=False):
+        super().__init__(domain, range, clamp, round)
+        self.base = base
+
+    def _negative(self):
+        return self.domain[0] < 0
+
+    def _transform(self, x):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return -np.log(-x) if self._negative() else np.log(x)
+
+    def _untransform(self, x):
+        return -np.exp(-x) if self._negative() else np.exp(x)
+
+
+class TimeScale(ContinuousScale):
+    """d3.scaleTime. Dates may be datetime64 values, datetime/Timestamp objects
+    or ISO strings and are mapped as milliseconds since the epoch, like JS Dates.
+    """
+
+    def _to_numeric(self, values):
+        values = np.asarray(values)
+        if values.dtype.kind in 'fiu':
+            return values.astype(np.float64)
+        ms = values.astype('datetime64[ms]')
+        return np.where(np.isnat(ms), np.nan, ms.astype(np.int64).astype(np.float64))
+
+    def invert(self, values):
+        ms = super().invert(values)
+        return np.round(ms).astype('int64').astype('datetime64[ms]')
+
+
+class BandScale:
+    """d3.scaleBand. Values not in the domain map to NaN (d3 returns undefined)."""
+
+    def __init__(self, domain=(), range=(0, 1), padding_inner=0.0, padding_outer=0.0,
+                 align=0.5, round=False):
+        self.domain = list(domain)
+        self.range = list(range)
+        self.padding_inner = min(1.0, max(0.0, padding_inner))
+        self.padding_outer = padding_outer
+        self.align = min(1.0, max(0.0, align))
+        self.round = round
+        self._rescale()
+
+    def _rescale(self):
+        n = len(self.domain)
+        r0, r1 = float(self.range[0]), float(self.range[1])
+        reverse = r1 < r0
+        start, stop = (r1, r0) if reverse else (r0, r1)
+        step = (stop - start) / max(1, n - self.padding_inner + self.padding_outer * 2)
+        if self.round:
+            step = np.floor(step)
+        start += (stop - start - step * (n - self.padding_inner)) * self.align
+        bandwidth = step * (1 - self.padding_inner)
+        if self.round:
+            start, bandwidth = _js_round(start), _js_round(bandwidth)
+        values = start + step * np.arange(n, dtype=np.float64)
+        self.step = step
+        self.bandwidth = bandwidth
+        self._positions = values[::-1] if reverse else values
+        self._index = {d: i for i, d in enumerate(self.domain)}
+
+    def __call__(self, values):
+        lookup = np.append(self._positions, np.nan)
+        missing = len(self._positions)
+        codes = np.fromiter((self._index.get(v, missing) for v in np.asarray(values, dtype=object).ravel()),
+                            dtype=np.intp)
+        return lookup[codes].reshape(np.shape(values))
+
+
+def scale_linear(data, range_min:float = 0.0, range_max:float = None,
+                 domain_min:float = 0.0, domain_max:float = None, invert:bool = False)->np.ndarray:
+    """
+    Vectorized drop-in for autograde_viz.d3_scales.d3_scale_linear without the webdriver:
+    maps an array of data values at once.
+    Set invert=True to invert the range for the scale (e.g., vertical / y-scales)
+    """
+    range_ = (range_max, range_min) if invert else (range_min, range_max)
+    return LinearScale(domain=(domain_min, domain_max), range=range_)(data)
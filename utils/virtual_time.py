@@ -0,0 +1,134 @@
+"""
+Virtual page time for grading.
+install_clock() makes chrome run a page clock before the scripts of every page: performance.now()
+and Date.now() get an offset the grader controls, and setTimeout callbacks are tracked.
+fast_forward() then jumps the page to the end state of D3 transitions and pending timers
+(it shifts the clock, runs the timeouts that became due in order and lets d3's timer loop
+catch up for a few frames) and speeds up CSS animations through the DevTools Animation
+domain, so nothing is waited for in real time.
+
+The mode is opt-in (`virtual_time: true` in the assignment's config.yaml, or
+VISGRADER_VIRTUAL_TIME=1 for batch grading): only performance.now(), Date.now() and setTimeout
+are virtualized. new Date(), setInterval and the timestamps requestAnimationFrame passes to its
+callbacks keep real time, so a page that mixes them with the virtualized calls can behave
+differently than in a real browser. Enable it only for assignments whose pages time their
+animations through d3 transitions/timers or setTimeout.
+"""
+import os
+from selenium.common.exceptions import WebDriverException
+
+# grading mode switch, off unless VISGRADER_VIRTUAL_TIME=1 (run_tests.py reads config.yaml instead)
+VIRTUAL_TIME = os.environ.get('VISGRADER_VIRTUAL_TIME', '0') == '1'
+# how far fast_forward() moves page time by default, in milliseconds
+FAST_FORWARD_MS = 60000
+# CSS animation / transition playback rate while grading
+ANIMATION_PLAYBACK_RATE = 1000
+
+CLOCK_SCRIPT = """
+(function() {
+    if (window.__visgraderClock) return;
+    var realNow = performance.now.bind(performance), realDateNow = Date.now;
+    var realSetTimeout = window.setTimeout, realClearTimeout = window.clearTimeout;
+    // realNow / realSetTimeout are for the grader's own scripts, which must not run on this clock
+    var clock = window.__visgraderClock = {offset: 0, timers: {}, realNow: realNow,
+                                           realSetTimeout: realSetTimeout.bind(window)};
+    performance.now = function() { return realNow() + clock.offset; };
+    Date.now = function() { return realDateNow() + clock.offset; };
+    window.setTimeout = function(callback, delay) {
+        var args = Array.prototype.slice.call(arguments, 2);
+        var entry = {callback: callback, args: args, due: performance.now() + (+delay || 0)};
+        var id = realSetTimeout(function() {
+            delete clock.timers[id];
+            entry.callback.apply(window, entry.args);
+        }, delay);
+        if (typeof callback === 'function') clock.timers[id] = entry;
+        return id;
+    };
+    window.clearTimeout = function(id) {
+        delete clock.timers[id];
+        realClearTimeout(id);
+    };
+    // Move page time forward by ms and run the timeouts that became due, in due order.
+    // d3's timer loop reads the shifted clock on its next animation frame, so running
+    // transitions jump to their end state there.
+    clock.advance = function(ms) {
+        clock.offset += ms;
+        var now = performance.now(), ran = 0;
+        for (var step = 0; step < 10000; step++) {
+            var nextId = null;
+            for (var id in clock.timers) {
+                if (clock.timers[id].due <= now && (nextId === null || clock.timers[id].due < clock.timers[nextId].due)) {
+                    nextId = id;
+                }
+            }
+            if (nextId === null) break;
+            var entry = clock.timers[nextId];
+            delete clock.timers[nextId];
+            realClearTimeout(+nextId);
+            entry.callback.apply(window, entry.args);
+            ran++;
+        }
+        return ran;
+    };
+})();
+"""
+
+# Async. Advances the page clock, then lets a few animation frames run (d3 schedules, starts and
+# ends a transition on separate frames), running timeouts that became due on each of them.
+FAST_FORWARD_SCRIPT = """
+var ms = arguments[0], frames = arguments[1], callback = arguments[arguments.length - 1];
+var clock = window.__visgraderClock;
+if (!clock) { callback(null); return; }
+var later = clock.realSetTimeout;
+var ran = clock.advance(ms), done = false, ticket = 0;
+function finish() { if (!done) { done = true; callback(ran); } }
+function frame() {
+    ran += clock.advance(0);
+    if (--frames <= 0) { finish(); return; }
+    // animation frames are throttled in hidden pages, so also step with a timer
+    var mine = ++ticket;
+    var next = function() { if (mine === ticket) frame(); };
+    requestAnimationFrame(next);
+    later(next, 20);
+}
+frame();
+"""
+
+# animation frames fast_forward() lets run after moving the clock
+SETTLE_FRAMES = 6
+
+
+def install_clock(driver):
+    """run the page clock before the scripts of every page driver loads from now on"""
+    try:
+        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': CLOCK_SCRIPT})
+        driver.execute_cdp_cmd('Animation.enable', {})
+        return True
+    except (AttributeError, WebDriverException):  # not chrome, or no devtools access
+        return False
+
+
+def fast_forward(driver, ms=FAST_FORWARD_MS):
+    """Jump the loaded page ms of page time ahead: transitions end, due timeouts run.
+    Returns the number of timeouts run, or None when the page has no virtual clock.
+    """
+    try:
+        # the timeline playback rate is per document, so it is set again for every page
+        driver.execute_cdp_cmd('Animation.setPlaybackRate', {'playbackRate': ANIMATION_PLAYBACK_RATE})
+    except (AttributeError, WebDriverException):
+        pass
+    return driver.execute_async_script(FAST_FORWARD_SCRIPT, ms, SETTLE_FRAMES)
+
+
+class VirtualClock:
+    """BrowserSession feature: runs every page on the virtual clock while enabled"""
+
+    def __init__(self, enabled=VIRTUAL_TIME):
+        self.enabled = enabled
+
+    def started(self, driver):
+        if self.enabled:
+            install_clock(driver)
+
+    def shard(self):
+        return VirtualClock(self.enabled)
@@ -0,0 +1,127 @@
+"""
+Record and replay of WebDriver traffic.
+record_commands() logs every command a driver sends and the raw response chrome gave to a
+JSON lines file; ReplayDriver answers the same commands from that file without a browser,
+so the Python side of the tests can be benchmarked and profiled without Chrome's variance.
+Unlike a render snapshot (utils/render_snapshot.py) the replay is exact, but only for the
+commands that were recorded.
+"""
+import json
+from collections import defaultdict
+from selenium.webdriver.remote.webdriver import WebDriver as RemoteWebDriver
+from selenium.webdriver.remote.command import Command
+from selenium.common.exceptions import WebDriverException
+
+RECORDING_VERSION = 1
+
+
+def command_key(driver_command, params):
+    """commands are matched by name and parameters, without the session id of the recording"""
+    params = {k: v for k, v in (params or {}).items() if k != 'sessionId'}
+    return driver_command + ' ' + json.dumps(params, sort_keys=True)
+
+
+def record_commands(driver, path, **metadata):
+    """Append every command driver sends from now on, with its response, to path.
+    metadata (e.g. the submission URL) is written to the header line.
+    """
+    executor = driver.command_executor
+    execute = executor.execute
+    log = open(path, 'w', buffering=1)
+    header = dict(version=RECORDING_VERSION, w3c=driver.w3c, session_id=driver.session_id,
+                  capabilities=driver.capabilities, **metadata)
+    log.write(json.dumps(header) + '\n')
+
+    def recording_execute(driver_command, params):
+        try:
+            response = execute(driver_command, params)
+        except Exception as e:  # transport errors (e.g. timeouts) are replayed as WebDriverException
+            log.write(json.dumps({"key": command_key(driver_command, params), "exception": repr(e)}) + '\n')
+            raise
+        # serialized right away: the driver replaces element references in the response later
+        log.write(json.dumps({"key": command_key(driver_command, params), "response": response}) + '\n')
+        return response
+    executor.execute = recording_execute
+    return log
+
+
+def load_recording(path):
+    """(header, {command key: [recorded lines in order]})"""
+    responses = defaultdict(list)
+    with open(path) as f:
+        header = json.loads(f.readline())
+        if header.get('version') != RECORDING_VERSION:
+            raise ValueError(f"{path} is not a version {RECORDING_VERSION} recording")
+        for line in f:
+            if line.strip():
+                responses[json.loads(line)['key']].append(line)
+    return header, responses
+
+
+class ReplayConnection:
+    """Command executor answering from a recording.
+    Repeated commands get their recorded responses in order; once those run out the last
+    one is repeated (e.g. polling in WebDriverWait).
+    """
+
+    def __init__(self, header, responses):
+        self.header = header
+        self.responses = responses
+        self.served = defaultdict(int)
+        self.w3c = header['w3c']
+        self.misses = 0
+
+    def execute(self, driver_command, params):
+        if driver_command == Command.NEW_SESSION:
+            if self.w3c:
+                return {"value": {"sessionId": self.header['session_id'], "capabilities": self.header['capabilities']}}
+            return {"status": 0, "sessionId": self.header['session_id'], "value": self.header['capabilities']}
+        key = command_key(driver_command, params)
+        recorded = self.responses.get(key)
+        if not recorded:
+            self.misses += 1
+            raise WebDriverException(f"'{driver_command}' with these parameters was not recorded")
+        index = min(self.served[key], len(recorded) - 1)
+        self.served[key] += 1
+        entry = json.loads(recorded[index])  # a fresh copy per call
+        if 'exception' in entry:
+            raise WebDriverException(entry['exception'])
+        return entry['response']
+
+
+class ReplayDriver(RemoteWebDriver):
+    """WebDriver answering every command from a recording of record_commands()"""
+
+    def __init__(self, path):
+        header, responses = load_recording(path)
+        self.recording = header
+        super().__init__(command_executor=ReplayConnection(header, responses),
+                         desired_capabilities=header['capabilities'] or {})
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        # as webdriver.Chrome
+        return self.execute("executeCdpCommand", {'cmd': cmd, 'params': cmd_args})['value']
+
+    def quit(self):
+        pass
+
+
+class CommandRecorder:
+    """BrowserSession feature: records the commands of the next driver started to path.
+    metadata goes to the header of the recording (see record_commands()).
+    """
+
+    def __init__(self, path, **metadata):
+        self.path = path
+        self.metadata = metadata
+        self._log = None
+
+    def started(self, driver):
+        if self.path and not isinstance(driver, ReplayDriver):
+            self._log = record_commands(driver, self.path, **self.metadata)
+            self.path = None  # one recording per browser
+
+    def stopping(self, driver):
+        if self._log is not None:
+            self._log.close()
+            self._log = None